@@ -36,6 +36,7 @@ scraperDag = DAG(
 
 # Task 11
 from scrap_bookmakers_odds import scrapOdds
+from common_variables import scraping_workers
 #from common_variables import other_leagues_current_season_url, other_leagues_filename, other_leagues_dictionary
 from common_variables import main_leagues_current_season_url, main_leagues_filename, main_leagues_dictionary
 
@@ -50,7 +51,7 @@ task_request_odds = PythonOperator(
     task_id = 'data_request_odds',
     dag = scraperDag,
     python_callable = scrapOdds,
-    op_kwargs= {},
+    op_kwargs= {'n_workers': scraping_workers},
     retries = 3,
     retry_delay = datetime.timedelta(seconds=300),
     #on_failure_callback=alertOnFailure,
@@ -36,11 +36,12 @@ preProcessingDag = DAG(
 
 # Task 21
 from data_preprocessing_matches import preProcessingPipeline
+from common_variables import preprocessing_workers
 task_preprocessing = PythonOperator(
     task_id = 'data_preprocessing',
     dag = preProcessingDag,
     python_callable = preProcessingPipeline,
-    op_kwargs= {},
+    op_kwargs= {'n_workers': preprocessing_workers},
     retries = 3,
     retry_delay = datetime.timedelta(seconds=300),
     #on_failure_callback=alertOnFailure,
@@ -9,6 +9,10 @@ cp ../data_ml_functions/geckodriver ./dags # GeckoDriver
 cp ../data_ml_functions/archive_datas_source.py ./dags # Dag Scraper (archive function)
 cp ../data_ml_functions/data_preprocessing_matches.py ./dags # Dag pre-processing
 cp ../data_ml_functions/model_predictions.py ./dags # Dag predictions
+cp ../data_ml_functions/clean_data_store.py ./dags # Dag pre-processing, predictions & train models (clean datas storage)
+cp ../data_ml_functions/stage_cache.py ./dags # Dag pre-processing (stage cache)
+cp ../data_ml_functions/team_ratings.py ./dags # Dag pre-processing (Elo team ratings)
+cp ../data_ml_functions/odds_store.py ./dags # Dag Scraper & predictions (odds store)
 
 # Dag train models use bash commands
 cp ../mlflow/model_registry.py ./dags # Dag model registry
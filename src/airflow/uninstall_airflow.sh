@@ -26,6 +26,10 @@ rm ./dags/scrap_match_history.py
 rm ./dags/archive_datas_source.py
 rm ./dags/data_preprocessing_matches.py
 rm ./dags/model_predictions.py
+rm ./dags/clean_data_store.py
+rm ./dags/stage_cache.py
+rm ./dags/team_ratings.py
+rm ./dags/odds_store.py
 rm ./dags/train_model.py
 rm ./dags/experiment.py
 rm ./dags/experiment_variables.py
@@ -12,6 +12,9 @@ import uuid
 import pandas as pd
 from functools import wraps
 
+# Clean datas storage
+from clean_data_store import readCleanData
+
 # Variables
 from api_variables import api_versions, user_database, path_data_clean
 
@@ -238,7 +241,7 @@ def getAvailableTeamsInChampionship(championship):
     Returns:
     list: The list of available teams in the championship.
     """
-    df = pd.read_csv(f'{path_data_clean}{championship}/match_data_for_modeling.csv')
+    df = readCleanData(f'{path_data_clean}{championship}/match_data_for_modeling.csv', columns=['HomeTeam', 'AwayTeam'])
     home_teams = df['HomeTeam'].unique()
     away_teams = df['AwayTeam'].unique()
     chosen_championship_teams = list(set(home_teams) | set(away_teams))
@@ -4,6 +4,8 @@
 # Get py files
 cp -r ../data_ml_functions/common_variables.py .
 cp -r ../data_ml_functions/model_predictions.py .
+cp -r ../data_ml_functions/clean_data_store.py .
+cp -r ../data_ml_functions/odds_store.py .
 
 # Building images
 docker build -t paris_sportifs_api:latest -f ./Dockerfile.api .
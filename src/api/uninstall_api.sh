@@ -10,4 +10,6 @@ echo -e "Containers & images removed"
 
 # Remove py files
 rm ./common_variables.py
-rm ./model_predictions.py
\ No newline at end of file
+rm ./model_predictions.py
+rm ./clean_data_store.py
+rm ./odds_store.py
\ No newline at end of file
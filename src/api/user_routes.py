@@ -19,6 +19,7 @@ from api_variables import available_championships, allowed_type_risk, Teams, pat
 # Common functions
 from api_functions import checkApiVersion, loadUserDatabase, updateUserDatabase, getUserDatas, userIndex, verifyPasswordStrength
 from model_predictions import generateBetAdvises
+from clean_data_store import readCleanData, loadTeamRegistry, findMatchRows
 
 # HTTPException
 from api_variables import wrong_championship, wrong_teams_match, incorrect_password, error_allowed_risk, not_a_premium_member
@@ -91,7 +92,7 @@ async def callShowCalendarAndPredictions(
         if not os.path.exists(calendar_path):
             return {"message": "Calendar not found for this championship"}
 
-        calendar = pd.read_csv(calendar_path)
+        calendar = readCleanData(calendar_path)
 
         current_user_bankroll = user_datas["bankroll"]
         current_user_risk_aversion = user_datas["risk"]
@@ -151,10 +152,12 @@ async def callPrediction(
 
     # Load prediction datas
     path_to_predictions = os.path.join(path_data_clean, teams.championship,  "odds.csv")
-    df_predictions = pd.read_csv(path_to_predictions)
+    df_predictions = readCleanData(path_to_predictions)
 
-    # Teams control
-    if df_predictions[(df_predictions.HomeTeam == teams.home_team) & (df_predictions.AwayTeam == teams.away_team)].empty:
+    # Teams control (teams looked up in the team registry, match rows found once on the team IDs)
+    registry = loadTeamRegistry(teams.championship, path_data_clean)
+    match_rows = findMatchRows(df_predictions, registry, teams.home_team, teams.away_team)
+    if len(match_rows) == 0:
         raise wrong_teams_match
 
     # Get user datas
@@ -170,8 +173,7 @@ async def callPrediction(
 
     # Base users
     # Get predictions for the match
-    predictions = df_predictions[(df_predictions.HomeTeam == teams.home_team) & (df_predictions.AwayTeam == teams.away_team)]
-    predictions = predictions[["Date", "HomeTeam", "AwayTeam", "pred_home", "pred_draw", "pred_away"]]
+    predictions = df_predictions.iloc[match_rows][["Date", "HomeTeam", "AwayTeam", "pred_home", "pred_draw", "pred_away"]]
     predictions = predictions.to_dict(orient='records')
     return predictions
 
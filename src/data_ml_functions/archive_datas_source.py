@@ -1,5 +1,13 @@
 """
-Archives scraped datas
+Archives scraped datas - content-addressed archive
+
+Layout:
+    <path_data_archives>/objects/<hash[:2]>/<hash>[.gz]   (each file content stored once, under its SHA-256 hash)
+    <path_data_archives>/manifests/<run id>.json           (1 manifest per archiving run : file name -> object)
+
+Usage:
+    python archive_datas_source.py --migrate   (dated folders of the previous archive format -> manifests)
+    python archive_datas_source.py --prune     (retention policy)
 """
 
 
@@ -8,31 +16,351 @@ Libraries
 """
 import os
 import shutil
-import datetime
+from datetime import datetime, timedelta
+import hashlib
+import gzip
+import json
+import argparse
+
+from common_variables import path_data_source, path_data_archives, archive_compression, archive_retention_days
+
+
+"""
+Variables
+"""
+# Archive folders
+archive_objects_folder = "objects"
+archive_manifests_folder = "manifests"
 
-from common_variables import path_data_source, path_data_archives
+# Files already compressed (never compressed again)
+archive_compressed_extensions = (".zip", ".xlsx", ".gz", ".parquet")
+
+# Size of the chunks read while a file is hashed & stored (bytes)
+archive_chunk_size = 1024 * 1024
 
 
 """
 Functions
 """
-def createDataArchive():
+def getArchiveObjectPath(file_hash: str, compression=None, path_data_archives=path_data_archives) -> str:
+    """
+    Get the path of an archived file content.
+
+    Parameters:
+    file_hash (str): The SHA-256 hash of the file content.
+    compression (str, optional): "gzip" or None. Defaults to None.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    str: The path to the object file.
+    """
+    return os.path.join(path_data_archives, archive_objects_folder, file_hash[:2], file_hash + (".gz" if compression == "gzip" else ""))
+
+
+
+def hashArchiveFile(file_path: str, chunk_size=archive_chunk_size) -> str:
+    """
+    Compute the hash of a file content, as stored in the manifest entries (see storeArchiveObject).
+
+    Parameters:
+    file_path (str): The path to the file.
+    chunk_size (int): The number of bytes read at once. Defaults to archive_chunk_size.
+
+    Returns:
+    str: The hexadecimal sha256 of the file content.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+
+def storeArchiveObject(source_file: str, compression=archive_compression, path_data_archives=path_data_archives) -> dict:
+    """
+    Store a file content in the archive, if it isn't stored yet.
+
+    The file is read once: it is hashed while it is written (compressed or not) to a temporary file,
+    which becomes the object file if the content is new, and is removed otherwise.
+
+    Parameters:
+    source_file (str): The path to the file.
+    compression (str): "gzip" or "none" (already compressed files are never compressed). Defaults to archive_compression.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    dict: The manifest entry of the file ({"hash", "size", "compression"}).
+    """
+    if compression != "gzip" or source_file.lower().endswith(archive_compressed_extensions):
+        compression = None
+
+    objects_path = os.path.join(path_data_archives, archive_objects_folder)
+    os.makedirs(objects_path, exist_ok=True)
+    temporary_file = os.path.join(objects_path, f".{os.path.basename(source_file)}.{os.getpid()}.tmp")
+
+    file_hash = hashlib.sha256()
+    size = 0
+    with open(source_file, 'rb') as source, open(temporary_file, 'wb') as temporary:
+        destination = gzip.GzipFile(fileobj=temporary, mode='wb', mtime=0) if compression == "gzip" else temporary
+        for chunk in iter(lambda: source.read(archive_chunk_size), b''):
+            file_hash.update(chunk)
+            destination.write(chunk)
+            size += len(chunk)
+        if compression == "gzip":
+            destination.close()
+
+    file_hash = file_hash.hexdigest()
+    object_file = getArchiveObjectPath(file_hash, compression, path_data_archives)
+
+    if os.path.exists(object_file):
+        os.remove(temporary_file)
+    else:
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        os.replace(temporary_file, object_file)
+
+    return {"hash": file_hash, "size": size, "compression": compression}
+
+
+
+def listArchiveManifests(path_data_archives=path_data_archives) -> list:
+    """
+    List the archiving runs, oldest first.
+
+    Parameters:
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    list: The run ids (manifest names without extension).
+    """
+    manifests_path = os.path.join(path_data_archives, archive_manifests_folder)
+
+    if not os.path.isdir(manifests_path):
+        return []
+
+    return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(manifests_path) if file_name.endswith(".json"))
+
+
+
+def loadArchiveManifest(run_id: str, path_data_archives=path_data_archives) -> dict:
+    """
+    Load the manifest of an archiving run.
+
+    Parameters:
+    run_id (str): The run id.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    dict: The manifest ({"run_id", "created", "files": {file name: {"hash", "size", "compression", "mtime_ns"}}}).
+    """
+    with open(os.path.join(path_data_archives, archive_manifests_folder, run_id + ".json"), 'r') as f:
+        return json.load(f)
+
+
+
+def writeArchiveManifest(manifest: dict, path_data_archives=path_data_archives) -> None:
     """
-    Create a data archive by copying files and directories from the source path to the archive path.
+    Write the manifest of an archiving run (through a temporary file).
+
+    Parameters:
+    manifest (dict): The manifest (see loadArchiveManifest).
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
 
-    :param path_data_source: The path to the source directory.
-    :param path_data_archives: The path to the archive directory.
+    Returns:
+    None
     """
-    # Create a new folder with the current date
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    new_folder = os.path.join(path_data_archives, today)
+    manifests_path = os.path.join(path_data_archives, archive_manifests_folder)
+    os.makedirs(manifests_path, exist_ok=True)
+
+    manifest_file = os.path.join(manifests_path, manifest["run_id"] + ".json")
+    with open(manifest_file + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+
+
+def openArchivedFile(file_entry: dict, path_data_archives=path_data_archives):
+    """
+    Open an archived file (decompressed if needed).
+
+    Parameters:
+    file_entry (dict): The manifest entry of the file.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    file: The file, opened in binary mode.
+    """
+    object_file = getArchiveObjectPath(file_entry["hash"], file_entry["compression"], path_data_archives)
+
+    return gzip.open(object_file, 'rb') if file_entry["compression"] == "gzip" else open(object_file, 'rb')
+
+
+
+def archiveFiles(source_files: list, run_id: str, created: str, compression=archive_compression, path_data_archives=path_data_archives) -> dict:
+    """
+    Archive files as an archiving run: their contents are stored once (see storeArchiveObject) and the run manifest is written.
+
+    Files unchanged since the last run (same size & modification time) are not read again, their object is reused.
+
+    Parameters:
+    source_files (list): The paths to the files.
+    run_id (str): The run id.
+    created (str): The date of the run (ISO format).
+    compression (str): "gzip" or "none". Defaults to archive_compression.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    dict: The manifest of the run.
+    """
+    run_ids = listArchiveManifests(path_data_archives)
+    previous_files = loadArchiveManifest(run_ids[-1], path_data_archives)["files"] if run_ids else {}
+
+    manifest = {"run_id": run_id, "created": created, "files": {}}
+    for source_file in source_files:
+        filename = os.path.basename(source_file)
+        file_stat = os.stat(source_file)
+        previous_entry = previous_files.get(filename)
+
+        if previous_entry is not None and previous_entry.get("mtime_ns") == file_stat.st_mtime_ns and previous_entry["size"] == file_stat.st_size \
+                and os.path.exists(getArchiveObjectPath(previous_entry["hash"], previous_entry["compression"], path_data_archives)):
+            file_entry = dict(previous_entry)
+        else:
+            file_entry = storeArchiveObject(source_file, compression, path_data_archives)
+            file_entry["mtime_ns"] = file_stat.st_mtime_ns
+
+        manifest["files"][filename] = file_entry
+
+    writeArchiveManifest(manifest, path_data_archives)
+
+    return manifest
+
+
+
+def pruneArchives(retention_days=archive_retention_days, path_data_archives=path_data_archives, now=None) -> dict:
+    """
+    Apply the retention policy: remove the manifests older than retention_days (the last manifest is always kept),
+    then the objects no longer used by any manifest.
+
+    Parameters:
+    retention_days (int): The number of days a manifest is kept (0 = kept forever). Defaults to archive_retention_days.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+    now (datetime, optional): The current date. Defaults to None (now).
+
+    Returns:
+    dict: The removed manifests ("manifests") & objects ("objects").
+    """
+    removed = {"manifests": [], "objects": []}
+    run_ids = listArchiveManifests(path_data_archives)
+
+    if retention_days:
+        limit = (now or datetime.now()) - timedelta(days=retention_days)
+        for run_id in run_ids[:-1]:
+            if datetime.fromisoformat(loadArchiveManifest(run_id, path_data_archives)["created"]) < limit:
+                os.remove(os.path.join(path_data_archives, archive_manifests_folder, run_id + ".json"))
+                removed["manifests"].append(run_id)
+
+    if not removed["manifests"]:
+        return removed
+
+    # Objects still used
+    used_objects = set()
+    for run_id in listArchiveManifests(path_data_archives):
+        for file_entry in loadArchiveManifest(run_id, path_data_archives)["files"].values():
+            used_objects.add(getArchiveObjectPath(file_entry["hash"], file_entry["compression"], path_data_archives))
+
+    objects_path = os.path.join(path_data_archives, archive_objects_folder)
+    for folder in os.listdir(objects_path):
+        folder_path = os.path.join(objects_path, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for object_name in os.listdir(folder_path):
+            object_file = os.path.join(folder_path, object_name)
+            if object_file not in used_objects:
+                os.remove(object_file)
+                removed["objects"].append(object_name)
+
+    return removed
+
+
+
+def createDataArchive(path_data_source=path_data_source, path_data_archives=path_data_archives, compression=archive_compression, retention_days=archive_retention_days) -> dict:
+    """
+    Archive the scraped datas (files of the source folder), then apply the retention policy.
+
+    Each file content is stored once in the archive (see archiveFiles), the run manifest lists the archived files:
+    the archiving time & the disk used only grow with the changed files.
+
+    Parameters:
+    path_data_source (str): The path to the scraped datas. Defaults to path_data_source.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+    compression (str): "gzip" or "none". Defaults to archive_compression.
+    retention_days (int): The number of days a manifest is kept (0 = kept forever). Defaults to archive_retention_days.
+
+    Returns:
+    dict: The manifest of the run.
+    """
+    now = datetime.now()
+    source_files = sorted(os.path.join(path_data_source, filename) for filename in os.listdir(path_data_source)
+                          if os.path.isfile(os.path.join(path_data_source, filename)) and not filename.startswith("."))
+
+    manifest = archiveFiles(source_files, now.strftime('%Y-%m-%d_%H-%M-%S_%f'), now.isoformat(timespec='seconds'), compression, path_data_archives)
+    pruneArchives(retention_days, path_data_archives, now)
+
+    return manifest
+
+
+
+def migrateDatedArchives(path_data_archives=path_data_archives, compression=archive_compression, remove=True) -> list:
+    """
+    Convert the dated folders of the previous archive format (<YYYY-MM-DD>/<files>) to manifests & objects.
+
+    Parameters:
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+    compression (str): "gzip" or "none". Defaults to archive_compression.
+    remove (bool): Remove the dated folders once converted. Defaults to True.
+
+    Returns:
+    list: The converted folders (run ids).
+    """
+    migrated = []
+
+    for folder in sorted(os.listdir(path_data_archives)):
+        folder_path = os.path.join(path_data_archives, folder)
+        try:
+            created = datetime.strptime(folder, '%Y-%m-%d')
+        except ValueError:
+            continue
+        if not os.path.isdir(folder_path):
+            continue
+
+        source_files = sorted(os.path.join(folder_path, filename) for filename in os.listdir(folder_path)
+                              if os.path.isfile(os.path.join(folder_path, filename)) and not filename.startswith("."))
+        archiveFiles(source_files, folder, created.isoformat(timespec='seconds'), compression, path_data_archives)
+        migrated.append(folder)
+
+        if remove:
+            shutil.rmtree(folder_path)
+
+    return migrated
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scraped datas archive")
+    parser.add_argument("--migrate", action="store_true", help="Convert the dated folders of the previous archive format to manifests")
+    parser.add_argument("--keep-folders", action="store_true", help="Keep the dated folders once converted")
+    parser.add_argument("--prune", action="store_true", help="Apply the retention policy (ARCHIVE_RETENTION_DAYS)")
+    parser.add_argument("--archives-dir", default=path_data_archives, help="Archives folder")
+    args = parser.parse_args()
 
-    # Create the new folder if it doesn't already exist
-    if not os.path.exists(new_folder):
-        os.makedirs(new_folder)
+    if args.migrate:
+        migrated = migrateDatedArchives(args.archives_dir, remove=not args.keep_folders)
+        print(f"{len(migrated)} dated folders converted: {migrated}")
 
-    for filename in os.listdir(path_data_source):
-        source_file = os.path.join(path_data_source, filename)
-        destination_file = os.path.join(new_folder, filename)
+    if args.prune:
+        removed = pruneArchives(path_data_archives=args.archives_dir)
+        print(f"{len(removed['manifests'])} manifests & {len(removed['objects'])} objects removed")
 
-        shutil.copy(source_file, destination_file)
\ No newline at end of file
+    if not args.migrate and not args.prune:
+        parser.print_help()
@@ -0,0 +1,268 @@
+"""
+Archive replay - historical odds & results datasets rebuilt from the scraped datas archives
+
+Usage:
+    python archive_replay.py [--workers 4]
+"""
+
+"""
+Libraries
+"""
+import pandas as pd
+import zipfile
+import time
+import os
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from common_variables import path_data_archives, path_data_clean, main_leagues_dictionary, columns_to_keep_for_features, raw_data_dtypes, archive_replay_workers
+from archive_datas_source import listArchiveManifests, loadArchiveManifest, openArchivedFile, hashArchiveFile, archive_objects_folder, archive_manifests_folder
+from clean_data_store import writeCleanData
+from odds_store import odds_columns
+
+
+"""
+Variables
+"""
+# Historical datasets (clean datas folder)
+archive_history_folder = "history"
+odds_history_file = "odds_history.csv"
+results_history_file = "results_history.csv"
+
+# Historical datasets are always stored with a columnar file (see writeCleanData)
+archive_history_format = "parquet"
+
+# Keys of the historical datasets
+odds_history_key = ["Championship", "Date", "HomeTeam", "AwayTeam", "ScrapedAt"]
+results_history_key = ["Championship", "Date", "HomeTeam", "AwayTeam"]
+
+# Suffix of the scraped odds files
+odds_file_suffix = "_odds.csv"
+
+# Number of decoded files merged at once (bounds the memory used by years of archives)
+archive_replay_merge_every = 64
+
+
+"""
+Functions
+"""
+def isArchivedDataFile(filename: str) -> bool:
+    """
+    Check if an archived file is decoded by the replay (odds files & match history zip files).
+
+    Parameters:
+    filename (str): The name of the archived file.
+
+    Returns:
+    bool: True for the odds files & match history zip files.
+    """
+    return filename.endswith(odds_file_suffix) or filename.endswith(".zip")
+
+
+
+def listArchivedFiles(path_data_archives=path_data_archives) -> list:
+    """
+    List the distinct archived files to decode (odds files & match history zip files).
+
+    Archiving runs come from the manifests, and from the dated folders of the previous archive format.
+    Files are identified by their name and content hash (sha256, computed for the dated folder files): a content
+    listed by several runs is decoded once. Odds snapshots get the date of the first run which archived them,
+    match histories the position of the last one (the most recent results win).
+
+    Parameters:
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    list: The files to decode, as dicts {"filename", "source", "scraped_at", "run_order", "size"}.
+    """
+    runs = []
+    for run_id in listArchiveManifests(path_data_archives):
+        manifest = loadArchiveManifest(run_id, path_data_archives)
+        runs.append((manifest["created"], {filename: dict(file_entry) for filename, file_entry in manifest["files"].items()}))
+
+    for folder in os.listdir(path_data_archives) if os.path.isdir(path_data_archives) else []:
+        folder_path = os.path.join(path_data_archives, folder)
+        if folder in (archive_objects_folder, archive_manifests_folder) or not os.path.isdir(folder_path):
+            continue
+        try:
+            created = datetime.strptime(folder, '%Y-%m-%d').isoformat(timespec='seconds')
+        except ValueError:
+            continue
+        runs.append((created, {filename: {"path": os.path.join(folder_path, filename),
+                                          "size": os.path.getsize(os.path.join(folder_path, filename)),
+                                          "hash": hashArchiveFile(os.path.join(folder_path, filename))}
+                               for filename in os.listdir(folder_path) if isArchivedDataFile(filename)}))
+
+    archived_files = {}
+    for run_order, (created, files) in enumerate(sorted(runs, key=lambda run: run[0])):
+        for filename, source in files.items():
+            if not isArchivedDataFile(filename):
+                continue
+
+            content_key = (filename, source["hash"])
+            if content_key not in archived_files:
+                archived_files[content_key] = {"filename": filename, "source": source, "scraped_at": created, "size": source["size"]}
+            archived_files[content_key]["run_order"] = run_order
+
+    return list(archived_files.values())
+
+
+
+def openArchivedSource(source: dict, path_data_archives=path_data_archives):
+    """
+    Open an archived file, stored as an object (manifest entry) or in a dated folder.
+
+    Parameters:
+    source (dict): The manifest entry, or {"path"} for a dated folder file.
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    file: The file, opened in binary mode.
+    """
+    if "path" in source:
+        return open(source["path"], 'rb')
+
+    return openArchivedFile(source, path_data_archives)
+
+
+
+def decodeArchivedFile(archived_file: dict, path_data_archives=path_data_archives) -> tuple:
+    """
+    Decode an archived file: a scraped odds file, or a match history zip file (1 CSV file per championship).
+
+    Parameters:
+    archived_file (dict): The file to decode (see listArchivedFiles).
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+
+    Returns:
+    tuple: The dataset ("odds" or "results") and the decoded rows (pd.DataFrame with a "Championship" column).
+    """
+    filename = archived_file["filename"]
+
+    with openArchivedSource(archived_file["source"], path_data_archives) as f:
+        if filename.endswith(odds_file_suffix):
+            odds = pd.read_csv(f)
+            odds.insert(0, "Championship", filename[:-len(odds_file_suffix)])
+            odds["Date"] = pd.to_datetime(odds["Date"], format='%d/%m/%Y')
+            # Missing odds ("-") -> NaN
+            odds[odds_columns[3:]] = odds[odds_columns[3:]].apply(pd.to_numeric, errors='coerce')
+            odds["ScrapedAt"] = pd.Timestamp(archived_file["scraped_at"])
+            return "odds", odds
+
+        results = []
+        with zipfile.ZipFile(f) as zip_ref:
+            for member in zip_ref.namelist():
+                championship = main_leagues_dictionary.get(os.path.splitext(os.path.basename(member))[0])
+                if championship is None:
+                    continue
+                with zip_ref.open(member) as member_file:
+                    championship_results = pd.read_csv(member_file, usecols=lambda column: column in columns_to_keep_for_features,
+                                                       dtype=raw_data_dtypes)
+                championship_results.insert(0, "Championship", championship)
+                results.append(championship_results)
+
+    results = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=["Championship"] + columns_to_keep_for_features)
+    results["Date"] = pd.to_datetime(results["Date"], dayfirst=True, format='mixed')
+    results["RunOrder"] = archived_file["run_order"]
+
+    return "results", results
+
+
+
+def mergeHistory(frames: list, dataset: str) -> pd.DataFrame:
+    """
+    Merge decoded rows of a dataset and remove the duplicates.
+
+    Odds: 1 row per match & scrape. Results: 1 row per match, from the most recent archiving run.
+
+    Parameters:
+    frames (list): The decoded rows (pd.DataFrame).
+    dataset (str): "odds" or "results".
+
+    Returns:
+    pd.DataFrame: The merged rows.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    merged = pd.concat(frames, ignore_index=True)
+
+    if dataset == "odds":
+        return merged.drop_duplicates(subset=odds_history_key, keep='first')
+
+    return merged.sort_values("RunOrder", kind="stable").drop_duplicates(subset=results_history_key, keep='last')
+
+
+
+def replayArchives(path_data_archives=path_data_archives, path_data_clean=path_data_clean, n_workers=archive_replay_workers) -> dict:
+    """
+    Rebuild the historical odds & results datasets from every archiving run.
+
+    The distinct archived files are decoded in parallel by a pool of n_workers processes, then merged
+    (without duplicates) and stored in the clean datas folder ("history" folder, CSV & columnar files).
+
+    Parameters:
+    path_data_archives (str): The path to the archives. Defaults to path_data_archives.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+    n_workers (int): The number of processes decoding the files. Defaults to archive_replay_workers.
+
+    Returns:
+    dict: The replay report: number of files & bytes decoded, rows of each dataset, time & throughput.
+    """
+    start_time = time.perf_counter()
+    archived_files = listArchivedFiles(path_data_archives)
+
+    history = {"odds": [], "results": []}
+    def addDecodedFile(dataset, rows):
+        history[dataset].append(rows)
+        if len(history[dataset]) >= archive_replay_merge_every:
+            history[dataset] = [mergeHistory(history[dataset], dataset)]
+
+    if n_workers > 1 and len(archived_files) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(decodeArchivedFile, archived_file, path_data_archives) for archived_file in archived_files]
+            for future in as_completed(futures):
+                addDecodedFile(*future.result())
+    else:
+        for archived_file in archived_files:
+            addDecodedFile(*decodeArchivedFile(archived_file, path_data_archives))
+
+    odds_history = mergeHistory(history["odds"], "odds")
+    results_history = mergeHistory(history["results"], "results")
+
+    history_path = os.path.join(path_data_clean, archive_history_folder)
+    os.makedirs(history_path, exist_ok=True)
+
+    if not odds_history.empty:
+        odds_history = odds_history.sort_values(["Championship", "Date", "HomeTeam", "AwayTeam", "ScrapedAt"]).reset_index(drop=True)
+        writeCleanData(odds_history, os.path.join(history_path, odds_history_file), archive_history_format)
+    if not results_history.empty:
+        results_history = results_history.drop(columns="RunOrder").sort_values(["Championship", "Date", "HomeTeam", "AwayTeam"]).reset_index(drop=True)
+        writeCleanData(results_history, os.path.join(history_path, results_history_file), archive_history_format)
+
+    seconds = time.perf_counter() - start_time
+    decoded_bytes = sum(archived_file["size"] for archived_file in archived_files)
+
+    return {"files": len(archived_files),
+            "megabytes": round(decoded_bytes / 1024 / 1024, 2),
+            "odds_rows": len(odds_history),
+            "results_rows": len(results_history),
+            "seconds": round(seconds, 2),
+            "files_per_second": round(len(archived_files) / seconds, 1) if seconds else None,
+            "megabytes_per_second": round(decoded_bytes / 1024 / 1024 / seconds, 2) if seconds else None}
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the historical odds & results datasets from the archives")
+    parser.add_argument("--workers", type=int, default=archive_replay_workers, help="Number of processes decoding the archived files")
+    parser.add_argument("--archives-dir", default=path_data_archives, help="Archives folder")
+    parser.add_argument("--clean-dir", default=path_data_clean, help="Clean datas folder (the datasets are stored in its 'history' folder)")
+    args = parser.parse_args()
+
+    report = replayArchives(args.archives_dir, args.clean_dir, args.workers)
+    print(f"{report['files']} files ({report['megabytes']} MB) decoded in {report['seconds']} s "
+          f"({report['files_per_second']} files/s, {report['megabytes_per_second']} MB/s)")
+    print(f"{report['odds_rows']} odds rows, {report['results_rows']} results rows")
@@ -0,0 +1,316 @@
+"""
+Clean datas storage - CSV & columnar (Parquet / Feather) files
+"""
+
+"""
+Libraries
+"""
+import pandas as pd
+import numpy as np
+import os
+import json
+
+from common_variables import clean_data_format, path_data_clean
+
+
+"""
+Variables
+"""
+# Columnar formats available & file extensions
+columnar_extensions = {"parquet": ".parquet", "feather": ".feather"}
+
+# Team registry file (stored next to available_teams.json)
+team_registry_file = "team_registry.json"
+
+# Team ID column (registry team ID) stored next to each team name column
+team_id_columns = {"HomeTeam": "HomeTeamId", "AwayTeam": "AwayTeamId", "Team": "TeamId"}
+
+# Declared schema of the clean datas
+    # Text columns with few distinct values (team names, results)
+category_columns = ["HomeTeam", "AwayTeam", "FTR"]
+    # Ratio & average columns (team stats)
+float32_column_patterns = ["Ratio", "Average"]
+
+
+"""
+Functions
+"""
+def getColumnarFilePath(file_path: str, data_format=clean_data_format) -> str:
+    """
+    Get the path of the columnar file stored next to a clean CSV file.
+
+    Parameters:
+    file_path (str): The path to the clean CSV file (e.g. ".../statsHomeTeam.csv").
+    data_format (str): The columnar format ("parquet" or "feather"). Defaults to clean_data_format.
+
+    Returns:
+    str: The path to the columnar file (e.g. ".../statsHomeTeam.parquet").
+
+    Raises:
+    ValueError: If the data format is not a columnar format.
+    """
+    if data_format not in columnar_extensions:
+        raise ValueError(f"The data format must be one of {list(columnar_extensions)}.")
+
+    return os.path.splitext(file_path)[0] + columnar_extensions[data_format]
+
+
+
+def applyCleanDataSchema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the declared clean datas schema to a DataFrame.
+
+    - Team names & results are stored as categories.
+    - Ratios & averages are stored as float32.
+    - Counts (integer columns without missing values) are stored in the smallest integer type.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to convert.
+
+    Returns:
+    pd.DataFrame: The converted DataFrame.
+    """
+    df = df.copy()
+
+    for column in df.columns:
+        if column in category_columns:
+            df[column] = df[column].astype('category')
+
+        elif any(pattern in column for pattern in float32_column_patterns) and pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype(np.float32)
+
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    return df
+
+
+
+def writeCleanData(df: pd.DataFrame, file_path: str, data_format=clean_data_format) -> None:
+    """
+    Write a clean DataFrame.
+
+    The CSV file is always written (readable by humans, dates as dd/mm/yyyy like the raw datas).
+    If the data format is columnar, a typed columnar file is written next to it (see getColumnarFilePath).
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to write.
+    file_path (str): The path to the clean CSV file.
+    data_format (str): "csv", "parquet" or "feather". Defaults to clean_data_format.
+
+    Returns:
+    None
+    """
+    df.to_csv(file_path, index=False, date_format='%d/%m/%Y')
+
+    if data_format == "csv":
+        return
+
+    columnar_file_path = getColumnarFilePath(file_path, data_format)
+    typed_df = applyCleanDataSchema(df).reset_index(drop=True)
+
+    if data_format == "parquet":
+        typed_df.to_parquet(columnar_file_path, index=False)
+    else:
+        typed_df.to_feather(columnar_file_path)
+
+
+
+def readCleanData(file_path: str, columns=None, data_format=clean_data_format) -> pd.DataFrame:
+    """
+    Read a clean DataFrame.
+
+    If the data format is columnar and the columnar file exists, only the requested columns are loaded from it.
+    Otherwise the CSV file is read.
+
+    Parameters:
+    file_path (str): The path to the clean CSV file.
+    columns (list, optional): The columns to load. Defaults to None (all columns).
+    data_format (str): "csv", "parquet" or "feather". Defaults to clean_data_format.
+
+    Returns:
+    pd.DataFrame: The clean datas.
+    """
+    if data_format != "csv":
+        columnar_file_path = getColumnarFilePath(file_path, data_format)
+
+        if os.path.exists(columnar_file_path):
+            if data_format == "parquet":
+                return pd.read_parquet(columnar_file_path, columns=columns)
+            return pd.read_feather(columnar_file_path, columns=columns)
+
+    return pd.read_csv(file_path, usecols=columns)
+
+
+
+"""
+Team registry Functions
+"""
+def getTeamRegistryPath(championship: str, path_data_clean=path_data_clean) -> str:
+    """
+    Get the path of the team registry of a championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    str: The path to the team registry file.
+    """
+    return os.path.join(path_data_clean, championship, team_registry_file)
+
+
+
+def loadTeamRegistry(championship: str, path_data_clean=path_data_clean) -> dict:
+    """
+    Load the team registry of a championship.
+
+    The registry maps each canonical team name (after update_team_names) to a dense integer ID.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    dict: The team registry ({team name: team ID}), empty if the championship has no registry yet.
+    """
+    registry_path = getTeamRegistryPath(championship, path_data_clean)
+
+    if not os.path.exists(registry_path):
+        return {}
+
+    with open(registry_path, 'r') as f:
+        return json.load(f)
+
+
+
+def updateTeamRegistry(championship: str, teams: list, path_data_clean=path_data_clean) -> dict:
+    """
+    Add the new teams of a championship to its team registry and save it.
+
+    IDs already given are kept (new teams get the next IDs, in alphabetical order),
+    so the IDs stay stable from one pre-processing run to the next.
+
+    Parameters:
+    championship (str): The name of the championship.
+    teams (list): The canonical team names available for the championship.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    dict: The updated team registry ({team name: team ID}).
+    """
+    registry = loadTeamRegistry(championship, path_data_clean)
+
+    new_teams = sorted(set(teams) - set(registry))
+    for team in new_teams:
+        registry[team] = len(registry)
+
+    if new_teams or not os.path.exists(getTeamRegistryPath(championship, path_data_clean)):
+        os.makedirs(os.path.dirname(getTeamRegistryPath(championship, path_data_clean)), exist_ok=True)
+        with open(getTeamRegistryPath(championship, path_data_clean), 'w') as f:
+            json.dump(registry, f)
+
+    return registry
+
+
+
+def encodeTeams(teams, registry: dict) -> np.ndarray:
+    """
+    Convert team names to their team IDs.
+
+    Parameters:
+    teams (array-like): The team names.
+    registry (dict): The team registry ({team name: team ID}).
+
+    Returns:
+    np.ndarray: The team IDs (-1 for the teams missing from the registry).
+    """
+    teams = np.asarray(teams, dtype=object)
+    team_ids = np.full(len(teams), -1, dtype=np.int64)
+
+    if registry:
+        registry_ids = np.fromiter(registry.values(), dtype=np.int64, count=len(registry))
+        positions = pd.Index(list(registry), dtype=object).get_indexer(teams)
+        team_ids[positions >= 0] = registry_ids[positions[positions >= 0]]
+
+    return team_ids
+
+
+
+def addTeamIds(df: pd.DataFrame, registry: dict) -> pd.DataFrame:
+    """
+    Add the team ID column next to each team name column of a DataFrame (see team_id_columns).
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame with team name columns ("HomeTeam", "AwayTeam" or "Team").
+    registry (dict): The team registry ({team name: team ID}).
+
+    Returns:
+    pd.DataFrame: The DataFrame with the team ID columns (-1 for the teams missing from the registry).
+    """
+    df = df.copy()
+
+    for name_column, id_column in team_id_columns.items():
+        if name_column in df.columns:
+            if id_column in df.columns:
+                df = df.drop(columns=id_column)
+            df.insert(df.columns.get_loc(name_column) + 1, id_column, encodeTeams(df[name_column], registry))
+
+    return df
+
+
+
+def getTeamRowPositions(row_team_ids, team_ids) -> np.ndarray:
+    """
+    Get the row positions of teams in a table with one row per team, from their registry team IDs.
+
+    The rows are found with an array gather on the integer IDs (team ID -> row position),
+    so the result can be used with DataFrame.iloc instead of a join on the team names.
+
+    Parameters:
+    row_team_ids (array-like): The team ID of each row of the table (see addTeamIds).
+    team_ids (array-like): The team IDs to look for (-1 for unknown teams).
+
+    Returns:
+    np.ndarray: The row position of each team in the table (-1 for the teams missing from the table).
+    """
+    row_team_ids = np.asarray(row_team_ids, dtype=np.int64)
+    team_ids = np.asarray(team_ids, dtype=np.int64)
+
+    # Team ID -> row position
+    id_to_row = np.full(max(row_team_ids.max(initial=-1), team_ids.max(initial=-1)) + 1, -1, dtype=np.int64)
+    known_rows = row_team_ids >= 0
+    id_to_row[row_team_ids[known_rows]] = np.flatnonzero(known_rows)
+
+    positions = np.full(len(team_ids), -1, dtype=np.int64)
+    known_teams = team_ids >= 0
+    positions[known_teams] = id_to_row[team_ids[known_teams]]
+
+    return positions
+
+
+
+def findMatchRows(df: pd.DataFrame, registry: dict, home_team: str, away_team: str) -> np.ndarray:
+    """
+    Find the rows of a match in a DataFrame with team ID columns ("HomeTeamId", "AwayTeamId").
+
+    The team IDs are looked up in the team registry, then the rows are found on the integer ID columns.
+    Files written before the team IDs (no ID columns or no registry) are searched on the team names.
+
+    Parameters:
+    df (pd.DataFrame): The matches (e.g. the predictions of a championship).
+    registry (dict): The team registry ({team name: team ID}).
+    home_team (str): The name of the home team.
+    away_team (str): The name of the away team.
+
+    Returns:
+    np.ndarray: The row positions of the match (empty if the match is not found).
+    """
+    if registry and {"HomeTeamId", "AwayTeamId"} <= set(df.columns):
+        home_id, away_id = registry.get(home_team, -1), registry.get(away_team, -1)
+        if home_id < 0 or away_id < 0:
+            return np.array([], dtype=np.int64)
+
+        return np.flatnonzero((df["HomeTeamId"].to_numpy() == home_id) & (df["AwayTeamId"].to_numpy() == away_id))
+
+    return np.flatnonzero((df["HomeTeam"] == home_team).to_numpy() & (df["AwayTeam"] == away_team).to_numpy())
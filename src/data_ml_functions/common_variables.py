@@ -15,6 +15,20 @@ path_data_source = os.getenv("PATH_DATA_SOURCE", "../../storage/data/source/") #
 path_data_archives = os.getenv("PATH_DATA_ARCHIVES", "../../storage/data/archives/") # Archives form scrap stored here
 path_data_raw = os.getenv("PATH_DATA_RAW", '../../storage/data/raw/') # Raw data corresponding to unzip files from source
 path_data_clean = os.getenv("PATH_DATA_CLEAN", '../../storage/data/clean/') # Clean datas (pre-processed datas) stored here
+path_data_cache = os.getenv("PATH_DATA_CACHE", '../../storage/data/cache/') # Pre-processing stages results (stage cache) stored here
+path_data_odds = os.getenv("PATH_DATA_ODDS", '../../storage/data/odds/') # Odds store (every scraped odds snapshot) stored here
+
+# Archives of the scraped datas (content-addressed, see archive_datas_source.py)
+    # Compression of the archived files : "gzip" or "none" (zip & xlsx files are never compressed again)
+archive_compression = os.getenv("ARCHIVE_COMPRESSION", "gzip")
+    # Number of days an archiving run is kept (0 = kept forever)
+archive_retention_days = int(os.getenv("ARCHIVE_RETENTION_DAYS", 0))
+    # Number of processes decoding the archived files (archive replay, see archive_replay.py)
+archive_replay_workers = int(os.getenv("ARCHIVE_REPLAY_WORKERS", os.cpu_count() or 1))
+
+# Clean datas storage format : "csv", "parquet" or "feather"
+    # CSV files are always written, columnar files (typed, faster to load) are written next to them
+clean_data_format = os.getenv("CLEAN_DATA_FORMAT", "csv")
 
 
 # Path to models in storage
@@ -50,6 +64,19 @@ other_leagues_current_season_url = base_url + "new/new_leagues_data.xlsx" # Same
 main_leagues_filename = path_data_source + "main_leagues_data.zip" # Used for main leagues match histories scraping
 other_leagues_filename = path_data_source + "other_leagues_data.xlsx" # Used for other leagues match histories scraping
 
+# Downloads
+    # Size of the chunks written to disk while a file is downloaded (bytes) & request timeout (seconds)
+download_chunk_size = 1024 * 1024
+download_timeout = int(os.getenv("DOWNLOAD_TIMEOUT", 60))
+
+# Season filter (other leagues raw datas)
+    # Number of rows read at once & format of the 'Date' column (as written by convertWorkbookToCsv)
+season_filter_chunk_size = 50000
+other_leagues_date_format = '%Y-%m-%d'
+
+# Number of workbook sheets (other leagues) converted to CSV in parallel (1 = serial)
+xlsx_conversion_workers = int(os.getenv("XLSX_CONVERSION_WORKERS", 1))
+
 # Filename dictionnaries
     # Scraped file names should be changed to the following names
 main_leagues_dictionary = {'B1': 'Belgian Pro League',
@@ -109,6 +136,15 @@ CSS_SELECTOR_MATCH_DETAILS = 'div[class="border-black-borders border-b border-l
 CSS_SELECTOR_MATCH_TEAMS = 'p[class="participant-name truncate"]'
 CSS_SELECTOR_MATCH_ODDS = 'div[class^="flex-center border-black-main min-w-"] p'
 
+# Odds extraction : "page_source" (page source parsed once with the CSS selectors) or "webdriver" (elements read one by one)
+odds_extraction_mode = os.getenv("ODDS_EXTRACTION_MODE", "page_source")
+
+# Scraper replay (offline) : championship pages recorded during a scraping are read instead of the live site
+    # Folder or base URL (local HTTP server, e.g. "http://localhost:8000/") of the recorded pages, empty = live site
+scraping_replay_source = os.getenv("SCRAPING_REPLAY_SOURCE", "")
+    # Folder where the scraped championship pages are recorded, empty = pages not recorded
+scraping_record_dir = os.getenv("SCRAPING_RECORD_DIR", "")
+
 
 odds_base_url = "https://www.oddsportal.com/football/"
 
@@ -120,6 +156,20 @@ championship_url_dict = {'English Premier League' : 'england/premier-league/',
     # /!\ You need to have the geckodriver installed on your machine [Dockerfile.airflow already installs it]
 driver_path = os.getenv("DRIVER_PATH", './geckodriver')
 
+# Number of WebDriver restarts allowed when the browser crashes while a championship is scraped
+webdriver_max_restarts = int(os.getenv("WEBDRIVER_MAX_RESTARTS", 2))
+
+# Number of championships scraped in parallel (1 headless browser per worker, 1 = serial)
+scraping_workers = int(os.getenv("SCRAPING_WORKERS", 1))
+
+# Default timeout (seconds) of a championship scraping attempt & number of retries after a failed attempt
+scraping_league_timeout = int(os.getenv("SCRAPING_LEAGUE_TIMEOUT", 120))
+scraping_league_retries = int(os.getenv("SCRAPING_LEAGUE_RETRIES", 1))
+
+# Timeout & retries of a championship, if different from the defaults
+    # Ex: {'English Premier League': {'timeout': 300, 'retries': 2}}
+scraping_league_policies = {}
+
 
 
 # Since team names can be different from one source to another, we need to update them
@@ -173,6 +223,48 @@ columns_to_keep_for_features = ["Date",
                                 "HR",
                                 "AR"]
 
+# Team stats aggregated from the raw match history columns
+    # (home team column, away team column, stat name for the team, stat name for its opponent)
+team_stats_columns = [("FTHG", "FTAG", "TotalGoalsScored", "TotalGoalsConceded"),
+                      ("HTHG", "HTAG", "TotalHalfTimeGoalsScored", "TotalHalfTimeGoalsConceded"),
+                      ("HS", "AS", "TotalShots", "TotalShotsConceded"),
+                      ("HST", "AST", "TotalShotsOnTarget", "TotalShotsOnTargetConceded"),
+                      ("HC", "AC", "TotalCorners", "TotalCornersConceded"),
+                      ("HF", "AF", "TotalFoulsCommitted", "TotalFoulsSuffered"),
+                      ("HY", "AY", "TotalYellowCards", "TotalYellowCardsOpponent"),
+                      ("HR", "AR", "TotalRedCards", "TotalRedCardsOpponent")]
+
+# Types of the raw match history columns (stats are nullable integers, some leagues have missing values)
+raw_data_dtypes = {column: "Int32" for column in columns_to_keep_for_features if column not in ["Date", "HomeTeam", "AwayTeam", "FTR", "HTR"]}
+raw_data_dtypes.update({"HomeTeam": "str", "AwayTeam": "str", "FTR": "str", "HTR": "str"})
+
+# Number of rows read at once from large raw match history files (None = read the whole file at once)
+raw_data_chunksize = int(os.getenv("RAW_DATA_CHUNKSIZE", 0)) or None
+
+# Form score : points given for each result over the last matches (window)
+form_score_points = {"H": 3, "D": 1, "A": -1}
+form_score_window = 5
+
+# Elo team ratings
+    # Rating of a team without match, maximum rating points exchanged in a match, rating points added to the home team
+elo_initial_rating = 1500
+elo_k_factor = 20
+elo_home_advantage = 60
+
+# Target variable encoding
+ftr_mapping = {"H": 0, "D": 1, "A": 2}
+
+# Features used to build match_data_for_modeling.csv
+    # "season" : team stats aggregated over the whole season (same stats for every match)
+    # "asof" : team stats computed only from the matches played before each match (point-in-time)
+modeling_features = os.getenv("MODELING_FEATURES", "season")
+
+# Number of championships pre-processed in parallel (1 process per championship, 1 = serial)
+preprocessing_workers = int(os.getenv("PREPROCESSING_WORKERS", 1))
+
+# Maximum size of the pre-processing stage cache, in MB (least recently used results are removed, 0 = cache disabled)
+stage_cache_max_size = int(os.getenv("STAGE_CACHE_MAX_SIZE", 256)) * 1024 * 1024
+
 
 ###############################################################################################################################
 
@@ -182,16 +274,44 @@ These vars are used for model training & evaluation functions
 
 # You can change parameters research, model, etc.
     # Be careful, the more parameters you have, the longer it will take to train the model
-from sklearn.model_selection import GridSearchCV
+from scipy.stats import loguniform
 
+# Parameters searched by the "grid" & "halving" strategies
 model_params = {"C": [0.1, 1, 10, 100],
                 "gamma": ["scale", "auto"],
-                "kernel": ["linear", "rbf", "poly"],
-                "probability": [True]}
+                "kernel": ["linear", "rbf", "poly"]}
+
+# Parameters sampled by the "random" & "budget" strategies
+model_distributions = {"C": loguniform(0.1, 100),
+                       "gamma": ["scale", "auto"],
+                       "kernel": ["linear", "rbf", "poly"]}
+
+# Parameters of the final model only (probability=True : Platt calibration, an internal 5-fold CV, needed by predict_proba)
+final_model_params = {"probability": True}
 
 from sklearn.svm import SVC
 model= SVC()
-grid = GridSearchCV(SVC(), model_params, cv=3, n_jobs=-1)
+
+# Parameters search strategy :
+    # "grid" : every combination of model_params (default)
+    # "halving" : successive halving of model_params (every combination on a sample, the best ones on more rows)
+        # Opt-in : much faster, but the first rounds score the combinations on a few rows only, the selected parameters can be worse than the grid ones
+    # "random" : search_n_iter combinations sampled from model_distributions
+    # "budget" : combinations sampled from model_distributions until search_time_budget seconds are spent
+search_strategy = os.getenv("SEARCH_STRATEGY", "grid")
+search_n_iter = int(os.getenv("SEARCH_N_ITER", 10))
+search_time_budget = float(os.getenv("SEARCH_TIME_BUDGET", 60))
+# Number of time series cross-validation splits (each split is validated on matches played after its training matches)
+search_cv_splits = int(os.getenv("SEARCH_CV_SPLITS", 3))
+# Random state of the sampled & halving searches
+search_random_state = 42
+
+# CPU budget of the training (0 = every core), split between the championships trained in parallel and the grid search of each championship
+training_cpu_budget = int(os.getenv("TRAINING_CPU_BUDGET", 0)) or os.cpu_count()
+# Number of championships trained in parallel (1 process per championship, 0 = as many as the CPU budget allows)
+training_league_jobs = int(os.getenv("TRAINING_LEAGUE_JOBS", 0))
+# Kernel cache of the final fit (model retrained with all the data), in MB (SVC default : 200)
+final_fit_cache_size = int(os.getenv("FINAL_FIT_CACHE_SIZE", 1000))
 
 
 ###############################################################################################################################
@@ -10,8 +10,17 @@ import os
 import shutil
 import numpy as np
 import json
+import hashlib
 
-from common_variables import path_data_raw, path_data_clean, championships, columns_to_keep_for_features
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from common_variables import path_data_raw, path_data_clean, championships, columns_to_keep_for_features, clean_data_format
+from common_variables import raw_data_dtypes, raw_data_chunksize, team_stats_columns
+from common_variables import form_score_points, form_score_window, ftr_mapping, modeling_features, preprocessing_workers
+from stage_cache import runCachedStage, getStageVersion
+from team_ratings import updateTeamRatings, loadRatingsHistory, addRatingsToStats, addPreMatchRatings
+from clean_data_store import writeCleanData, readCleanData, updateTeamRegistry, addTeamIds, getTeamRowPositions
 
 """
 Pre-processing Functions
@@ -50,16 +59,88 @@ def exportMatchResults(championship, path_data_raw = path_data_raw):
 
 
 
-def createFormScore(match_results: pd.DataFrame, sort='score') -> pd.DataFrame: 
+def loadRawMatchDatas(championship, path_data_raw=path_data_raw, columns_to_keep_for_features=columns_to_keep_for_features,
+                      chunksize=raw_data_chunksize):
+    """
+    Read the raw match history file of a championship once, and return both the match data and the match results.
+
+    Only the columns to keep are parsed, with explicit types (see raw_data_dtypes), and the "Date" column
+    is parsed as datetime (day first). Stat columns missing in the file are ignored.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_raw (str): The file path to the raw data.
+    columns_to_keep_for_features (list): The list of column names to keep for features.
+    chunksize (int, optional): If set, the file is read by chunks of chunksize rows (large multi-season files).
+        Defaults to raw_data_chunksize.
+
+    Returns:
+    Tuple[pd.DataFrame, pd.DataFrame]: The match data (columns to keep) and the match results
+        ("Date", "HomeTeam", "AwayTeam", "FTR" columns of the same data).
+    """
+    championship_file_path = path_data_raw + championship + '.csv'
+    read_options = {"usecols": lambda column: column in columns_to_keep_for_features,
+                    "dtype": raw_data_dtypes}
+
+    if chunksize:
+        match_data = pd.concat(pd.read_csv(championship_file_path, chunksize=chunksize, **read_options), ignore_index=True)
+    else:
+        match_data = pd.read_csv(championship_file_path, **read_options)
+
+    match_data = match_data[[column for column in columns_to_keep_for_features if column in match_data.columns]]
+    match_data['Date'] = pd.to_datetime(match_data['Date'], dayfirst=True, format='mixed')
+
+    match_results = match_data[["Date", "HomeTeam", "AwayTeam", "FTR"]]
+
+    return match_data, match_results
+
+
+
+def meltMatchResults(match_results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reshape match results into a long, team-perspective table (one row per team and per match).
+
+    Parameters:
+        match_results (pd.DataFrame): DataFrame containing at least "HomeTeam", "AwayTeam" and "FTR" columns.
+
+    Returns:
+        pd.DataFrame: A DataFrame with columns "MatchOrder", "Team", "Venue" and "FTR" ("TeamId" too if the match results have team IDs).
+            Rows keep the order of match_results ("MatchOrder" is the row position in the input).
+    """
+    matches_count = len(match_results)
+    match_order = np.arange(matches_count)
+    ftr = match_results['FTR'].to_numpy()
+
+    team_results = pd.DataFrame({
+        'MatchOrder': np.concatenate([match_order, match_order]),
+        'Team': np.concatenate([match_results['HomeTeam'].to_numpy(), match_results['AwayTeam'].to_numpy()]),
+        'Venue': np.repeat(['Home', 'Away'], matches_count),
+        'FTR': np.concatenate([ftr, ftr])})
+
+    if 'HomeTeamId' in match_results.columns and 'AwayTeamId' in match_results.columns:
+        team_results.insert(2, 'TeamId', np.concatenate([match_results['HomeTeamId'].to_numpy(), match_results['AwayTeamId'].to_numpy()]))
+
+    # Interleave home & away rows so each team's matches stay in the input order
+    team_results = team_results.sort_values(by='MatchOrder', kind='stable').reset_index(drop=True)
+
+    return team_results
+
+
+
+def createFormScore(match_results: pd.DataFrame, sort='score', window=form_score_window) -> pd.DataFrame: 
     """
     Calculate the form score for each team based on their recent match results.
 
+    All teams are computed in one pass: match results are melted into a team-perspective table,
+    then a rolling window is applied per team.
+
     Parameters:
         match_results (pd.DataFrame): The input DataFrame containing match data.
         sort (str, optional): The sorting parameter. Can be either 'team' or 'score'. Defaults to 'score'.
+        window (int, optional): The number of recent matches used to compute the form score. Defaults to form_score_window.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the form score for each team.
+        pd.DataFrame: A DataFrame containing the form score for each team (and its "TeamId" if the match results have team IDs).
 
     Raises:
         ValueError: If the sort parameter is not 'team' or 'score'.
@@ -67,34 +148,27 @@ def createFormScore(match_results: pd.DataFrame, sort='score') -> pd.DataFrame:
     # Sort the data by date in descending order
     match_results = match_results.sort_values(by='Date', ascending=False)
 
-    # Initialize a dictionary to store team performances
-    team_form = {}
-
-    # Iterate through the data for each team
-    for team in match_results['HomeTeam'].unique():
+    # One row per team and per match, most recent match first
+    team_results = meltMatchResults(match_results)
 
-        # Filter the data for the current team
-        team_data = match_results[(match_results['HomeTeam'] == team) | (match_results['AwayTeam'] == team)]
+    # Form score = (wins * 3) + draws - losses
+    team_results['Points'] = team_results['FTR'].map(form_score_points).fillna(0)
 
-        # Select the results of the last 5 matches
-        last_five_matches = team_data.head(5)
-        
-        # Calculate performances over the last 5 matches
-        wins = (last_five_matches['FTR'] == 'H').sum()
-        draws = (last_five_matches['FTR'] == 'D').sum()
-        losses = (last_five_matches['FTR'] == 'A').sum()
-
-        # Calculate the form score
-        form_score = (wins * 3) + draws - losses
-
-
-        # Add the form score to the dictionary
-        team_form[team] = form_score
+    # Rolling window over each team's matches, in chronological order: the last value covers the most recent matches
+    rolling_form = (team_results.iloc[::-1]
+                    .groupby('Team', sort=False)['Points']
+                    .rolling(window, min_periods=1)
+                    .sum())
+    team_form = rolling_form.groupby(level='Team', sort=False).last()
 
+    # Keep teams listed as home team, in order of appearance
+    home_teams = match_results.drop_duplicates(subset='HomeTeam')
+    team_form = team_form.reindex(home_teams['HomeTeam'].to_numpy()).fillna(0).astype('int64')
 
-    # Convert the dictionary to a DataFrame for better visualization
-    team_form_df = pd.DataFrame.from_dict(team_form, orient='index', columns=['FormScore'])
+    team_form_df = team_form.to_frame(name='FormScore')
     team_form_df.index.name = 'Team'
+    if 'HomeTeamId' in match_results.columns:
+        team_form_df.insert(0, 'TeamId', home_teams['HomeTeamId'].to_numpy())
 
     if sort == 'team':
         team_form_df = team_form_df.sort_index()
@@ -109,37 +183,112 @@ def createFormScore(match_results: pd.DataFrame, sort='score') -> pd.DataFrame:
 
 
 
+def aggregateTeamStats(match_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate the stats of each team at home, away and in total, in a single vectorized pass.
+
+    Teams are integer-coded, then every stat column listed in team_stats_columns (and available in match_data)
+    is summed per team with np.bincount, for the home side and the away side.
+
+    Args:
+        match_data (pd.DataFrame): DataFrame containing match data ("HomeTeam", "AwayTeam", "FTR" and stat columns).
+
+    Returns:
+        pd.DataFrame: One row per team (sorted by name, index "Team") with, for each stat,
+            the "<stat>_Home", "<stat>_Away" and "<stat>" (total) columns.
+            The "TeamId" column is added if match_data has team IDs ("HomeTeamId", "AwayTeamId").
+            Stats: TotalMatches, TotalWins, TotalDraws, TotalLosses and the team_stats_columns stat names.
+    """
+    team_codes, teams = pd.factorize(pd.concat([match_data['HomeTeam'], match_data['AwayTeam']]), sort=True)
+    matches_count = len(match_data)
+    teams_count = len(teams)
+    home_codes = team_codes[:matches_count]
+    away_codes = team_codes[matches_count:]
+
+    # Matches without team name are ignored (code -1)
+    home_played = home_codes >= 0
+    away_played = away_codes >= 0
+    home_codes = home_codes[home_played]
+    away_codes = away_codes[away_played]
+
+    def sumByTeam(codes, values):
+        return np.bincount(codes, weights=values, minlength=teams_count)
+
+    results = match_data['FTR'].to_numpy()
+    home_results = results[home_played]
+    away_results = results[away_played]
+
+    # Stat : (values summed for the team when it plays at home, values summed when it plays away)
+    team_stats = {
+        'TotalMatches': (np.bincount(home_codes, minlength=teams_count), np.bincount(away_codes, minlength=teams_count)),
+        'TotalWins': (sumByTeam(home_codes, home_results == 'H'), sumByTeam(away_codes, away_results == 'A')),
+        'TotalDraws': (sumByTeam(home_codes, home_results == 'D'), sumByTeam(away_codes, away_results == 'D')),
+        'TotalLosses': (sumByTeam(home_codes, home_results == 'A'), sumByTeam(away_codes, away_results == 'H'))}
+    integer_stats = list(team_stats)
+
+    for home_column, away_column, stat, opponent_stat in team_stats_columns:
+        if home_column not in match_data.columns or away_column not in match_data.columns:
+            continue
+
+        home_values = match_data[home_column].to_numpy(dtype='float64', na_value=0)
+        away_values = match_data[away_column].to_numpy(dtype='float64', na_value=0)
+
+        team_stats[stat] = (sumByTeam(home_codes, home_values[home_played]), sumByTeam(away_codes, away_values[away_played]))
+        team_stats[opponent_stat] = (sumByTeam(home_codes, away_values[home_played]), sumByTeam(away_codes, home_values[away_played]))
+
+        if pd.api.types.is_integer_dtype(match_data[home_column]) and pd.api.types.is_integer_dtype(match_data[away_column]):
+            integer_stats += [stat, opponent_stat]
+
+    team_stats_df = pd.DataFrame(index=pd.Index(teams, name='Team'))
+
+    # Team ID of each team code
+    if 'HomeTeamId' in match_data.columns and 'AwayTeamId' in match_data.columns:
+        team_ids = np.full(teams_count, -1, dtype=np.int64)
+        match_team_ids = np.concatenate([match_data['HomeTeamId'].to_numpy(), match_data['AwayTeamId'].to_numpy()])
+        team_ids[team_codes[team_codes >= 0]] = match_team_ids[team_codes >= 0]
+        team_stats_df['TeamId'] = team_ids
+
+    for stat, (home_sums, away_sums) in team_stats.items():
+        if stat in integer_stats:
+            home_sums, away_sums = home_sums.astype('int64'), away_sums.astype('int64')
+
+        team_stats_df[stat + '_Home'] = home_sums
+        team_stats_df[stat + '_Away'] = away_sums
+        team_stats_df[stat] = home_sums + away_sums
+
+    return team_stats_df
+
+
+
 def createTeamStats(match_data: pd.DataFrame) -> pd.DataFrame:
     """
     Create aggregated statistics for each team based on match data.
 
+    Stats are computed by aggregateTeamStats: matches, wins, draws, losses and every stat of team_stats_columns
+    available in match_data (goals, shots, corners, fouls, cards...).
+
     Args:
         match_data (pd.DataFrame): DataFrame containing match data.
 
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame]: A tuple of two DataFrames. The first DataFrame contains aggregated statistics for home teams, and the second DataFrame contains aggregated statistics for away teams.
     """
-    # Group data by home team to calculate aggregated statistics
-    home_team_stats = match_data.groupby('HomeTeam').agg(
-            TotalMatches=('HomeTeam', 'count'),
-            TotalWins=('FTR', lambda x: (x == 'H').sum()),
-            TotalDraws=('FTR', lambda x: (x == 'D').sum()),
-            TotalLosses=('FTR', lambda x: (x == 'A').sum()),
-            TotalGoalsScored=('FTHG', 'sum'),
-            TotalGoalsConceded=('FTAG', 'sum')
-        ).reset_index()
-
-    
-    # Group data by away team to calculate aggregated statistics
-    away_team_stats = match_data.groupby('AwayTeam').agg(
-            TotalMatches=('AwayTeam', 'count'),
-            TotalWins=('FTR', lambda x: (x == 'A').sum()),  # Invert wins and losses
-            TotalDraws=('FTR', lambda x: (x == 'D').sum()),
-            TotalLosses=('FTR', lambda x: (x == 'H').sum()),
-            TotalGoalsScored=('FTAG', 'sum'),
-            TotalGoalsConceded=('FTHG', 'sum')  # Invert goals scored and conceded
-        ).reset_index()
-    
+    team_stats_df = aggregateTeamStats(match_data)
+    stats = [column[:-len('_Home')] for column in team_stats_df.columns if column.endswith('_Home')]
+
+    # Home teams statistics (teams which played at home)
+    home_team_stats = team_stats_df[team_stats_df['TotalMatches_Home'] > 0][[stat + '_Home' for stat in stats]]
+    home_team_stats.columns = stats
+    home_team_stats = home_team_stats.rename_axis('HomeTeam').reset_index()
+    if 'TeamId' in team_stats_df.columns:
+        home_team_stats.insert(1, 'HomeTeamId', team_stats_df.loc[team_stats_df['TotalMatches_Home'] > 0, 'TeamId'].to_numpy())
+
+    # Away teams statistics (teams which played away)
+    away_team_stats = team_stats_df[team_stats_df['TotalMatches_Away'] > 0][[stat + '_Away' for stat in stats]]
+    away_team_stats.columns = stats
+    away_team_stats = away_team_stats.rename_axis('AwayTeam').reset_index()
+    if 'TeamId' in team_stats_df.columns:
+        away_team_stats.insert(1, 'AwayTeamId', team_stats_df.loc[team_stats_df['TotalMatches_Away'] > 0, 'TeamId'].to_numpy())
 
     return home_team_stats, away_team_stats
 
@@ -149,6 +298,9 @@ def mergeTeamStatsHomeAway(home_team_stats: pd.DataFrame, away_team_stats: pd.Da
     """
     Merge home and away team statistics.
 
+    The away statistics rows are gathered on the registry team IDs ("HomeTeamId", "AwayTeamId", see getTeamRowPositions),
+    teams without away statistics are dropped.
+
     Parameters:
     - home_team_stats: DataFrame containing home team statistics.
     - away_team_stats: DataFrame containing away team statistics.
@@ -156,7 +308,18 @@ def mergeTeamStatsHomeAway(home_team_stats: pd.DataFrame, away_team_stats: pd.Da
     Returns:
     - team_stats: DataFrame containing merged home and away team statistics.
     """
-    team_stats = pd.merge(home_team_stats, away_team_stats, left_on='HomeTeam', right_on='AwayTeam', suffixes=('_Home', '_Away'))
+    positions = getTeamRowPositions(away_team_stats['AwayTeamId'], home_team_stats['HomeTeamId'])
+    matched = positions >= 0
+
+    home_stats = home_team_stats[matched].reset_index(drop=True)
+    away_stats = away_team_stats.iloc[positions[matched]].reset_index(drop=True)
+
+    # Suffix the statistics available on both sides
+    common_columns = home_stats.columns.intersection(away_stats.columns)
+    home_stats = home_stats.rename(columns={column: column + '_Home' for column in common_columns})
+    away_stats = away_stats.rename(columns={column: column + '_Away' for column in common_columns})
+
+    team_stats = pd.concat([home_stats, away_stats], axis=1)
     return team_stats
 
 
@@ -183,6 +346,12 @@ def createGlobalTeamStats(team_stats: pd.DataFrame) -> pd.DataFrame:
     global_team_stats['LossRatio'] = ((global_team_stats['TotalLosses_Home'] + global_team_stats['TotalLosses_Away']) / global_team_stats['TotalMatches']) * 100
     global_team_stats['AverageGoalsScored'] = global_team_stats['TotalGoalsScored'] / global_team_stats['TotalMatches']
     global_team_stats['AverageGoalsConceded'] = global_team_stats['TotalGoalsConceded'] / global_team_stats['TotalMatches']
+
+    # Totals of the other stats available (shots, corners, fouls, cards...)
+    for _, _, stat, opponent_stat in team_stats_columns:
+        for total_stat in [stat, opponent_stat]:
+            if total_stat not in global_team_stats.columns and total_stat + '_Home' in global_team_stats.columns and total_stat + '_Away' in global_team_stats.columns:
+                global_team_stats[total_stat] = global_team_stats[total_stat + '_Home'] + global_team_stats[total_stat + '_Away']
     
     return global_team_stats
 
@@ -222,7 +391,13 @@ def mergeFormScoreTeamStats(global_team_stats_ranking: pd.DataFrame, team_form_d
     Returns:
         pd.DataFrame: Merged DataFrame containing both team statistics and form scores.
     """
-    score_team_stats = pd.merge(global_team_stats_ranking, team_form_df, left_on='HomeTeam', right_index=True, how='left')
+    score_team_stats = global_team_stats_ranking.copy()
+
+    # Gather the form scores on the registry team IDs (NaN for the teams without form score)
+    positions = getTeamRowPositions(team_form_df['TeamId'], score_team_stats['HomeTeamId'])
+    form_values = team_form_df.reset_index(drop=True).drop(columns='TeamId').reindex(positions)
+    for column in form_values.columns:
+        score_team_stats[column] = form_values[column].to_numpy()
 
     return score_team_stats
 
@@ -254,7 +429,7 @@ def prepareStatsTeam(score_team_stats: pd.DataFrame) -> pd.DataFrame:
         'Ranking': 'Ranking_HomeTeam',
         'FormScore': 'FormScore_HomeTeam'}
 
-    statsHomeTeam = score_team_stats[['HomeTeam', 'TotalMatches_Home', 'TotalWins_Home', 'TotalDraws_Home',
+    statsHomeTeam = score_team_stats[['HomeTeam', 'HomeTeamId', 'TotalMatches_Home', 'TotalWins_Home', 'TotalDraws_Home',
                                 'TotalLosses_Home', 'TotalGoalsScored_Home', 'TotalGoalsConceded_Home',
                                 'TotalGoalsScored', 'TotalGoalsConceded', 'GoalDifference',
                                 'TotalPoints', 'TotalMatches', 'WinRatio', 'DrawRatio', 'LossRatio',
@@ -280,7 +455,7 @@ def prepareStatsTeam(score_team_stats: pd.DataFrame) -> pd.DataFrame:
             'Ranking': 'Ranking_AwayTeam',
             'FormScore': 'FormScore_AwayTeam'}
 
-    statsAwayTeam = score_team_stats[['AwayTeam', 'TotalMatches_Away', 'TotalWins_Away', 'TotalDraws_Away',
+    statsAwayTeam = score_team_stats[['AwayTeam', 'AwayTeamId', 'TotalMatches_Away', 'TotalWins_Away', 'TotalDraws_Away',
                                 'TotalLosses_Away', 'TotalGoalsScored_Away', 'TotalGoalsConceded_Away',
                                 'TotalGoalsScored', 'TotalGoalsConceded', 'GoalDifference',
                                 'TotalPoints', 'TotalMatches', 'WinRatio', 'DrawRatio', 'LossRatio',
@@ -308,27 +483,161 @@ def createDataToModelisation(championship_matches_results: pd.DataFrame,
     
     Returns:
         pd.DataFrame: DataFrame containing the merged data for modelization.
+            Matches keep their order, matches whose teams have no statistics are dropped.
+            The team ID columns are only used for the join, they are not kept.
     """
-    
-    final_stats_home = pd.merge(championship_matches_results, statsHomeTeam, on="HomeTeam")
-    final_stats_home_away = pd.merge(final_stats_home, statsAwayTeam, on="AwayTeam")
+    # Gather the teams statistics rows on the registry team IDs
+    home_positions = getTeamRowPositions(statsHomeTeam['HomeTeamId'], championship_matches_results['HomeTeamId'])
+    away_positions = getTeamRowPositions(statsAwayTeam['AwayTeamId'], championship_matches_results['AwayTeamId'])
+    matched = (home_positions >= 0) & (away_positions >= 0)
 
-    # Encode target variable 
-
-    ftr_mapping = {
-    "H": 0,
-    "D": 1,
-    "A": 2}
+    final_stats_home_away = pd.concat([
+        championship_matches_results[matched].drop(columns=['HomeTeamId', 'AwayTeamId']).reset_index(drop=True),
+        statsHomeTeam.iloc[home_positions[matched]].drop(columns=['HomeTeam', 'HomeTeamId']).reset_index(drop=True),
+        statsAwayTeam.iloc[away_positions[matched]].drop(columns=['AwayTeam', 'AwayTeamId']).reset_index(drop=True)], axis=1)
 
+    # Encode target variable 
     final_stats_home_away['FTR_encoded'] = final_stats_home_away['FTR'].map(ftr_mapping)
     
     return final_stats_home_away
     
 
     
+def buildAsOfTeamFeatures(snapshots: np.ndarray, ranking: np.ndarray, form: np.ndarray, side: str) -> pd.DataFrame:
+    """
+    Build the team features of one side (home or away) from the pre-match snapshots.
+
+    Args:
+        snapshots (np.ndarray): Array of shape (matches, 2, 6). For each match, the team accumulators before the match,
+            by venue (0: home, 1: away) and by stat (matches, wins, draws, losses, goals scored, goals conceded).
+        ranking (np.ndarray): The ranking of the team before each match.
+        form (np.ndarray): The form score of the team before each match.
+        side (str): 'Home' or 'Away', the side the team plays for in the match.
+
+    Returns:
+        pd.DataFrame: The team features, with the same columns as statsHomeTeam or statsAwayTeam (without the team name).
+    """
+    venue = 0 if side == 'Home' else 1
+    suffix = '_' + side + 'Team'
+    venue_stats = snapshots[:, venue, :]
+    total_stats = snapshots.sum(axis=1)
+
+    total_matches = total_stats[:, 0]
+    played = np.where(total_matches > 0, total_matches, 1)  # Avoid division by zero before the first match
+
+    features = pd.DataFrame({
+        'TotalMatches_' + side: venue_stats[:, 0],
+        'TotalWins_' + side: venue_stats[:, 1],
+        'TotalDraws_' + side: venue_stats[:, 2],
+        'TotalLosses_' + side: venue_stats[:, 3],
+        'TotalGoalsScored_' + side: venue_stats[:, 4],
+        'TotalGoalsConceded_' + side: venue_stats[:, 5],
+        'TotalGoalsScored' + suffix: total_stats[:, 4],
+        'TotalGoalsConceded' + suffix: total_stats[:, 5],
+        'GoalDifference' + suffix: total_stats[:, 4] - total_stats[:, 5],
+        'TotalPoints' + suffix: 3 * total_stats[:, 1] + total_stats[:, 2],
+        'TotalMatches' + suffix: total_matches,
+        'WinRatio' + suffix: total_stats[:, 1] / played * 100,
+        'DrawRatio' + suffix: total_stats[:, 2] / played * 100,
+        'LossRatio' + suffix: total_stats[:, 3] / played * 100,
+        'AverageGoalsScored' + suffix: total_stats[:, 4] / played,
+        'AverageGoalsConceded' + suffix: total_stats[:, 5] / played,
+        'Ranking' + suffix: ranking,
+        'FormScore' + suffix: form})
+
+    return features
+
+
+
+def createAsOfDataToModelisation(match_data: pd.DataFrame, window=form_score_window) -> pd.DataFrame:
+    """
+    Create a dataframe for modelization where each match only sees the stats of the matches played before it (point-in-time).
+
+    Matches are walked once in date order while running accumulators are kept for each team
+    (matches, wins, draws, losses, goals by venue, and the last results for the form score).
+    The snapshot taken before each match is emitted, so the cost is linear in the number of matches.
+    The ranking is refreshed once per match date.
+
+    Parameters:
+        match_data (pd.DataFrame): DataFrame containing match data ("Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR").
+        window (int, optional): The number of recent matches used to compute the form score. Defaults to form_score_window.
+
+    Returns:
+        pd.DataFrame: DataFrame with the same columns as createDataToModelisation output, sorted by date.
+    """
+    match_data = match_data[["Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"]].dropna(subset=["HomeTeam", "AwayTeam", "FTR"])
+
+    # Walk matches in date order (same day matches keep the file order)
+    match_dates = pd.to_datetime(match_data['Date'], dayfirst=True, format='mixed')
+    match_data = match_data.iloc[np.argsort(match_dates.to_numpy(), kind='stable')].reset_index(drop=True)
+    match_dates = match_dates.sort_values(kind='stable').to_numpy()
+
+    # Integer-coded teams
+    team_codes, teams = pd.factorize(pd.concat([match_data['HomeTeam'], match_data['AwayTeam']]))
+    matches_count = len(match_data)
+    home_codes = team_codes[:matches_count]
+    away_codes = team_codes[matches_count:]
+    home_goals = match_data['FTHG'].fillna(0).to_numpy(dtype='int64')
+    away_goals = match_data['FTAG'].fillna(0).to_numpy(dtype='int64')
+    results = match_data['FTR'].to_numpy()
+
+    # Running accumulators : [team, venue (0: home, 1: away), stat (matches, wins, draws, losses, scored, conceded)]
+    team_accumulators = np.zeros((len(teams), 2, 6), dtype='int64')
+    last_results = [deque(maxlen=window) for _ in range(len(teams))]
+    team_ranking = np.ones(len(teams), dtype='int64')
+
+    home_snapshots = np.empty((matches_count, 2, 6), dtype='int64')
+    away_snapshots = np.empty((matches_count, 2, 6), dtype='int64')
+    home_ranking = np.empty(matches_count, dtype='int64')
+    away_ranking = np.empty(matches_count, dtype='int64')
+    home_form = np.empty(matches_count, dtype='int64')
+    away_form = np.empty(matches_count, dtype='int64')
+
+    current_date = None
+    for i in range(matches_count):
+        home, away, result = home_codes[i], away_codes[i], results[i]
+
+        # Refresh the ranking with the matches played before this date
+        if match_dates[i] != current_date:
+            current_date = match_dates[i]
+            totals = team_accumulators.sum(axis=1)
+            points = 3 * totals[:, 1] + totals[:, 2]
+            goal_difference = totals[:, 4] - totals[:, 5]
+            ranking_order = np.lexsort((np.arange(len(teams)), -goal_difference, -points))
+            team_ranking[ranking_order] = np.arange(1, len(teams) + 1)
+
+        # Pre-match snapshot
+        home_snapshots[i] = team_accumulators[home]
+        away_snapshots[i] = team_accumulators[away]
+        home_ranking[i] = team_ranking[home]
+        away_ranking[i] = team_ranking[away]
+        home_form[i] = sum(last_results[home])
+        away_form[i] = sum(last_results[away])
+
+        # Update accumulators with the match result
+        home_win, draw, away_win = int(result == 'H'), int(result == 'D'), int(result == 'A')
+        team_accumulators[home, 0] += (1, home_win, draw, away_win, home_goals[i], away_goals[i])
+        team_accumulators[away, 1] += (1, away_win, draw, home_win, away_goals[i], home_goals[i])
+
+        result_points = form_score_points.get(result, 0)
+        last_results[home].append(result_points)
+        last_results[away].append(result_points)
+
+    home_features = buildAsOfTeamFeatures(home_snapshots, home_ranking, home_form, 'Home')
+    away_features = buildAsOfTeamFeatures(away_snapshots, away_ranking, away_form, 'Away')
+
+    final_stats_home_away = pd.concat([match_data[["Date", "HomeTeam", "AwayTeam", "FTR"]], home_features, away_features], axis=1)
+
+    # Encode target variable
+    final_stats_home_away['FTR_encoded'] = final_stats_home_away['FTR'].map(ftr_mapping)
+
+    return final_stats_home_away
+
+
+
 def exportCleanDatas(championship, stats_home_team, stats_away_team, final_stats_home_away, path_data_clean=path_data_clean):
     """
-    Export the clean data to CSV files.
+    Export the clean data to CSV files (and to columnar files, see writeCleanData).
 
     Parameters:
     - statsHomeTeam: DataFrame containing statistics for the home team.
@@ -345,15 +654,16 @@ def exportCleanDatas(championship, stats_home_team, stats_away_team, final_stats
         os.makedirs(path_output_for_clean_datas)
 
     # Save datas
-    stats_home_team.to_csv(path_output_for_clean_datas + "statsHomeTeam.csv", index=False)
-    stats_away_team.to_csv(path_output_for_clean_datas + "statsAwayTeam.csv", index=False)
-    final_stats_home_away.to_csv(path_output_for_clean_datas + "match_data_for_modeling.csv", index=False)
+    writeCleanData(stats_home_team, path_output_for_clean_datas + "statsHomeTeam.csv")
+    writeCleanData(stats_away_team, path_output_for_clean_datas + "statsAwayTeam.csv")
+    writeCleanData(final_stats_home_away, path_output_for_clean_datas + "match_data_for_modeling.csv")
 
 
 
 def getMatchOdds(championship, path_data_clean=path_data_clean, path_data_raw=path_data_raw):
     """
     Copy the odds file for a specific championship from the raw data directory to the clean data directory.
+    The columnar copy is written too if a columnar clean data format is used (see writeCleanData).
 
     Parameters:
     championship (str): The name of the championship.
@@ -363,6 +673,9 @@ def getMatchOdds(championship, path_data_clean=path_data_clean, path_data_raw=pa
     odds_file = os.path.join(path_data_raw, championship + '_odds.csv')
     shutil.copy(odds_file, path_data_clean + championship + '/odds.csv')
 
+    if clean_data_format != "csv":
+        writeCleanData(pd.read_csv(odds_file), path_data_clean + championship + '/odds.csv')
+
 
 def getAvailableTeams(championship: str) -> None:
     """
@@ -377,15 +690,14 @@ def getAvailableTeams(championship: str) -> None:
     This function reads the match data and odds data for the given championship,
     extracts the home and away teams from both datasets, and returns a list of
     unique teams available in either dataset. The list is then saved to a JSON
-    file named 'available_teams.json' in the same directory as the data files.
+    file named 'available_teams.json' in the same directory as the data files,
+    and the new teams are added to the team registry ('team_registry.json', team name -> team ID).
     """
     available_teams = []
 
     # Get teams listed in the different match datas
-    df_file_odds = pd.read_csv(path_data_clean + championship + '/odds.csv')
-    df_file_odds = df_file_odds[["HomeTeam", "AwayTeam"]]
-    df_file_match_datas = pd.read_csv(path_data_clean + championship + '/match_data_for_modeling.csv')
-    df_file_match_datas = df_file_match_datas[["HomeTeam", "AwayTeam"]]
+    df_file_odds = readCleanData(path_data_clean + championship + '/odds.csv', columns=["HomeTeam", "AwayTeam"])
+    df_file_match_datas = readCleanData(path_data_clean + championship + '/match_data_for_modeling.csv', columns=["HomeTeam", "AwayTeam"])
 
     # Get unique teams from both dataframes
     teams_odds = np.unique(df_file_odds[["HomeTeam", "AwayTeam"]].values)
@@ -403,10 +715,216 @@ def getAvailableTeams(championship: str) -> None:
     with open(f'{save_folder}available_teams.json', 'w') as f:
         json.dump(available_teams, f)
 
+    # Give a team ID to the new teams
+    updateTeamRegistry(championship, available_teams, path_data_clean)
+
+
+
+
+"""
+Incremental pre-processing Functions
+"""
+def computeFileFingerprint(file_path: str, chunk_size=1024 * 1024) -> str:
+    """
+    Compute the SHA-256 hash of a file content.
+
+    Parameters:
+    file_path (str): The path to the file.
+    chunk_size (int): The number of bytes read at once. Defaults to 1 MB.
+
+    Returns:
+    str: The hexadecimal hash of the file, or None if the file doesn't exist.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
 
 
 
-def preProcessingPipeline() -> None:
+def getPreprocessingCodeVersion() -> str:
+    """
+    Get the version of the pre-processing code.
+
+    The version is a hash of the pre-processing scripts and of the settings changing the outputs,
+    so any change in the code invalidates the previous pre-processing results.
+
+    Returns:
+    str: The hexadecimal hash identifying the pre-processing code version.
+    """
+    code_hash = hashlib.sha256()
+    for script in ['data_preprocessing_matches.py', 'common_variables.py', 'clean_data_store.py', 'team_ratings.py']:
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+        code_hash.update(str(computeFileFingerprint(script_path)).encode())
+    code_hash.update(modeling_features.encode())
+
+    return code_hash.hexdigest()
+
+
+
+def getChampionshipFingerprints(championship: str, path_data_raw=path_data_raw) -> dict:
+    """
+    Get the fingerprints of the raw inputs of a championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_raw (str): The path to the raw data directory. Defaults to path_data_raw.
+
+    Returns:
+    dict: The hashes of the match history file ("matches") and of the odds file ("odds").
+    """
+    return {"matches": computeFileFingerprint(os.path.join(path_data_raw, championship + '.csv')),
+            "odds": computeFileFingerprint(os.path.join(path_data_raw, championship + '_odds.csv'))}
+
+
+
+def loadPreprocessingManifest(path_data_clean=path_data_clean) -> dict:
+    """
+    Load the pre-processing manifest (fingerprints of the inputs used by the last run of each championship).
+
+    Parameters:
+    path_data_clean (str): The path to the clean data directory. Defaults to path_data_clean.
+
+    Returns:
+    dict: The manifest, empty if it doesn't exist yet.
+    """
+    manifest_path = os.path.join(path_data_clean, 'preprocessing_manifest.json')
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+
+def savePreprocessingManifest(manifest: dict, path_data_clean=path_data_clean) -> None:
+    """
+    Save the pre-processing manifest.
+
+    Parameters:
+    manifest (dict): The manifest to save.
+    path_data_clean (str): The path to the clean data directory. Defaults to path_data_clean.
+
+    Returns:
+    None
+    """
+    manifest_path = os.path.join(path_data_clean, 'preprocessing_manifest.json')
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+
+
+def getStagesToRun(championship: str, previous_run: dict, fingerprints: dict, code_version: str, path_data_clean=path_data_clean) -> list:
+    """
+    Get the pre-processing stages to run for a championship, according to what changed since the previous run.
+
+    Stages:
+    - "matches": team stats & data for modeling, from the match history file.
+    - "odds": clean odds, from the odds file.
+    getAvailableTeams depends on both stages, it runs if at least one stage runs.
+
+    Parameters:
+    championship (str): The name of the championship.
+    previous_run (dict): The manifest entry of the championship for the previous run (empty if none).
+    fingerprints (dict): The current fingerprints of the raw inputs (see getChampionshipFingerprints).
+    code_version (str): The current pre-processing code version (see getPreprocessingCodeVersion).
+    path_data_clean (str): The path to the clean data directory. Defaults to path_data_clean.
+
+    Returns:
+    list: The stages to run, empty if the championship is up to date.
+    """
+    clean_folder = os.path.join(path_data_clean, championship)
+    stage_outputs = {"matches": ["statsHomeTeam.csv", "statsAwayTeam.csv", "match_data_for_modeling.csv"],
+                     "odds": ["odds.csv"]}
+
+    # Code changed : everything must be rebuilt
+    if previous_run.get("code_version") != code_version:
+        return list(stage_outputs)
+
+    stages_to_run = []
+    for stage, outputs in stage_outputs.items():
+        input_changed = previous_run.get(stage) != fingerprints[stage]
+        output_missing = not all(os.path.exists(os.path.join(clean_folder, output)) for output in outputs)
+
+        if input_changed or output_missing:
+            stages_to_run.append(stage)
+
+    return stages_to_run
+
+
+
+def preProcessChampionshipMatches(championship: str) -> None:
+    """
+    Build and export the clean datas of a championship from its match history file.
+
+    Parameters:
+    championship (str): The name of the championship.
+
+    Returns:
+    None
+    """
+    match_data, match_results = loadRawMatchDatas(championship)
+
+    # Registry team IDs ("HomeTeamId", "AwayTeamId") : the team statistics are joined on these IDs
+    teams = pd.concat([match_data['HomeTeam'], match_data['AwayTeam']]).dropna().unique().tolist()
+    registry = updateTeamRegistry(championship, teams, path_data_clean)
+    match_data, match_results = addTeamIds(match_data, registry), addTeamIds(match_results, registry)
+
+    # Each stage is cached (see stage_cache.py) : only the stages whose inputs or code changed are computed again
+    team_form_df = runCachedStage(createFormScore, match_results, params={'sort': 'score'},
+                                  version=getStageVersion(meltMatchResults, form_score_points, form_score_window))
+
+    home_team_stats, away_team_stats = runCachedStage(createTeamStats, match_data, version=getStageVersion(aggregateTeamStats, team_stats_columns))
+    team_stats = runCachedStage(mergeTeamStatsHomeAway, home_team_stats, away_team_stats, version=getStageVersion(getTeamRowPositions))
+    global_team_stats = runCachedStage(createGlobalTeamStats, team_stats, version=getStageVersion(team_stats_columns))
+    global_team_stats_ranking = runCachedStage(createRanking, global_team_stats)
+
+    score_team_stats = runCachedStage(mergeFormScoreTeamStats, global_team_stats_ranking, team_form_df, version=getStageVersion(getTeamRowPositions))
+    stats_home_team, stats_away_team = runCachedStage(prepareStatsTeam, score_team_stats)
+
+    # Elo ratings (only the new matches update the saved ratings)
+    ratings = updateTeamRatings(championship, match_results, path_data_clean)
+    stats_home_team, stats_away_team = addRatingsToStats(stats_home_team, stats_away_team, ratings)
+
+    if modeling_features == 'asof':
+        final_stats_home_away = runCachedStage(createAsOfDataToModelisation, match_data,
+                                               version=getStageVersion(buildAsOfTeamFeatures, form_score_points, form_score_window, ftr_mapping))
+        final_stats_home_away = addPreMatchRatings(final_stats_home_away, loadRatingsHistory(championship, path_data_clean))
+    else:
+        final_stats_home_away = runCachedStage(createDataToModelisation, match_results, stats_home_team, stats_away_team,
+                                               version=getStageVersion(getTeamRowPositions, ftr_mapping))
+
+    exportCleanDatas(championship, stats_home_team, stats_away_team, final_stats_home_away)
+
+
+
+def preProcessChampionship(championship: str, stages_to_run: list) -> None:
+    """
+    Executes the pre-processing stages of one championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    stages_to_run (list): The stages to execute ("matches", "odds"), see getStagesToRun.
+
+    Returns:
+    None
+    """
+    if "matches" in stages_to_run:
+        preProcessChampionshipMatches(championship)
+
+    if "odds" in stages_to_run:
+        getMatchOdds(championship)
+
+    getAvailableTeams(championship)
+
+
+
+def preProcessingPipeline(force=False, n_workers=preprocessing_workers) -> dict:
     """
     Executes the preprocessing pipeline for a given set of championships.
     
@@ -415,26 +933,80 @@ def preProcessingPipeline() -> None:
     merges team statistics, creates global team statistics, creates rankings, merges form scores with team statistics,
     prepares team statistics for modeling, creates final data for modeling, exports clean data, retrieves match odds,
     and gets available teams.
+
+    The pipeline is incremental: the fingerprints of the raw inputs are stored in a manifest, and only the stages
+    whose inputs (or the pre-processing code) changed since the previous run are executed (see getStagesToRun).
+
+    Championships are independent: with n_workers > 1, each championship runs in its own process.
+    A failing championship doesn't stop the others, the failures are raised once all championships are done.
     
     Note: The `championships` list should be defined before calling this function.
+    If `modeling_features` is "asof", the data for modeling is built with point-in-time team stats (createAsOfDataToModelisation).
+
+    Parameters:
+    force (bool, optional): If True, all the stages are executed for every championship. Defaults to False.
+    n_workers (int, optional): The number of championships processed in parallel. Defaults to preprocessing_workers.
+
+    Returns:
+    dict: The status of each championship ("success", "skipped" or "failed: <error>").
+
+    Raises:
+    Exception: If at least one championship failed.
     """
+    manifest = loadPreprocessingManifest()
+    code_version = getPreprocessingCodeVersion()
+
+    # Get the stages to run for each championship
+    championship_status = {}
+    championship_jobs = {}
+
     for championship in championships:
-        match_data = getMatchDatas(championship)
-        match_results = exportMatchResults(championship)
+        fingerprints = getChampionshipFingerprints(championship)
 
-        team_form_df = createFormScore(match_results, sort='score')
+        if force:
+            stages_to_run = ["matches", "odds"]
+        else:
+            stages_to_run = getStagesToRun(championship, manifest.get(championship, {}), fingerprints, code_version)
 
-        home_team_stats, away_team_stats = createTeamStats(match_data)
-        team_stats = mergeTeamStatsHomeAway(home_team_stats, away_team_stats)
-        global_team_stats = createGlobalTeamStats(team_stats)
-        global_team_stats_ranking = createRanking(global_team_stats)
+        if not stages_to_run:
+            print(f"{championship}: raw datas unchanged, pre-processing skipped")
+            championship_status[championship] = "skipped"
+        else:
+            print(f"{championship}: stages to run {stages_to_run}")
+            championship_jobs[championship] = (stages_to_run, fingerprints)
 
-        score_team_stats = mergeFormScoreTeamStats(global_team_stats_ranking, team_form_df)
-        stats_home_team, stats_away_team = prepareStatsTeam(score_team_stats)
 
-        final_stats_home_away = createDataToModelisation(match_results, stats_home_team, stats_away_team)
+    def onChampionshipDone(championship, error=None):
+        # Save the manifest after each championship, a failure doesn't invalidate the championships already done
+        if error is None:
+            championship_status[championship] = "success"
+            manifest[championship] = {"code_version": code_version, **championship_jobs[championship][1]}
+            savePreprocessingManifest(manifest)
+        else:
+            championship_status[championship] = f"failed: {error!r}"
+        print(f"{championship}: {championship_status[championship]}")
 
-        exportCleanDatas(championship, stats_home_team, stats_away_team, final_stats_home_away)
-        getMatchOdds(championship)
-        
-        getAvailableTeams(championship)
\ No newline at end of file
+
+    # Run championships
+    if n_workers > 1 and len(championship_jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(championship_jobs))) as executor:
+            futures = {executor.submit(preProcessChampionship, championship, stages_to_run): championship
+                       for championship, (stages_to_run, _) in championship_jobs.items()}
+
+            for future in as_completed(futures):
+                onChampionshipDone(futures[future], future.exception())
+
+    else:
+        for championship, (stages_to_run, _) in championship_jobs.items():
+            try:
+                preProcessChampionship(championship, stages_to_run)
+                onChampionshipDone(championship)
+            except Exception as e:
+                onChampionshipDone(championship, e)
+
+
+    failed_championships = [championship for championship, status in championship_status.items() if status.startswith("failed")]
+    if failed_championships:
+        raise Exception(f"Pre-processing failed for: {failed_championships} - {championship_status}")
+
+    return championship_status
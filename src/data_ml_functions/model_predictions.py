@@ -11,6 +11,8 @@ import os
 
 
 from common_variables import path_data_raw, path_data_clean, path_to_model, risk_aversion_coefficients, championships
+from clean_data_store import readCleanData, writeCleanData, loadTeamRegistry, addTeamIds, encodeTeams, getTeamRowPositions
+from odds_store import loadLatestOdds, odds_columns
 
 """
 Processing Functions
@@ -23,15 +25,21 @@ def loadCleanedDatas(championship):
     championship (str): The name of the championship.
 
     Returns:
-    tuple: A tuple containing the statistics for the home team and the away team.
+    tuple: A tuple containing the statistics for the home team and the away team (with the "HomeTeamId" / "AwayTeamId" columns).
     """
     # Load the cleaned data
     folder = path_data_clean + championship + '/'
     file_home_team = folder + "statsHomeTeam.csv"
     file_away_team = folder + "statsAwayTeam.csv"
 
-    stats_home_team = pd.read_csv(file_home_team)
-    stats_away_team = pd.read_csv(file_away_team)
+    stats_home_team = readCleanData(file_home_team)
+    stats_away_team = readCleanData(file_away_team)
+
+    # Statistics written before the team IDs : IDs taken from the team registry
+    if "HomeTeamId" not in stats_home_team.columns or "AwayTeamId" not in stats_away_team.columns:
+        registry = loadTeamRegistry(championship, path_data_clean)
+        stats_home_team, stats_away_team = addTeamIds(stats_home_team, registry), addTeamIds(stats_away_team, registry)
+
     return stats_home_team, stats_away_team
 
 
@@ -48,12 +56,32 @@ def createDataToPredict(championship:str, home_team:str, away_team:str) -> pd.Da
     pd.DataFrame: The DataFrame containing the data to predict.
     """
     stats_home_team, stats_away_team = loadCleanedDatas(championship)
+    registry = loadTeamRegistry(championship, path_data_clean)
 
-    stats_home_team = stats_home_team[stats_home_team.HomeTeam == home_team].reset_index(drop=True)
-    stats_away_team = stats_away_team[stats_away_team.AwayTeam == away_team].reset_index(drop=True)
-    
-    data_to_predict = pd.concat([stats_home_team, stats_away_team], axis=1)
-    data_to_predict.drop(["HomeTeam", "AwayTeam"], axis=1, inplace=True)
+    return gatherDataToPredict(stats_home_team, stats_away_team, encodeTeams([home_team], registry), encodeTeams([away_team], registry))
+
+
+
+def gatherDataToPredict(stats_home_team:pd.DataFrame, stats_away_team:pd.DataFrame, home_team_ids:list, away_team_ids:list) -> pd.DataFrame:
+    """
+    Create the data to predict for several matches, gathering the teams statistics rows on the registry team IDs.
+
+    Parameters:
+    stats_home_team (pd.DataFrame): The statistics of the home teams (with the "HomeTeamId" column).
+    stats_away_team (pd.DataFrame): The statistics of the away teams (with the "AwayTeamId" column).
+    home_team_ids (list): The team ID of the home team of each match (-1 for unknown teams).
+    away_team_ids (list): The team ID of the away team of each match (-1 for unknown teams).
+
+    Returns:
+    pd.DataFrame: The DataFrame containing the data to predict (one row per match, matches with an unknown team are dropped).
+    """
+    home_positions = getTeamRowPositions(stats_home_team['HomeTeamId'], home_team_ids)
+    away_positions = getTeamRowPositions(stats_away_team['AwayTeamId'], away_team_ids)
+    matched = (home_positions >= 0) & (away_positions >= 0)
+
+    data_to_predict = pd.concat([stats_home_team.iloc[home_positions[matched]].reset_index(drop=True),
+                                 stats_away_team.iloc[away_positions[matched]].reset_index(drop=True)], axis=1)
+    data_to_predict.drop(["HomeTeam", "HomeTeamId", "AwayTeam", "AwayTeamId"], axis=1, inplace=True)
     
     return data_to_predict
 
@@ -200,9 +228,10 @@ def getPredictionsOnCalendar():
     """
     Get predictions for each match in the calendar.
 
-    This function reads the calendar data for each championship, iterates over each match,
-    and calls the getModelPredictions function to get the predictions for the match.
-    The predictions are then appended to the dataframe and saved back to the calendar file.
+    This function reads the calendar data for each championship (latest view of the odds store,
+    or the clean odds file if the store is empty), gathers the teams statistics
+    of every match on the registry team IDs and predicts all the matches with a single model call.
+    The predictions and the team IDs ("HomeTeamId", "AwayTeamId") are then appended to the dataframe and saved to the calendar file.
 
     Parameters:
     None
@@ -212,30 +241,32 @@ def getPredictionsOnCalendar():
     """
     for championship in championships:
         championship_calendar_path = os.path.join(path_data_clean, championship, "odds.csv")
-        df_calendar = pd.read_csv(championship_calendar_path)
-        predictions = []
+        df_calendar = loadLatestOdds(championship)[odds_columns]
+        if df_calendar.empty:
+            df_calendar = readCleanData(championship_calendar_path)
 
-        for index, row in df_calendar.iterrows():
-            home_team = row["HomeTeam"]
-            away_team = row["AwayTeam"]
+        # Registry team IDs of the calendar (the API looks the matches up on these IDs)
+        df_calendar = addTeamIds(df_calendar, loadTeamRegistry(championship, path_data_clean))
 
-            prediction = getModelPredictions(championship, home_team, away_team)
-            prediction = {k: round(v, 2) for k, v in prediction.items()}
-            predictions.append(prediction)
+        # Data to predict for every match of the calendar (statistics loaded once)
+        stats_home_team, stats_away_team = loadCleanedDatas(championship)
+        data_to_predict = gatherDataToPredict(stats_home_team, stats_away_team,
+                                              df_calendar["HomeTeamId"], df_calendar["AwayTeamId"])
 
-        # Add the predictions to the dataframe
-        df_calendar['predictions'] = predictions
+        if len(data_to_predict) != len(df_calendar):
+            raise ValueError(f"Some teams of the {championship} calendar have no statistics.")
 
-        # Extract values and create new columns
-        df_calendar['pred_home'] = df_calendar['predictions'].apply(lambda x: x['Home'])
-        df_calendar['pred_draw'] = df_calendar['predictions'].apply(lambda x: x['Draw'])
-        df_calendar['pred_away'] = df_calendar['predictions'].apply(lambda x: x['Away'])
+        # Predict all the matches with a single model call
+        model_to_load = path_to_model + championship + '_svc.pkl'
+        result_probabilities = predictMatchIssue(model_to_load, data_to_predict).round(2)
 
-        # Drop the original 'predictions' column
-        df_calendar = df_calendar.drop(columns=['predictions'])
+        # Add the predictions to the dataframe
+        df_calendar['pred_home'] = result_probabilities['Home'].to_numpy()
+        df_calendar['pred_draw'] = result_probabilities['Draw'].to_numpy()
+        df_calendar['pred_away'] = result_probabilities['Away'].to_numpy()
 
-        # Save the dataframe back to the csv file
-        df_calendar.to_csv(championship_calendar_path, index=False)
+        # Save the dataframe to the calendar file
+        writeCleanData(df_calendar, championship_calendar_path)
 
 
 
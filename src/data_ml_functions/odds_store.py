@@ -0,0 +1,179 @@
+"""
+Odds store - append-only time series of the scraped odds (Parquet files)
+
+Layout:
+    <path_data_odds>/<championship>/month=<YYYY-MM>/part-<scrape timestamp>.parquet   (1 file per scrape & month of the matches)
+    <path_data_odds>/<championship>/latest.parquet                                   (latest view : odds of the last scrape)
+"""
+
+"""
+Libraries
+"""
+import pandas as pd
+import os
+
+from common_variables import path_data_odds
+
+
+"""
+Variables
+"""
+# Key of an odds snapshot (1 row per key)
+odds_store_key = ["Championship", "Date", "HomeTeam", "AwayTeam", "ScrapedAt"]
+
+# Odds columns (as written in the <championship>_odds.csv files)
+odds_columns = ["Date", "HomeTeam", "AwayTeam", "Avg_H", "Avg_D", "Avg_A"]
+
+# Date format of the scraped odds & name of the month partitions
+odds_date_format = "%d/%m/%Y"
+odds_partition_prefix = "month="
+
+# Latest view file (stored in the championship folder)
+odds_latest_file = "latest.parquet"
+
+
+"""
+Functions
+"""
+def getOddsStorePath(championship: str, path_data_odds=path_data_odds) -> str:
+    """
+    Get the folder of the odds store of a championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_odds (str): The path to the odds store. Defaults to path_data_odds.
+
+    Returns:
+    str: The path to the championship folder.
+    """
+    return os.path.join(path_data_odds, championship)
+
+
+
+def writeParquetFile(df: pd.DataFrame, file_path: str) -> None:
+    """
+    Write a Parquet file through a temporary file, readers never see a partial file.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to write.
+    file_path (str): The path to the Parquet file.
+
+    Returns:
+    None
+    """
+    temporary_file = f"{file_path}.{os.getpid()}.tmp"
+    df.to_parquet(temporary_file, index=False)
+    os.replace(temporary_file, file_path)
+
+
+
+def appendOddsSnapshot(championship: str, df_odds: pd.DataFrame, scraped_at=None, path_data_odds=path_data_odds) -> int:
+    """
+    Append the odds of a scrape to the odds store of a championship.
+
+    Snapshots are never modified once written: each scrape adds 1 file per month of the matches
+    (appending the same scrape again replaces its files with the same rows, without duplicates).
+    The latest view is replaced if the snapshot is the most recent one.
+
+    Parameters:
+    championship (str): The name of the championship.
+    df_odds (pd.DataFrame): The scraped odds (odds_columns, dates as dd/mm/yyyy, odds stored as floats).
+    scraped_at (pd.Timestamp, optional): The time of the scrape (UTC). Defaults to None (now).
+    path_data_odds (str): The path to the odds store. Defaults to path_data_odds.
+
+    Returns:
+    int: The number of rows stored.
+    """
+    scraped_at = pd.Timestamp.now(tz='UTC') if scraped_at is None else pd.Timestamp(scraped_at)
+    scraped_at = (scraped_at.tz_localize('UTC') if scraped_at.tzinfo is None else scraped_at.tz_convert('UTC')).floor('s')
+
+    snapshot = df_odds[odds_columns].copy()
+    snapshot.insert(0, "Championship", championship)
+    snapshot[odds_columns[3:]] = snapshot[odds_columns[3:]].apply(pd.to_numeric, errors='coerce')
+    snapshot["ScrapedAt"] = scraped_at
+    snapshot = snapshot.drop_duplicates(subset=odds_store_key, keep='last').reset_index(drop=True)
+
+    championship_path = getOddsStorePath(championship, path_data_odds)
+    os.makedirs(championship_path, exist_ok=True)
+
+    months = pd.to_datetime(snapshot["Date"], format=odds_date_format).dt.strftime('%Y-%m')
+    for month, month_rows in snapshot.groupby(months, sort=True):
+        partition_path = os.path.join(championship_path, odds_partition_prefix + month)
+        os.makedirs(partition_path, exist_ok=True)
+        writeParquetFile(month_rows, os.path.join(partition_path, f"part-{scraped_at.strftime('%Y%m%dT%H%M%S')}.parquet"))
+
+    # Latest view (an older snapshot, e.g. an archive, doesn't replace it)
+    latest = loadLatestOdds(championship, path_data_odds)
+    if latest.empty or scraped_at >= latest["ScrapedAt"].max():
+        writeParquetFile(snapshot.sort_values(["HomeTeam", "AwayTeam"]).reset_index(drop=True),
+                         os.path.join(championship_path, odds_latest_file))
+
+    return len(snapshot)
+
+
+
+def loadLatestOdds(championship: str, path_data_odds=path_data_odds) -> pd.DataFrame:
+    """
+    Load the latest odds of a championship (odds of the last scrape, sorted by teams).
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_odds (str): The path to the odds store. Defaults to path_data_odds.
+
+    Returns:
+    pd.DataFrame: The latest odds, empty if the championship has no odds yet.
+    """
+    latest_path = os.path.join(getOddsStorePath(championship, path_data_odds), odds_latest_file)
+
+    if not os.path.exists(latest_path):
+        return pd.DataFrame(columns=odds_store_key[:1] + odds_columns + odds_store_key[-1:])
+
+    return pd.read_parquet(latest_path)
+
+
+
+def loadOddsHistory(championship: str, home_team=None, away_team=None, start_month=None, end_month=None, path_data_odds=path_data_odds) -> pd.DataFrame:
+    """
+    Load the odds history of a championship, or of a match.
+
+    Only the month partitions between start_month and end_month are read,
+    and only the rows of the match are loaded if the teams are given.
+
+    Parameters:
+    championship (str): The name of the championship.
+    home_team (str, optional): The home team of the match. Defaults to None (all matches).
+    away_team (str, optional): The away team of the match. Defaults to None (all matches).
+    start_month (str, optional): The first month of the matches ("YYYY-MM"). Defaults to None.
+    end_month (str, optional): The last month of the matches ("YYYY-MM"). Defaults to None.
+    path_data_odds (str): The path to the odds store. Defaults to path_data_odds.
+
+    Returns:
+    pd.DataFrame: The odds snapshots, sorted by match and scrape time.
+    """
+    championship_path = getOddsStorePath(championship, path_data_odds)
+    partitions = sorted(partition for partition in os.listdir(championship_path) if partition.startswith(odds_partition_prefix)) if os.path.isdir(championship_path) else []
+
+    filters = []
+    if home_team is not None:
+        filters.append(("HomeTeam", "==", home_team))
+    if away_team is not None:
+        filters.append(("AwayTeam", "==", away_team))
+
+    history = []
+    for partition in partitions:
+        month = partition[len(odds_partition_prefix):]
+        if (start_month is not None and month < start_month) or (end_month is not None and month > end_month):
+            continue
+
+        partition_path = os.path.join(championship_path, partition)
+        for part_file in sorted(os.listdir(partition_path)):
+            if part_file.endswith(".parquet"):
+                history.append(pd.read_parquet(os.path.join(partition_path, part_file), filters=filters or None))
+
+    if not history:
+        return loadLatestOdds(championship, path_data_odds).iloc[0:0]
+
+    history = pd.concat(history, ignore_index=True)
+    history["_date"] = pd.to_datetime(history["Date"], format=odds_date_format)
+
+    return history.sort_values(["_date", "HomeTeam", "AwayTeam", "ScrapedAt"]).drop(columns="_date").reset_index(drop=True)
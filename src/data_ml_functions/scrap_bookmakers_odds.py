@@ -7,18 +7,47 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium import webdriver
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
+from selenium.common.exceptions import WebDriverException, TimeoutException, NoSuchElementException
+from bs4 import BeautifulSoup
+import pandas as pd
+import numpy as np
+import requests
 
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import queue
+import time
+import io
+import contextlib
+import argparse
 import os
-import csv
 import shutil
 import re
 
 from common_variables import CSS_SELECTOR_BUTTON, CSS_SELECTOR_MATCHES, CSS_SELECTOR_DATE_MATCH, CSS_SELECTOR_MATCH_DETAILS, CSS_SELECTOR_MATCH_TEAMS, CSS_SELECTOR_MATCH_ODDS
 from common_variables import odds_base_url, championship_url_dict, driver_path, update_team_names, championships, path_data_source, path_data_raw
+from common_variables import odds_extraction_mode, webdriver_max_restarts, scraping_workers, scraping_league_timeout, scraping_league_retries, scraping_league_policies
+from common_variables import scraping_replay_source, scraping_record_dir
+from odds_store import appendOddsSnapshot, odds_columns
 
 
 
+"""
+Variables
+"""
+# Scraped match texts (see createMatchInfo) -> odds columns
+raw_match_columns = ["Date", "Home Team", "Away Team", "Odds 1", "Odds X", "Odds 2"]
+raw_odds_columns = {"Odds 1": "Avg_H", "Odds X": "Avg_D", "Odds 2": "Avg_A"}
+
+# Odds not available for a match (normalized to 0, the kelly criterion needs a value)
+missing_odds_texts = ["", "-"]
+
+# Team aliases index (scraped team name -> match history team name, see update_team_names)
+team_alias_index = pd.Index(list(update_team_names), dtype=object)
+team_alias_names = np.array(list(update_team_names.values()), dtype=object)
+
 
 
 """
@@ -75,59 +104,247 @@ def acceptCookies(driver):
         print("Cookies button not found")
 
 
-def ConvertOdds(odds):
+class WebDriverSession:
     """
-    Convert the odds from a fractional format to a decimal format.
-    
+    Firefox WebDriver session reused to scrap several championships.
+
+    The browser is started (and the cookies accepted) once, then each championship page is opened in the same browser.
+    If the browser crashes, it is restarted and the cookies saved after the consent are restored,
+    so the consent is not asked again.
+
+    Usage:
+        with WebDriverSession() as session:
+            driver = session.open(league_url)
+    """
+    def __init__(self, max_restarts=webdriver_max_restarts):
+        """
+        Args:
+            max_restarts (int): The number of browser restarts allowed for a page. Defaults to webdriver_max_restarts.
+        """
+        self.max_restarts = max_restarts
+        self.driver = None
+        self.cookies = []
+        self.restarts = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.quit()
+
+
+    def start(self, url: str):
+        """
+        Starts the browser on the given URL, then accepts the cookies (or restores the cookies of the previous browser).
+
+        Args:
+            url (str): The URL to open.
+
+        Returns:
+            WebDriver: The started WebDriver instance.
+        """
+        self.driver = initializeWebDriver(url)
+        self.driver.implicitly_wait(5)
+
+        if self.cookies:
+            for cookie in self.cookies:
+                try:
+                    self.driver.add_cookie(cookie)
+                except WebDriverException:
+                    pass
+            self.driver.refresh()
+        else:
+            acceptCookies(self.driver)
+            self.cookies = self.driver.get_cookies()
+
+        return self.driver
+
+
+    def restart(self, url: str):
+        """
+        Quits the current browser (crashed or not) and starts a new one on the given URL.
+
+        Args:
+            url (str): The URL to open.
+
+        Returns:
+            WebDriver: The new WebDriver instance.
+        """
+        self.quit()
+        self.restarts += 1
+        print(f"Restarting the WebDriver ({self.restarts} restart(s))")
+
+        return self.start(url)
+
+
+    def open(self, url: str):
+        """
+        Opens a URL in the session browser, the browser is started the first time and restarted if it crashed.
+
+        Args:
+            url (str): The URL to open.
+
+        Returns:
+            WebDriver: The WebDriver instance showing the URL.
+
+        Raises:
+            WebDriverException: If the page still can't be opened after max_restarts restarts.
+        """
+        if self.driver is None:
+            return self.start(url)
+
+        for attempt in range(self.max_restarts + 1):
+            try:
+                if attempt == 0:
+                    self.driver.get(url)
+                else:
+                    self.restart(url)
+                return self.driver
+            except WebDriverException:
+                if attempt == self.max_restarts:
+                    raise
+
+
+    def quit(self):
+        """
+        Quits the browser, errors of a crashed browser are ignored.
+        """
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+
+
+
+def parseOddsTexts(odds_texts: pd.Series) -> pd.Series:
+    """
+    Converts odds texts to decimal odds, in vectorized passes.
+
+    Fractional odds ("6/5") are divided (rounded to two decimal places), decimal odds ("2.75") are kept.
+    Odds not available (None, "" or "-") are set to 0.
+
     Args:
-        cote (str): The odds in fractional format (e.g. "3/1").
-        
+        odds_texts (pd.Series): The odds texts.
+
     Returns:
-        float: The converted odds in decimal format.
-            If the conversion is not possible, the original odds are returned.
+        pd.Series: The odds (float64), NaN if the text could not be parsed.
     """
-    try:
-        numerateur, denominateur = map(int, odds.split('/'))
-        rapport = numerateur / denominateur
-        return round(rapport, 2)  # Round to two decimal places for readability
-    except ValueError:  # Handle cases where conversion is not possible
-        return odds  # Return the original odds if they cannot be converted
+    texts = odds_texts.astype(object).where(odds_texts.notna(), "").astype(str).str.strip()
+
+    fractions = texts.str.extract(r'^(\d+)/(\d+)$').astype(float)
+    odds = (fractions[0] / fractions[1]).round(2)
+    odds = odds.where(fractions[0].isna(), odds.replace([np.inf, -np.inf], np.nan))
+    odds = odds.fillna(pd.to_numeric(texts.where(fractions[0].isna()), errors='coerce'))
+
+    return odds.mask(texts.isin(missing_odds_texts), 0.0).astype(np.float64)
+
 
 
-def convertDate(date_str):
+def parseMatchDates(date_texts: pd.Series, today=None) -> pd.Series:
     """
-    Converts a date string into a standardized format.
+    Converts the match date texts to dates, in vectorized passes (each distinct text is parsed once).
+
+    Formats: "25/04/2024", "25 Apr 2024", "Today, 25 Apr" & "Tomorrow, 26 Apr".
+    Relative dates take the year of the day they refer to (a "Tomorrow, 01 Jan" scraped on December 31st is in the next year).
 
     Args:
-        date_str (str): The date string to be converted.
+        date_texts (pd.Series): The date texts.
+        today (datetime, optional): The scraping day. Defaults to None (today).
 
     Returns:
-        str: The converted date string in the format '%d/%m/%Y'.
+        pd.Series: The dates (datetime64), NaT if the text could not be parsed.
+    """
+    today = pd.Timestamp(today if today is not None else datetime.now()).normalize()
+    texts = pd.Series(date_texts.dropna().astype(str).str.strip().unique(), dtype=object)
 
-    Raises:
-        ValueError: If the input date string is not in a recognized format.
+    # "Today, 25 Apr" / "Tomorrow, 26 Apr"
+    relative = texts.str.extract(r'^(today|tomorrow),\s*(\d{1,2} \w{3})', flags=re.IGNORECASE)
+    reference_days = today + pd.to_timedelta((relative[0].str.lower() == "tomorrow").astype(int), unit='D')
+    relative_dates = pd.to_datetime(relative[1] + " " + reference_days.dt.year.astype(str), format='%d %b %Y', errors='coerce')
+
+    dates = pd.to_datetime(texts, format='%d/%m/%Y', errors='coerce')
+    dates = dates.fillna(relative_dates).fillna(pd.to_datetime(texts, format='%d %b %Y', errors='coerce'))
 
+    return date_texts.astype(object).where(date_texts.notna(), None).map(pd.Series(dates.to_numpy(), index=texts.to_numpy()).to_dict()).astype('datetime64[ns]')
+
+
+
+def mapTeamAliases(teams: pd.Series) -> np.ndarray:
     """
-    # Depending on the date, the date can be in different formats depending on the next match calendar
+    Replaces the scraped team names by the match history team names (see update_team_names), with the precomputed aliases index.
 
-    if re.match(r'\d{2}/\d{2}/\d{4}', date_str):  # Check if date is in the format 'dd/mm/yyyy'
-        date_object = datetime.strptime(date_str, '%d/%m/%Y')
+    Args:
+        teams (pd.Series): The scraped team names.
 
+    Returns:
+        np.ndarray: The team names.
+    """
+    teams = teams.to_numpy(dtype=object)
+    positions = team_alias_index.get_indexer(teams)
 
-    elif date_str.lower().startswith('tomorrow,'):
-        date_str = date_str.split(',')[1].strip()
-        date_object = datetime.strptime(date_str, '%d %b')
-        date_object = date_object.replace(year=datetime.now().year)
+    return np.where(positions >= 0, team_alias_names.take(positions, mode='clip') if len(team_alias_names) else teams, teams)
 
-    elif date_str.lower().startswith('today,'):
-        date_str = date_str.split(',')[1].strip()
-        date_object = datetime.strptime(date_str, '%d %b')
-        date_object = date_object.replace(year=datetime.now().year)
 
-    else:
-        date_object = datetime.strptime(date_str, '%d %b %Y')
 
-    return date_object.strftime('%d/%m/%Y')
+def normalizeOdds(raw_odds: pd.DataFrame, today=None) -> pd.DataFrame:
+    """
+    Normalizes the scraped match texts to a typed odds frame, in vectorized passes:
+    dates parsed (see parseMatchDates), odds converted to decimal odds (see parseOddsTexts), team aliases replaced (see mapTeamAliases).
+
+    Args:
+        raw_odds (pd.DataFrame): The scraped match texts (raw_match_columns, see createMatchInfo).
+        today (datetime, optional): The scraping day. Defaults to None (today).
+
+    Returns:
+        pd.DataFrame: The odds (Date as datetime64, HomeTeam, AwayTeam, Avg_H, Avg_D & Avg_A as float64),
+            with a "ParseError" column flagging the rows which could not be parsed.
+    """
+    normalized_odds = pd.DataFrame(index=raw_odds.index)
+    normalized_odds["Date"] = parseMatchDates(raw_odds["Date"], today)
+    normalized_odds["HomeTeam"] = mapTeamAliases(raw_odds["Home Team"])
+    normalized_odds["AwayTeam"] = mapTeamAliases(raw_odds["Away Team"])
+
+    for raw_column, column in raw_odds_columns.items():
+        normalized_odds[column] = parseOddsTexts(raw_odds[raw_column])
+
+    normalized_odds["ParseError"] = normalized_odds.isna().any(axis=1)
+
+    return normalized_odds
+
+
+
+def createMatchInfo(date_match, last_date, teams, odds) -> dict:
+    """
+    Creates the match information dictionary from the texts of a match row.
+    The texts are kept as scraped, they are normalized for the whole championship at once (see normalizeOdds).
+
+    Args:
+        date_match (str): The date text of the match ("" or None if the row has no date).
+        last_date (str): The last date text in case the date of the match is not found.
+        teams (list): The texts of the team names (home team first).
+        odds (list): The texts of the odds (home, draw, away).
+
+    Returns:
+        dict: A dictionary containing the match information (see extract_match_info).
+    """
+    if len(odds) < 3:
+        print("Not enough odds data available for this match.")
+        odds = [None, None, None]  # Odds not available (normalized to 0)
+
+    # Create a dictionary with the match informations
+    match_info = {
+        "Date": date_match if date_match else last_date,
+        "Home Team": teams[0],
+        "Away Team": teams[1],
+        "Odds 1": odds[0],
+        "Odds X": odds[1],
+        "Odds 2": odds[2]}
+
+    return match_info
 
 
 def extract_match_info(match, last_date):
@@ -139,7 +356,7 @@ def extract_match_info(match, last_date):
         last_date (str): The last date in case the date of the match is not found.
 
     Returns:
-        dict: A dictionary containing the extracted match information with the following keys:
+        dict: A dictionary containing the extracted match information (texts, see normalizeOdds) with the following keys:
             - "Date": The date of the match.
             - "Home Team": The name of the home team.
             - "Away Team": The name of the away team.
@@ -152,118 +369,532 @@ def extract_match_info(match, last_date):
         date_match = match.find_element(By.CSS_SELECTOR, CSS_SELECTOR_DATE_MATCH).text
     except Exception:
         date_match = ""
-        date_match = last_date
-
-    date_match = convertDate(date_match)
 
     # Get the match details
     match_datas = match.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCH_DETAILS)
 
     for match_details in match_datas:
         # Teams
-        teams = match_details.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCH_TEAMS)
-        home_team = teams[0].text
-        away_team = teams[1].text
-
+        teams = [team.text for team in match_details.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCH_TEAMS)]
 
         # Odds
-        odd_datas = match_details.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCH_ODDS)
-        
-        if len(odd_datas) >= 3:
-            odds_1 = odd_datas[0].text
-            odds_x = odd_datas[1].text
-            odds_2 = odd_datas[2].text
-        else:
-            print("Not enough odds data available for this match.")
-            odds_1 = odds_x = odds_2 = 0  # Default value if odds are not available (kelly criterion need a value)
+        odds = [odd.text for odd in match_details.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCH_ODDS)]
+
+        match_info = createMatchInfo(date_match, last_date, teams, odds)
+
+    return match_info
+
+
+def getElementText(element) -> str:
+    """
+    Gets the text of a parsed HTML element, like the WebElement text (whitespaces collapsed).
+
+    Args:
+        element (bs4.element.Tag): The parsed HTML element.
 
+    Returns:
+        str: The text of the element.
+    """
+    return " ".join(element.get_text(" ").split())
 
-        odds_1 = ConvertOdds(odds_1) if odds_1 else odds_1
-        odds_x = ConvertOdds(odds_x) if odds_x else odds_x
-        odds_2 = ConvertOdds(odds_2) if odds_2 else odds_2
-                
 
-        # Create a dictionary with the match informations
-        match_info = {
-            "Date": date_match,
-            "Home Team": home_team,
-            "Away Team": away_team,
-            "Odds 1": odds_1,
-            "Odds X": odds_x,
-            "Odds 2": odds_2}
+def extractMatchInfoFromHtml(match, last_date):
+    """
+    Extracts match information from a match row parsed from the page source (same result as extract_match_info).
+
+    Args:
+        match (bs4.element.Tag): The parsed match row ("div.eventRow").
+        last_date (str): The last date in case the date of the match is not found.
+
+    Returns:
+        dict: A dictionary containing the extracted match information (see extract_match_info).
+    """
+    # Get the date
+    date_element = match.select_one(CSS_SELECTOR_DATE_MATCH)
+    date_match = getElementText(date_element) if date_element is not None else ""
+
+    # Get the match details
+    for match_details in match.select(CSS_SELECTOR_MATCH_DETAILS):
+        teams = [getElementText(team) for team in match_details.select(CSS_SELECTOR_MATCH_TEAMS)]
+        odds = [getElementText(odd) for odd in match_details.select(CSS_SELECTOR_MATCH_ODDS)]
+
+        match_info = createMatchInfo(date_match, last_date, teams, odds)
 
     return match_info
 
 
-def scrapOdds():
+def extractMatchesFromPageSource(page_source: str) -> list:
     """
-    Scrapes bookmakers' odds for different championships.
+    Extracts the match details of a championship page from its HTML source.
 
-    This function iterates over a list of championships and scrapes the bookmakers' odds for each championship.
-    It initializes a WebDriver, accepts cookies, and extracts match details for each match in the championship.
-    The match details are then saved to a CSV file.
+    The page source is fetched once and parsed in-process (lxml parser), instead of
+    one WebDriver request per element of each match row.
 
     Args:
+        page_source (str): The HTML source of the championship page (driver.page_source or a saved page).
+
+    Returns:
+        list: The match details (see extract_match_info).
+    """
+    page = BeautifulSoup(page_source, "lxml")
+
+    last_date = None
+    all_match_details = []
+
+    for match in page.select(CSS_SELECTOR_MATCHES):
+        match_info = extractMatchInfoFromHtml(match, last_date)
+
+        # Update last date known value for matches
+        if match_info['Date'] != last_date:
+            last_date = match_info['Date']
+
+        print(match_info)
+        all_match_details.append(match_info)
+
+    return all_match_details
+
+
+def scrapChampionshipOdds(driver, extraction_mode=odds_extraction_mode) -> list:
+    """
+    Extracts the match details of the championship page opened in the WebDriver.
+
+    Args:
+        driver (WebDriver): The WebDriver showing the championship page.
+        extraction_mode (str): "page_source" (the page source is parsed once, see extractMatchesFromPageSource)
+            or "webdriver" (elements read one by one through the WebDriver). Defaults to odds_extraction_mode.
+
+    Returns:
+        list: The match details (see extract_match_info).
+    """
+    elements = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, CSS_SELECTOR_MATCHES)))
+
+    if extraction_mode == "page_source":
+        return extractMatchesFromPageSource(driver.page_source)
+
+    # Prepare match details extraction
+    last_date = None
+    all_match_details = []
+
+    # Find match elements
+    matchs = driver.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCHES)
+
+    # Extract match details
+    for match in matchs:
+        match_info = extract_match_info(match, last_date)
+
+        # Update last date known value for matches
+        if match_info['Date'] != last_date:
+            last_date = match_info['Date']
+
+        print(match_info)
+        all_match_details.append(match_info)
+
+    return all_match_details
+
+
+def saveChampionshipOdds(championship: str, all_match_details: list) -> None:
+    """
+    Normalizes the match details of a championship (see normalizeOdds) and saves them to its odds file (source folder),
+    then copies it to the raw folder. The odds are also appended to the odds store (see odds_store.appendOddsSnapshot).
+    The matches which could not be parsed are not saved.
+
+    Args:
+        championship (str): The name of the championship.
+        all_match_details (list): The match details (see extract_match_info).
+
+    Returns:
         None
+    """
+    normalized_odds = normalizeOdds(pd.DataFrame(all_match_details, columns=raw_match_columns))
+
+    parse_errors = normalized_odds["ParseError"].to_numpy()
+    if parse_errors.any():
+        print(f"{championship}: {parse_errors.sum()} match(es) could not be parsed and are not saved: {[match_details for match_details, parse_error in zip(all_match_details, parse_errors) if parse_error]}")
+
+    odds = normalized_odds.loc[~parse_errors, odds_columns]
+    odds["Date"] = odds["Date"].dt.strftime('%d/%m/%Y')
+
+    # Save all information to a CSV file
+    # Create a file named 'odds.csv' in the directory
+    destination_file = os.path.join(path_data_source, championship + '_odds.csv')
+    odds.to_csv(destination_file, index=False, encoding='utf-8')
+
+    shutil.copy(destination_file, path_data_raw + '/' + championship + '_odds.csv')
+
+    # Keep the odds history (the odds file only contains the last scrape)
+    appendOddsSnapshot(championship, odds)
+
+
+def getScrapingPolicy(championship: str) -> tuple:
+    """
+    Gets the timeout & retries of a championship (scraping_league_policies, or the default values).
+
+    Args:
+        championship (str): The name of the championship.
+
+    Returns:
+        tuple: The timeout of an attempt (seconds) and the number of retries.
+    """
+    policy = scraping_league_policies.get(championship, {})
+
+    return policy.get('timeout', scraping_league_timeout), policy.get('retries', scraping_league_retries)
+
+
+def scrapChampionshipWithSession(session: WebDriverSession, championship: str, record_dir=scraping_record_dir) -> None:
+    """
+    Scrapes & saves the odds of a championship with a WebDriver session, following the championship timeout & retries.
+
+    If an attempt lasts longer than the timeout, a watchdog quits the browser so the attempt fails.
+    Each retry starts with a new browser.
+
+    Args:
+        session (WebDriverSession): The WebDriver session used (or a ReplaySession).
+        championship (str): The name of the championship.
+        record_dir (str): The folder where the scraped page is recorded (see recordPage). Defaults to scraping_record_dir (empty = not recorded).
 
     Returns:
         None
+
+    Raises:
+        Exception: The error of the last attempt, if every attempt failed.
+    """
+    league_url = odds_base_url + championship_url_dict[championship]
+    timeout, retries = getScrapingPolicy(championship)
+
+    for attempt in range(retries + 1):
+        watchdog = threading.Timer(timeout, session.quit)
+        watchdog.start()
+
+        try:
+            driver = session.open(league_url) if attempt == 0 else session.restart(league_url)
+            all_match_details = scrapChampionshipOdds(driver)
+            if record_dir:
+                recordPage(league_url, driver.page_source, record_dir)
+            break
+
+        except Exception as e:
+            timed_out = watchdog.finished.is_set()
+
+            # The page has no match : not a browser failure
+            if isinstance(e, TimeoutException) and not timed_out:
+                raise
+
+            print(f"{championship}: attempt {attempt + 1} failed ({'timeout' if timed_out else repr(e)})")
+            if attempt == retries:
+                raise
+
+        finally:
+            watchdog.cancel()
+
+    saveChampionshipOdds(championship, all_match_details)
+
+
+def scrapOdds(n_workers=scraping_workers, replay_source=scraping_replay_source) -> dict:
+    """
+    Scrapes bookmakers' odds for different championships.
+
+    This function iterates over a list of championships and scrapes the bookmakers' odds for each championship.
+    A WebDriver session is reused for several championships (the browser is started and the cookies accepted once),
+    and the browser is restarted if it crashes while a championship is scraped.
+    With n_workers > 1, championships are distributed across a pool of n_workers browsers running in parallel.
+    With a replay source, the recorded championship pages are scraped instead of the live site (see ReplaySession).
+    Each championship has its own timeout & retries (see getScrapingPolicy) and its match details are saved to its CSV file
+    as soon as it is scraped. A failing championship doesn't stop the others, the failures are raised once all championships are done.
+
+    Args:
+        n_workers (int, optional): The number of championships scraped in parallel. Defaults to scraping_workers.
+        replay_source (str, optional): The folder or the base URL of the recorded pages. Defaults to scraping_replay_source (empty = live site).
+
+    Returns:
+        dict: The status of each championship ("success" or "failed: <error>").
+
+    Raises:
+        Exception: If at least one championship failed.
+    """
+    championship_status = {}
+
+    def onChampionshipDone(championship, error=None):
+        championship_status[championship] = "success" if error is None else f"failed: {error!r}"
+        print(f"{championship}: {championship_status[championship]}")
+
+
+    if n_workers > 1 and len(championships) > 1:
+        # Pool of browser sessions, a session is used by one championship at a time
+        sessions = queue.Queue()
+        pool_size = min(n_workers, len(championships))
+        for _ in range(pool_size):
+            sessions.put(createScrapingSession(replay_source))
+
+        def scrapChampionshipFromPool(championship):
+            session = sessions.get()
+            try:
+                scrapChampionshipWithSession(session, championship)
+            finally:
+                sessions.put(session)
+
+        try:
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                futures = {executor.submit(scrapChampionshipFromPool, championship): championship for championship in championships}
+
+                for future in as_completed(futures):
+                    onChampionshipDone(futures[future], future.exception())
+        finally:
+            while not sessions.empty():
+                sessions.get().quit()
+
+    else:
+        with createScrapingSession(replay_source) as session:
+            for championship in championships:
+                try:
+                    scrapChampionshipWithSession(session, championship)
+                    onChampionshipDone(championship)
+                except Exception as e:
+                    onChampionshipDone(championship, e)
+
+
+    failed_championships = [championship for championship, status in championship_status.items() if status.startswith("failed")]
+    if failed_championships:
+        raise Exception(f"Odds scraping failed for: {failed_championships} - {championship_status}")
+
+    return championship_status
+
+
+
+"""
+Replay (offline scraping) Functions
+"""
+def getRecordedPagePath(url: str) -> str:
+    """
+    Gets the path of a recorded championship page, relative to the replay folder.
+
+    The pages are recorded like the site tree (e.g. "england/premier-league/index.html"),
+    so the replay folder can also be served as is by a local HTTP server (python -m http.server).
+
+    Args:
+        url (str): The URL of the championship page.
+
+    Returns:
+        str: The relative path of the recorded page.
+    """
+    page_path = url[len(odds_base_url):] if url.startswith(odds_base_url) else urlparse(url).path
+
+    return "/".join([part for part in page_path.split("/") if part] + ["index.html"])
+
+
+
+def recordPage(url: str, page_source: str, record_dir=scraping_record_dir) -> str:
     """
-    for championship in championships:
-        # Define league URL
-        league_url = odds_base_url + championship_url_dict[championship]
+    Saves the HTML source of a championship page, to replay it later (see ReplaySession).
 
-        # Initialize WebDriver
-        driver = initializeWebDriver(league_url)
+    Args:
+        url (str): The URL of the championship page.
+        page_source (str): The HTML source of the page.
+        record_dir (str): The folder of the recorded pages. Defaults to scraping_record_dir.
+
+    Returns:
+        str: The path of the recorded page.
+    """
+    page_file = os.path.join(record_dir, getRecordedPagePath(url))
+    os.makedirs(os.path.dirname(page_file), exist_ok=True)
+
+    with open(page_file, 'w', encoding='utf-8') as f:
+        f.write(page_source)
+
+    return page_file
+
+
+
+def loadRecordedPage(url: str, replay_source=scraping_replay_source) -> str:
+    """
+    Loads the recorded HTML source of a championship page, from a folder or from a local HTTP server.
+
+    Args:
+        url (str): The URL of the championship page (live site URL).
+        replay_source (str): The folder or the base URL of the recorded pages. Defaults to scraping_replay_source.
+
+    Returns:
+        str: The HTML source of the page.
+
+    Raises:
+        WebDriverException: If the page was not recorded.
+    """
+    page_path = getRecordedPagePath(url)
+
+    try:
+        if replay_source.startswith(("http://", "https://")):
+            response = requests.get(replay_source.rstrip("/") + "/" + page_path, timeout=10)
+            response.raise_for_status()
+            return response.text
+
+        with open(os.path.join(replay_source, page_path), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    except (OSError, requests.RequestException) as e:
+        raise WebDriverException(f"Recorded page not found for {url}: {e!r}")
+
+
+
+class ReplayElement:
+    """
+    Element of a recorded page, with the WebElement methods used by the scraper (text, find_element, find_elements).
+    """
+    def __init__(self, tag):
+        """
+        Args:
+            tag (bs4.element.Tag): The parsed HTML element.
+        """
+        self.tag = tag
 
-        # Wait before start scraping
-        driver.implicitly_wait(5)
 
-        # Accept cookies
-        acceptCookies(driver)
+    @property
+    def text(self) -> str:
+        return getElementText(self.tag)
 
-        # Prepare match details extraction
-        last_date = None
-        all_match_details = []
 
-        elements = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, CSS_SELECTOR_MATCHES)))
+    def find_element(self, by, value):
+        element = self.tag.select_one(value)
+        if element is None:
+            raise NoSuchElementException(f"No element found for {value}")
+        return ReplayElement(element)
 
-        # Find match elements
-        matchs = driver.find_elements(By.CSS_SELECTOR, CSS_SELECTOR_MATCHES)
 
-        # Extract match details
-        for match in matchs:
-            match_info = extract_match_info(match, last_date)
+    def find_elements(self, by, value) -> list:
+        return [ReplayElement(element) for element in self.tag.select(value)]
 
-            # Update last date known value for matches
-            if match_info['Date'] != last_date:
-                last_date = match_info['Date']
 
-            print(match_info)
-            all_match_details.append(match_info)
 
-        # Save all information to a CSV file
-        # Create a file named 'odds.csv' in the directory
-        destination_file = os.path.join(path_data_source, championship + '_odds.csv')
+class ReplayDriver(ReplayElement):
+    """
+    WebDriver replaying a recorded page: the page source & elements are read from the recorded HTML (CSS selectors only),
+    so the recorded page goes through the same extraction code as the live page (see scrapChampionshipOdds).
+    """
+    def __init__(self, url: str, page_source: str):
+        """
+        Args:
+            url (str): The URL of the championship page.
+            page_source (str): The recorded HTML source of the page.
+        """
+        super().__init__(BeautifulSoup(page_source, "lxml"))
+        self.current_url = url
+        self.page_source = page_source
+
+
+    def quit(self):
+        pass
+
+
+
+class ReplaySession:
+    """
+    Offline session replacing WebDriverSession: each championship page is loaded from the recorded pages instead of the live site.
+
+    Usage:
+        with ReplaySession("recorded_pages/") as session:
+            driver = session.open(league_url)
+    """
+    def __init__(self, replay_source=scraping_replay_source):
+        """
+        Args:
+            replay_source (str): The folder or the base URL of the recorded pages. Defaults to scraping_replay_source.
+        """
+        self.replay_source = replay_source
+        self.driver = None
+        self.restarts = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.quit()
+
+
+    def open(self, url: str):
+        """
+        Opens a recorded page.
+
+        Args:
+            url (str): The URL of the championship page.
+
+        Returns:
+            ReplayDriver: The driver showing the recorded page.
+        """
+        self.driver = ReplayDriver(url, loadRecordedPage(url, self.replay_source))
+        return self.driver
+
+
+    def restart(self, url: str):
+        self.restarts += 1
+        return self.open(url)
+
+
+    def quit(self):
+        self.driver = None
+
+
+
+def createScrapingSession(replay_source=scraping_replay_source):
+    """
+    Creates the session used to open the championship pages: a browser, or the recorded pages if a replay source is given.
+
+    Args:
+        replay_source (str): The folder or the base URL of the recorded pages. Defaults to scraping_replay_source (empty = live site).
+
+    Returns:
+        WebDriverSession | ReplaySession: The scraping session.
+    """
+    return ReplaySession(replay_source) if replay_source else WebDriverSession()
+
+
+
+def benchmarkScraping(replay_source: str, championships=championships, extraction_mode=odds_extraction_mode, repeat=3) -> dict:
+    """
+    Measures the scraping speed on recorded pages (no request to the live site, nothing saved).
+
+    For each championship, the recorded page is opened and its matches extracted (scrapChampionshipOdds) & normalized `repeat` times,
+    the fastest run is kept. The match details printed during the extraction are not shown.
+
+    Args:
+        replay_source (str): The folder or the base URL of the recorded pages.
+        championships (list): The championships to scrap. Defaults to championships.
+        extraction_mode (str): "page_source" or "webdriver" (see scrapChampionshipOdds). Defaults to odds_extraction_mode.
+        repeat (int): The number of runs for each championship. Defaults to 3.
+
+    Returns:
+        dict: For each championship, the number of matches, the end-to-end time (seconds) and the matches parsed per second.
+    """
+    results = {}
 
-        with open(destination_file, 'w', newline='', encoding='utf-8') as fichier:
-            writer = csv.writer(fichier)
-            writer.writerow(['Date', 'HomeTeam', 'AwayTeam', 'Avg_H', 'Avg_D', 'Avg_A'])
+    with ReplaySession(replay_source) as session:
+        for championship in championships:
+            league_url = odds_base_url + championship_url_dict[championship]
+            timings = []
 
-            for match_details in all_match_details:
-                home_team = match_details['Home Team']
-                away_team = match_details['Away Team']
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    all_match_details = scrapChampionshipOdds(session.open(league_url), extraction_mode)
+                    normalizeOdds(pd.DataFrame(all_match_details, columns=raw_match_columns))
+                timings.append(time.perf_counter() - start_time)
 
-                # Update team names
-                if home_team in update_team_names:
-                    home_team = update_team_names[home_team]
+            seconds = min(timings)
+            results[championship] = {"matches": len(all_match_details),
+                                      "seconds": round(seconds, 4),
+                                      "matches_per_second": round(len(all_match_details) / seconds, 1) if seconds else None}
 
-                if away_team in update_team_names:
-                    away_team = update_team_names[away_team]
+    return results
 
 
-                writer.writerow([match_details['Date'], home_team, away_team, match_details['Odds 1'], match_details['Odds X'], match_details['Odds 2']])
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Odds scraper benchmark on recorded pages (see recordPage & SCRAPING_RECORD_DIR)")
+    parser.add_argument("replay_source", help="Folder or base URL (local HTTP server) of the recorded pages")
+    parser.add_argument("--mode", default=odds_extraction_mode, choices=["page_source", "webdriver"], help="Odds extraction mode")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs for each championship (fastest kept)")
+    parser.add_argument("--championships", nargs="+", default=championships, help="Championships to scrap")
+    args = parser.parse_args()
 
-        shutil.copy(destination_file, path_data_raw + '/' + championship + '_odds.csv')
-        driver.quit()  # Quit the WebDriver
\ No newline at end of file
+    results = benchmarkScraping(args.replay_source, args.championships, args.mode, args.repeat)
+    for championship, result in results.items():
+        print(f"{championship}: {result['matches']} matches in {result['seconds']} s ({result['matches_per_second']} matches/s)")
@@ -6,67 +6,396 @@ Get Datas from source - Matchs history
 Libraries
 """
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import zipfile
+import zlib
+import shutil
+import tempfile
+import json
+import csv
 import os
+from datetime import datetime, time
+from concurrent.futures import ProcessPoolExecutor
 from openpyxl import load_workbook
 
-from common_variables import path_data_raw, current_season
+from common_variables import path_data_raw, current_season, download_chunk_size, download_timeout, championships, xlsx_conversion_workers, \
+                             season_filter_chunk_size, other_leagues_date_format
+
+
+"""
+Variables
+"""
+# HTTP session shared by the downloads (connections kept alive & reused from one URL to another)
+download_session = None
+
+# Messages returned by scrapMatchHistory
+download_success_message = "File downloaded and saved successfully"
+download_not_modified_message = "File not modified since the last download"
 
 """
 Functions
 """
-def scrapMatchHistory(url, filename):
+def getDownloadSession() -> requests.Session:
+    """
+    Gets the HTTP session shared by the downloads (created on first use).
+
+    Returns:
+        requests.Session: The shared session, with a pool of keep-alive connections.
+    """
+    global download_session
+
+    if download_session is None:
+        download_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=2)
+        download_session.mount("http://", adapter)
+        download_session.mount("https://", adapter)
+
+    return download_session
+
+
+
+def getValidatorsPath(filename) -> str:
+    """
+    Gets the path of the file storing the HTTP validators (ETag, Last-Modified) of a downloaded file.
+
+    The validators file is a dotfile next to the downloaded file, so it isn't archived with the source datas (see createDataArchive).
+
+    Args:
+        filename (str): The name of the downloaded file.
+
+    Returns:
+        str: The path of the validators file (".<file name>.validators.json").
+    """
+    return os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ".validators.json")
+
+
+
+def loadValidators(url, filename) -> dict:
+    """
+    Loads the HTTP validators of the previous download of a file, as conditional request headers.
+
+    Validators are only used if the file is still there and was downloaded from the same URL.
+
+    Args:
+        url (str): The URL of the file.
+        filename (str): The name of the downloaded file.
+
+    Returns:
+        dict: The conditional request headers ("If-None-Match", "If-Modified-Since"), empty if the file must be downloaded.
+    """
+    validators_path = getValidatorsPath(filename)
+
+    if not os.path.exists(filename) or not os.path.exists(validators_path):
+        return {}
+
+    with open(validators_path, 'r') as f:
+        validators = json.load(f)
+
+    if validators.get("url") != url:
+        return {}
+
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    return headers
+
+
+
+def setSortCompleted(filename, completed: bool) -> None:
+    """
+    Records in the validators file whether the datas of a downloaded file have been sorted into the raw datas.
+
+    Args:
+        filename (str): The name of the downloaded file.
+        completed (bool): True once the datas have been sorted, False before sorting them.
+    """
+    validators_path = getValidatorsPath(filename)
+    validators = {}
+
+    if os.path.exists(validators_path):
+        with open(validators_path, 'r') as f:
+            validators = json.load(f)
+
+    validators["sorted"] = completed
+    with open(validators_path, 'w') as f:
+        json.dump(validators, f)
+
+
+
+def isSortCompleted(filename) -> bool:
+    """
+    Checks if the datas of a downloaded file have been sorted into the raw datas (see setSortCompleted).
+
+    Args:
+        filename (str): The name of the downloaded file.
+
+    Returns:
+        bool: True if the last sort of the file completed.
+    """
+    validators_path = getValidatorsPath(filename)
+
+    if not os.path.exists(validators_path):
+        return False
+
+    with open(validators_path, 'r') as f:
+        return json.load(f).get("sorted") is True
+
+
+
+def scrapMatchHistory(url, filename, session=None):
     """
     Downloads a file from the given URL and saves it with the specified filename.
 
+    The request is conditional: the ETag / Last-Modified validators of the previous download are sent,
+    and the file is kept as it is if the server answers 304 (not modified).
+    Otherwise the body is streamed by chunks to a temporary file, which then replaces the file atomically.
+
     Args:
         url (str): The URL of the file to be downloaded.
         filename (str): The name of the file to be saved.
+        session (requests.Session, optional): The HTTP session used. Defaults to None (shared session, see getDownloadSession).
 
     Returns:
-        dict: A dictionary with a message indicating the status of the download and save operation.
-            If the operation is successful, the message will be "File downloaded and saved successfully".
-            If the operation fails, the message will be "request returned with status code {status_code}".
+        dict: A dictionary with a message indicating the status of the download and save operation,
+            and "modified" (False if the file didn't change since the previous download).
+            If the file is downloaded, the message will be "File downloaded and saved successfully".
+            If the file didn't change, the message will be "File not modified since the last download".
+
+    Raises:
+        Exception: If the request returned another status code ("request returned with status code {status_code}").
     """
+    session = session or getDownloadSession()
+    headers = loadValidators(url, filename)
+
     # get file according to URL
-    response = requests.get(url, filename)
+    with session.get(url, headers=headers, stream=True, timeout=download_timeout) as response:
+
+        if response.status_code == 304:
+            return {"message" : download_not_modified_message, "modified": False}
 
-    if response.status_code == 200:
-        with open(filename, 'wb') as file:
-            file.write(response.content)
-        return {"message" : "File downloaded and saved successfully"}
+        if response.status_code != 200:
+            raise Exception(f"request returned with status code {response.status_code}")
 
-    else:
-        raise Exception(f"request returned with status code {response.status_code}")
+        # Stream the body to a temporary file in the same folder
+        file_folder = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile(dir=file_folder, prefix=".download_", delete=False) as temporary_file:
+            try:
+                for chunk in response.iter_content(chunk_size=download_chunk_size):
+                    temporary_file.write(chunk)
+            except Exception:
+                temporary_file.close()
+                os.remove(temporary_file.name)
+                raise
 
+        os.replace(temporary_file.name, filename)
 
+        # Save the validators for the next download
+        with open(getValidatorsPath(filename), 'w') as f:
+            json.dump({"url": url,
+                       "etag": response.headers.get("ETag"),
+                       "last_modified": response.headers.get("Last-Modified")}, f)
 
-def sortDatasMatchHistory(filename, path_data_raw=path_data_raw):
+        # Validators file written by the previous versions in the source folder (archived with the source datas)
+        if os.path.exists(filename + ".validators.json"):
+            os.remove(filename + ".validators.json")
+
+    return {"message" : download_success_message, "modified": True}
+
+
+
+def computeFileCrc(file_path, chunk_size=download_chunk_size) -> int:
+    """
+    Computes the CRC-32 of a file (same checksum as the one stored for each zip member).
+
+    Parameters:
+    file_path (str): The path to the file.
+    chunk_size (int): The number of bytes read at once. Defaults to download_chunk_size.
+
+    Returns:
+    int: The CRC-32 of the file, or None if the file doesn't exist.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    crc = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc
+
+
+
+def extractChangedMembers(filename, dictionary, path_data_raw=path_data_raw, championships=championships) -> list:
+    """
+    Extracts the match histories of the configured championships from a zip file, only if they changed.
+
+    Only the members mapped to a championship of `championships` by the dictionary (e.g. "E0.csv" -> "English Premier League")
+    are read. A member is skipped if its CRC is the same as the CRC of the raw file already there,
+    otherwise it is extracted to a temporary file which replaces the raw file (already named after the championship).
+
+    Parameters:
+    filename (str): The name of the zip file.
+    dictionary (dict): The dictionary with the zip member names (without extension) as keys and the championships as values.
+    path_data_raw (str): The path to the raw datas. Defaults to path_data_raw.
+    championships (list): The championships to extract. Defaults to championships.
+
+    Returns:
+    list: The championships whose match history changed.
+    """
+    changed_leagues = []
+
+    with zipfile.ZipFile(filename, 'r') as zip_ref:
+        for member in zip_ref.infolist():
+            base, extension = os.path.splitext(os.path.basename(member.filename))
+            championship = dictionary.get(base)
+
+            if championship not in championships:
+                continue
+
+            raw_file = os.path.join(path_data_raw, championship + extension)
+            if computeFileCrc(raw_file) == member.CRC:
+                print(f"{championship}: match history unchanged")
+                continue
+
+            with zip_ref.open(member) as source, tempfile.NamedTemporaryFile(dir=path_data_raw, prefix=".extract_", delete=False) as temporary_file:
+                shutil.copyfileobj(source, temporary_file, download_chunk_size)
+            os.replace(temporary_file.name, raw_file)
+
+            print(f"{championship}: match history updated")
+            changed_leagues.append(championship)
+
+    return changed_leagues
+
+
+
+def formatCellValue(value) -> str:
+    """
+    Formats a workbook cell value for a CSV file, like pandas does (dates without time are written "YYYY-MM-DD").
+
+    Parameters:
+    value: The cell value.
+
+    Returns:
+    str: The CSV value.
+    """
+    if value is None:
+        return ""
+
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d') if value.time() == time(0, 0) else value.isoformat(sep=' ')
+
+    return str(value)
+
+
+
+def convertSheetsToCsv(filename, sheet_files: list) -> None:
+    """
+    Converts workbook sheets to CSV files, row by row.
+
+    The workbook is opened once in read-only mode: rows are streamed from the file
+    and written straight to the CSV file (a temporary file which then replaces the CSV file).
+
+    Parameters:
+    filename (str): The name of the workbook (.xlsx).
+    sheet_files (list): The sheets to convert and their CSV files, as (sheet name, CSV file path) tuples.
+
+    Returns:
+    None
+    """
+    wb = load_workbook(filename, read_only=True, data_only=True)
+
+    try:
+        for sheet, csv_file in sheet_files:
+            with tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8', dir=os.path.dirname(os.path.abspath(csv_file)),
+                                             prefix=".convert_", delete=False) as temporary_file:
+                writer = csv.writer(temporary_file)
+                for row in wb[sheet].iter_rows(values_only=True):
+                    # Empty rows are skipped (like pandas)
+                    if all(value is None for value in row):
+                        continue
+                    writer.writerow([formatCellValue(value) for value in row])
+
+            os.replace(temporary_file.name, csv_file)
+    finally:
+        wb.close()
+
+
+
+def convertWorkbookToCsv(filename, path_data_raw=path_data_raw, dictionary=None, championships=championships, n_workers=xlsx_conversion_workers) -> list:
+    """
+    Converts the sheets of a workbook (other leagues match histories) to CSV files in the raw datas folder.
+
+    If a dictionary is given, only the sheets mapped to a championship of `championships` are converted,
+    and their CSV files are named after the championship. Otherwise every sheet is converted to "<sheet>.csv".
+    With n_workers > 1, the sheets are split between n_workers processes (each one opens the workbook once).
+
+    Parameters:
+    filename (str): The name of the workbook (.xlsx).
+    path_data_raw (str): The path to the raw datas. Defaults to path_data_raw.
+    dictionary (dict, optional): The dictionary with the sheet names as keys and the championships as values. Defaults to None.
+    championships (list): The championships to convert. Defaults to championships.
+    n_workers (int): The number of processes converting the sheets. Defaults to xlsx_conversion_workers.
+
+    Returns:
+    list: The converted leagues.
+    """
+    wb = load_workbook(filename, read_only=True)
+    sheet_names = wb.sheetnames
+    wb.close()
+
+    if dictionary is not None:
+        sheet_names = [sheet for sheet in sheet_names if dictionary.get(sheet) in championships]
+
+    leagues = [dictionary[sheet] if dictionary is not None else sheet for sheet in sheet_names]
+    sheet_files = [(sheet, os.path.join(path_data_raw, f"{league}.csv")) for sheet, league in zip(sheet_names, leagues)]
+
+    if n_workers > 1 and len(sheet_files) > 1:
+        n_workers = min(n_workers, len(sheet_files))
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(convertSheetsToCsv, filename, sheet_files[worker::n_workers]) for worker in range(n_workers)]
+            for future in futures:
+                future.result()
+    elif sheet_files:
+        convertSheetsToCsv(filename, sheet_files)
+
+    return leagues
+
+
+
+def sortDatasMatchHistory(filename, path_data_raw=path_data_raw, dictionary=None):
     """
     Sorts the data from the given file et rename files.
 
     Parameters:
     filename (str): The name of the file to be sorted.
+    path_data_raw (str): The path to the raw datas. Defaults to path_data_raw.
+    dictionary (dict, optional): The dictionary with the file names as keys and the championships as values.
+        If given, only the match histories of the configured championships are extracted
+        (only the changed ones for a zip file, see extractChangedMembers). Defaults to None (every file is extracted).
 
     Returns:
-    None
+    list: The leagues whose match history was written (only the changed ones for a zip file with a dictionary).
     """
     # Check the file extension
     if filename.endswith('.zip'):
+        if dictionary is not None:
+            return extractChangedMembers(filename, dictionary, path_data_raw)
+
         # Unzip the file
         with zipfile.ZipFile(filename, 'r') as zip_ref:
             zip_ref.extractall(path_data_raw)
+            return [os.path.splitext(os.path.basename(member))[0] for member in zip_ref.namelist()]
 
     elif filename.endswith('.xlsx'):
-        # Load the workbook
-        wb = load_workbook(filename)
-        # Get the sheet names
-        sheet_names = wb.sheetnames
-        # For each sheet, read it and save it as a csv file
-        for sheet in sheet_names:
-            df = pd.read_excel(filename, sheet_name=sheet)
-            df.to_csv(os.path.join(path_data_raw, f"{sheet}.csv"), index=False)
+        # Convert each sheet to a csv file (workbook streamed, see convertWorkbookToCsv)
+        return convertWorkbookToCsv(filename, path_data_raw, dictionary)
+
+    return []
 
 
 
@@ -88,15 +417,65 @@ def renameFilesMatchHistory(dictionary, path_data_raw=path_data_raw):
 
 
 
+def filterSeasonRows(file_path, season_years: list, date_format=other_leagues_date_format, chunk_size=season_filter_chunk_size) -> int:
+    """
+    Removes the rows of a raw data file whose date is not in the given years.
+
+    A first pass only reads the 'Date' column: files which only contain the given years are skipped, nothing is written.
+    Otherwise the file is read in chunks (values kept as written) and the rows to keep are written to a temporary file,
+    which replaces the file. Rows with a blank or invalid date are removed.
+
+    Parameters:
+    file_path (str): The path to the raw data file.
+    season_years (list): The years to keep.
+    date_format (str): The format of the 'Date' column. Defaults to other_leagues_date_format.
+    chunk_size (int): The number of rows read at once. Defaults to season_filter_chunk_size.
+
+    Returns:
+    int: The number of removed rows.
+    """
+    def getYears(dates):
+        # Dates with a time component are parsed, blank or invalid dates give NaT (year NaN, removed)
+        return pd.to_datetime(dates, format=date_format, exact=False, errors='coerce').dt.year
+
+    # Files with the given years only are skipped
+    with pd.read_csv(file_path, usecols=['Date'], dtype=str, keep_default_na=False, chunksize=chunk_size) as date_chunks:
+        if all(getYears(chunk['Date']).isin(season_years).all() for chunk in date_chunks):
+            return 0
+
+    removed_rows = 0
+
+    with tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8', dir=os.path.dirname(os.path.abspath(file_path)),
+                                     prefix=".filter_", delete=False) as temporary_file:
+        try:
+            for i, chunk in enumerate(pd.read_csv(file_path, dtype=str, keep_default_na=False, chunksize=chunk_size)):
+                kept_rows = getYears(chunk['Date']).isin(season_years)
+                removed_rows += int((~kept_rows).sum())
+                chunk[kept_rows].to_csv(temporary_file, index=False, header=(i == 0))
+        except BaseException:
+            temporary_file.close()
+            os.remove(temporary_file.name)
+            raise
+
+    os.replace(temporary_file.name, file_path)
+
+    return removed_rows
+
+
+
 def removeOldSeasonsFromRawDatas(dictionary, path_data_raw=path_data_raw, current_season=current_season):
     """
     Remove old seasons from raw data files.
-    
+
+    Files are filtered in chunks (see filterSeasonRows), so the memory used doesn't depend on the number of seasons.
+
     Args:
+        dictionary (dict): The dictionary with the file names as keys and the championships as values.
+        path_data_raw (str): The path to the raw datas. Defaults to path_data_raw.
         current_season (str): The current season (e.g., 2122 = 2021-2022).
-        
+
     Returns:
-        None
+        dict: The number of removed rows for each filtered file.
     """
     files = list(dictionary.values())
 
@@ -105,25 +484,34 @@ def removeOldSeasonsFromRawDatas(dictionary, path_data_raw=path_data_raw, curren
     
     print(f"All these files will be checked: {files}", f"\n Season to keep: {current_season_years}")
 
-
+    removed_rows = {}
     for file in files:
         file_path = os.path.join(path_data_raw, file + ".csv")
         if os.path.exists(file_path):
-            # Read the CSV file
-            df = pd.read_csv(file_path)
+            removed_rows[file] = filterSeasonRows(file_path, current_season_years)
 
-            # Convert the 'Date' column to datetime
-            df['Date'] = pd.to_datetime(df['Date'])
+    return removed_rows
 
-            # Filter the data to keep only the rows from the current season
-            df = df[df['Date'].dt.year.isin(current_season_years)]
 
-            # Rewrite the CSV file with the filtered data
-            df.to_csv(file_path, index=False)
+
+def getMissingRawFiles(dictionary, path_data_raw=path_data_raw, championships=championships) -> list:
+    """
+    Gets the championships of the dictionary whose raw data file (written by sortDatasMatchHistory) is missing.
+
+    Parameters:
+    dictionary (dict): The dictionary with the file names as keys and the championships as values.
+    path_data_raw (str): The path to the raw datas. Defaults to path_data_raw.
+    championships (list): The championships extracted by sortDatasMatchHistory. Defaults to championships.
+
+    Returns:
+    list: The championships without raw data file.
+    """
+    return [championship for championship in dictionary.values()
+            if championship in championships and not os.path.exists(os.path.join(path_data_raw, championship + ".csv"))]
 
 
 
-def scrapMatchHistoryAndSortDatas(url, filename, dictionary, league="main"):
+def scrapMatchHistoryAndSortDatas(url, filename, dictionary, league="main", path_data_raw=path_data_raw):
     """
     Scrapes match history from a given URL and sorts the data.
 
@@ -132,16 +520,34 @@ def scrapMatchHistoryAndSortDatas(url, filename, dictionary, league="main"):
     filename (str): The name of the file to save the scraped data.
     dictionary (dict): A dictionary containing mappings for renaming files.
     league (str, optional): The league to scrape match history from. Defaults to "main".
+    path_data_raw (str, optional): The path to the raw datas. Defaults to path_data_raw.
 
     Returns:
-    dict: A dictionary with a success message.
+    dict: A dictionary with a success message and the leagues whose match history changed ("changed_leagues").
+        If the file didn't change since the previous download, its last sort completed and every raw data file is there,
+        the datas are not sorted again. If raw data files are missing or if the last sort didn't complete (partial or stale
+        raw data files), the datas are sorted again from the downloaded file.
 
     """
-    scrapMatchHistory(url, filename)
-    sortDatasMatchHistory(filename)
-    renameFilesMatchHistory(dictionary)
+    if not scrapMatchHistory(url, filename)["modified"]:
+        missing_leagues = getMissingRawFiles(dictionary, path_data_raw)
+        if not missing_leagues and isSortCompleted(filename):
+            return {"message" : "Match results history datas are up to date, nothing to do", "changed_leagues": []}
+        if missing_leagues:
+            print(f"Raw datas missing for {missing_leagues}, extracted again from {filename}")
+        else:
+            print(f"The last sort of {filename} didn't complete, datas sorted again")
+
+    # Sort completion recorded once every step succeeded
+    setSortCompleted(filename, False)
+
+    changed_leagues = sortDatasMatchHistory(filename, path_data_raw, dictionary=dictionary)
+    renameFilesMatchHistory(dictionary, path_data_raw)
 
     if league=='other':
-        removeOldSeasonsFromRawDatas(dictionary)
+        # Only the files written by sortDatasMatchHistory can contain old seasons
+        removeOldSeasonsFromRawDatas({file: league for file, league in dictionary.items() if league in changed_leagues}, path_data_raw)
+
+    setSortCompleted(filename, True)
 
-    return {"message" : "Match results history datas have been downloaded and sorted successfully"}
\ No newline at end of file
+    return {"message" : "Match results history datas have been downloaded and sorted successfully", "changed_leagues": changed_leagues}
@@ -0,0 +1,296 @@
+"""
+Stage cache - pre-processing stages results stored on disk
+
+Usage (hit & miss statistics):
+    python stage_cache.py --stats
+    python stage_cache.py --clear
+"""
+
+"""
+Libraries
+"""
+import pandas as pd
+import hashlib
+import inspect
+import pickle
+import json
+import time
+import os
+import argparse
+
+from common_variables import path_data_cache, stage_cache_max_size
+
+
+"""
+Variables
+"""
+# Hit & miss events of the cached stages (1 JSON line per stage call)
+stage_cache_stats_file = "stage_cache_stats.jsonl"
+    # Older events (the statistics file is rotated when it reaches stage_cache_stats_max_size)
+stage_cache_stats_rotated_file = "stage_cache_stats.1.jsonl"
+stage_cache_stats_max_size = 1024 * 1024
+
+# Cached results file extension
+stage_cache_extension = ".pkl"
+
+
+"""
+Functions
+"""
+def getStageVersion(*dependencies) -> str:
+    """
+    Get the version of a stage from the helper functions it calls and the settings it reads.
+
+    The source code of the stage itself is already part of the cache key (see hashStageInputs), so an edit of a stage
+    only invalidates the results of this stage and of the stages using its result, not the upstream stages.
+
+    Parameters:
+    *dependencies: The helper functions called by the stage (their source code is hashed) and the settings it reads.
+
+    Returns:
+    str: The hexadecimal hash identifying the stage version.
+    """
+    stage_hash = hashlib.sha256()
+    for dependency in dependencies:
+        stage_hash.update((inspect.getsource(dependency) if inspect.isfunction(dependency) else repr(dependency)).encode())
+
+    return stage_hash.hexdigest()
+
+
+
+def hashStageInputs(stage_function, inputs: tuple, params: dict, version: str) -> str:
+    """
+    Compute the cache key of a stage call.
+
+    The key is a hash of the stage name & source code, of the version given by the caller,
+    of the input frames (values, index, column names & types) and of the parameters.
+
+    Parameters:
+    stage_function (function): The stage function.
+    inputs (tuple): The input frames (or other values) given to the stage.
+    params (dict): The keyword parameters given to the stage.
+    version (str): The version of the helpers & settings used by the stage (see getStageVersion).
+
+    Returns:
+    str: The hexadecimal cache key.
+    """
+    stage_hash = hashlib.sha256()
+    stage_hash.update(stage_function.__name__.encode())
+    stage_hash.update(inspect.getsource(stage_function).encode())
+    stage_hash.update(str(version).encode())
+
+    for stage_input in inputs:
+        if isinstance(stage_input, pd.DataFrame):
+            stage_hash.update(repr([list(stage_input.columns), list(stage_input.index.names), [str(dtype) for dtype in stage_input.dtypes]]).encode())
+            stage_hash.update(pd.util.hash_pandas_object(stage_input, index=True).to_numpy().tobytes())
+        elif isinstance(stage_input, pd.Series):
+            stage_hash.update(repr([stage_input.name, list(stage_input.index.names), str(stage_input.dtype)]).encode())
+            stage_hash.update(pd.util.hash_pandas_object(stage_input, index=True).to_numpy().tobytes())
+        else:
+            stage_hash.update(repr(stage_input).encode())
+
+    stage_hash.update(repr(sorted(params.items())).encode())
+
+    return stage_hash.hexdigest()
+
+
+
+def logStageCacheEvent(stage_name: str, event: str, cache_dir=path_data_cache) -> None:
+    """
+    Record a hit or a miss of a cached stage.
+
+    Events are appended to a JSON lines file, so several pre-processing processes can record them at the same time.
+    When the file reaches stage_cache_stats_max_size, it replaces the previous rotated file: the statistics
+    keep the last events only and never use more than twice stage_cache_stats_max_size.
+
+    Parameters:
+    stage_name (str): The name of the stage.
+    event (str): "hit" or "miss".
+    cache_dir (str): The stage cache folder. Defaults to path_data_cache.
+
+    Returns:
+    None
+    """
+    stats_path = os.path.join(cache_dir, stage_cache_stats_file)
+    with open(stats_path, 'a') as f:
+        f.write(json.dumps({"stage": stage_name, "event": event, "time": time.time()}) + "\n")
+
+    # Rotation (the file can be rotated by another process at the same time)
+    try:
+        if os.path.getsize(stats_path) >= stage_cache_stats_max_size:
+            os.replace(stats_path, os.path.join(cache_dir, stage_cache_stats_rotated_file))
+    except FileNotFoundError:
+        pass
+
+
+
+def evictStageCache(cache_dir=path_data_cache, max_size=stage_cache_max_size) -> list:
+    """
+    Remove the least recently used cached results until the cache size is under max_size.
+
+    Parameters:
+    cache_dir (str): The stage cache folder. Defaults to path_data_cache.
+    max_size (int): The maximum size of the cache, in bytes. Defaults to stage_cache_max_size.
+
+    Returns:
+    list: The names of the removed files.
+    """
+    cached_files = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(stage_cache_extension):
+            # Championships pre-processed in parallel share the cache: a file can be removed by another process
+            try:
+                file_stat = os.stat(os.path.join(cache_dir, file_name))
+            except FileNotFoundError:
+                continue
+            cached_files.append((file_stat.st_mtime, file_stat.st_size, file_name))
+
+    cache_size = sum(file_size for _, file_size, _ in cached_files)
+    removed_files = []
+
+    # Least recently used first (the modification time is updated on each hit)
+    for _, file_size, file_name in sorted(cached_files):
+        if cache_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+        cache_size -= file_size
+        removed_files.append(file_name)
+
+    return removed_files
+
+
+
+def runCachedStage(stage_function, *inputs, params=None, version='', cache_dir=path_data_cache, max_size=stage_cache_max_size):
+    """
+    Run a pre-processing stage, or load its result from the stage cache if it has already run with the same inputs.
+
+    Stages must be pure functions: their result only depends on their inputs, their parameters and the code version.
+    If max_size is 0, the cache is disabled and the stage is always run.
+
+    Each stage is keyed on its own code (see getStageVersion): after an edit of a stage, the upstream stages are loaded
+    from the cache and only the edited stage and the stages using its result are computed again.
+
+    Parameters:
+    stage_function (function): The stage function, called as stage_function(*inputs, **params).
+    *inputs: The input frames (or other values) given to the stage.
+    params (dict, optional): The keyword parameters given to the stage. Defaults to None.
+    version (str): The version of the helpers & settings used by the stage (see getStageVersion). Defaults to ''.
+    cache_dir (str): The stage cache folder. Defaults to path_data_cache.
+    max_size (int): The maximum size of the cache, in bytes. Defaults to stage_cache_max_size.
+
+    Returns:
+    The result of the stage.
+    """
+    params = params or {}
+
+    if not max_size:
+        return stage_function(*inputs, **params)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stage_name = stage_function.__name__
+    cache_key = hashStageInputs(stage_function, inputs, params, version)
+    cache_file = os.path.join(cache_dir, f"{stage_name}_{cache_key}{stage_cache_extension}")
+
+    # Hit
+    try:
+        with open(cache_file, 'rb') as f:
+            result = pickle.load(f)
+        os.utime(cache_file) # Most recently used
+        logStageCacheEvent(stage_name, "hit", cache_dir)
+        return result
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+
+    # Miss
+    result = stage_function(*inputs, **params)
+    logStageCacheEvent(stage_name, "miss", cache_dir)
+
+    # Write to a temporary file first, other processes never read a partial file
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(temporary_file, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file, cache_file)
+
+    evictStageCache(cache_dir, max_size)
+
+    return result
+
+
+
+def getStageCacheStats(cache_dir=path_data_cache) -> dict:
+    """
+    Get the hit & miss statistics of the stage cache (last events, see logStageCacheEvent).
+
+    Parameters:
+    cache_dir (str): The stage cache folder. Defaults to path_data_cache.
+
+    Returns:
+    dict: {"stages": {stage: {"hits", "misses", "hit_ratio"}}, "entries": number of cached results, "size": cache size in bytes}
+    """
+    stages = {}
+
+    for stats_file in [stage_cache_stats_rotated_file, stage_cache_stats_file]:
+        stats_path = os.path.join(cache_dir, stats_file)
+        if not os.path.exists(stats_path):
+            continue
+
+        with open(stats_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                stage_stats = stages.setdefault(event["stage"], {"hits": 0, "misses": 0})
+                stage_stats["hits" if event["event"] == "hit" else "misses"] += 1
+
+    for stage_stats in stages.values():
+        stage_stats["hit_ratio"] = round(stage_stats["hits"] / (stage_stats["hits"] + stage_stats["misses"]), 3)
+
+    cached_files = [os.path.join(cache_dir, file_name) for file_name in os.listdir(cache_dir) if file_name.endswith(stage_cache_extension)] if os.path.isdir(cache_dir) else []
+
+    return {"stages": stages,
+            "entries": len(cached_files),
+            "size": sum(os.path.getsize(file_path) for file_path in cached_files)}
+
+
+
+def clearStageCache(cache_dir=path_data_cache) -> None:
+    """
+    Remove every cached result and the hit & miss statistics.
+
+    Parameters:
+    cache_dir (str): The stage cache folder. Defaults to path_data_cache.
+
+    Returns:
+    None
+    """
+    if not os.path.isdir(cache_dir):
+        return
+
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(stage_cache_extension) or file_name in [stage_cache_stats_file, stage_cache_stats_rotated_file]:
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-processing stage cache")
+    parser.add_argument("--stats", action="store_true", help="Show the hit & miss statistics of each stage")
+    parser.add_argument("--clear", action="store_true", help="Remove the cached results and the statistics")
+    parser.add_argument("--cache-dir", default=path_data_cache, help="Stage cache folder")
+    args = parser.parse_args()
+
+    if args.stats:
+        stats = getStageCacheStats(args.cache_dir)
+        for stage, stage_stats in stats["stages"].items():
+            print(f"{stage}: {stage_stats['hits']} hits, {stage_stats['misses']} misses (hit ratio {stage_stats['hit_ratio']})")
+        print(f"{stats['entries']} cached results, {stats['size'] / 1024 / 1024:.2f} MB")
+
+    if args.clear:
+        clearStageCache(args.cache_dir)
+        print("Stage cache cleared")
+
+    if not args.stats and not args.clear:
+        parser.print_help()
@@ -0,0 +1,350 @@
+"""
+Team ratings - Elo ratings of the teams, updated match after match
+"""
+
+"""
+Libraries
+"""
+import pandas as pd
+import numpy as np
+import json
+import os
+
+from common_variables import path_data_clean, elo_initial_rating, elo_k_factor, elo_home_advantage
+
+
+"""
+Variables
+"""
+# Files stored in the clean datas folder of each championship
+    # Current rating of each team & last match processed
+ratings_state_file = "team_ratings.json"
+    # Ratings of both teams before each match processed (append only)
+ratings_history_file = "team_ratings_history.csv"
+
+# Score of the home team for each result
+match_scores = {"H": 1.0, "D": 0.5, "A": 0.0}
+
+
+"""
+Rating Functions
+"""
+def expectedHomeScore(home_rating, away_rating, home_advantage=elo_home_advantage):
+    """
+    Compute the expected score of the home team (probability of winning, a draw counting for half).
+
+    Parameters:
+    home_rating (float or np.ndarray): The rating of the home team.
+    away_rating (float or np.ndarray): The rating of the away team.
+    home_advantage (float): The rating points added to the home team. Defaults to elo_home_advantage.
+
+    Returns:
+    float or np.ndarray: The expected score of the home team, between 0 and 1.
+    """
+    return 1 / (1 + 10 ** ((away_rating - home_rating - home_advantage) / 400))
+
+
+
+def updateRatings(ratings: dict, home_team: str, away_team: str, result: str,
+                  k_factor=elo_k_factor, home_advantage=elo_home_advantage, initial_rating=elo_initial_rating) -> tuple:
+    """
+    Update the ratings of two teams with the result of their match (constant time, ratings updated in place).
+
+    Parameters:
+    ratings (dict): The current rating of each team ({team name: rating}).
+    home_team (str): The name of the home team.
+    away_team (str): The name of the away team.
+    result (str): The full time result ("H", "D" or "A").
+    k_factor (float): The maximum number of rating points exchanged in a match. Defaults to elo_k_factor.
+    home_advantage (float): The rating points added to the home team. Defaults to elo_home_advantage.
+    initial_rating (float): The rating of a team without match. Defaults to elo_initial_rating.
+
+    Returns:
+    tuple: The ratings of the home team and of the away team before the match.
+    """
+    home_rating = ratings.get(home_team, initial_rating)
+    away_rating = ratings.get(away_team, initial_rating)
+
+    rating_change = k_factor * (match_scores[result] - expectedHomeScore(home_rating, away_rating, home_advantage))
+    ratings[home_team] = home_rating + rating_change
+    ratings[away_team] = away_rating - rating_change
+
+    return home_rating, away_rating
+
+
+
+def backfillRatings(match_results: pd.DataFrame, ratings=None,
+                    k_factor=elo_k_factor, home_advantage=elo_home_advantage, initial_rating=elo_initial_rating) -> tuple:
+    """
+    Compute the ratings over a list of matches, in date order.
+
+    Teams are integer-coded and the matches are grouped in levels (roughly the match days) where each team plays once,
+    the matches of a level are updated together with array operations. The ratings are the same as updating
+    the matches one by one with updateRatings.
+
+    Parameters:
+    match_results (pd.DataFrame): The matches ("Date", "HomeTeam", "AwayTeam", "FTR"), Date as datetime.
+    ratings (dict, optional): The ratings before the first match. Defaults to None (every team starts at initial_rating).
+    k_factor (float): The maximum number of rating points exchanged in a match. Defaults to elo_k_factor.
+    home_advantage (float): The rating points added to the home team. Defaults to elo_home_advantage.
+    initial_rating (float): The rating of a team without match. Defaults to elo_initial_rating.
+
+    Returns:
+    tuple: The ratings after the last match ({team name: rating}) and the matches sorted by date
+        with the ratings of both teams before each match ("Elo_HomeTeam", "Elo_AwayTeam").
+    """
+    ratings = dict(ratings or {})
+    matches = match_results[["Date", "HomeTeam", "AwayTeam", "FTR"]].dropna()
+    matches = matches[matches['FTR'].isin(match_scores)]
+    matches = matches.iloc[np.argsort(matches['Date'].to_numpy(), kind='stable')].reset_index(drop=True)
+
+    matches_count = len(matches)
+    team_codes, teams = pd.factorize(pd.concat([matches['HomeTeam'], matches['AwayTeam']]))
+    home_codes = team_codes[:matches_count]
+    away_codes = team_codes[matches_count:]
+    scores = matches['FTR'].map(match_scores).to_numpy(dtype='float64')
+
+    team_ratings = np.array([ratings.get(team, initial_rating) for team in teams], dtype='float64')
+    home_pre_ratings = np.empty(matches_count, dtype='float64')
+    away_pre_ratings = np.empty(matches_count, dtype='float64')
+
+    # Update level of each match : one level after the previous matches of both teams,
+    # so the matches of a same level have distinct teams and are updated together with array operations
+    team_levels = [0] * len(teams)
+    match_levels = np.empty(matches_count, dtype='int64')
+    for i, (home, away) in enumerate(zip(home_codes.tolist(), away_codes.tolist())):
+        level = max(team_levels[home], team_levels[away])
+        match_levels[i] = level
+        team_levels[home] = team_levels[away] = level + 1
+
+    level_order = np.argsort(match_levels, kind='stable')
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(match_levels[level_order])) + 1, [matches_count]))
+
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        level_matches = level_order[start:end]
+        home, away = home_codes[level_matches], away_codes[level_matches]
+
+        home_pre_ratings[level_matches] = team_ratings[home]
+        away_pre_ratings[level_matches] = team_ratings[away]
+        rating_changes = k_factor * (scores[level_matches] - expectedHomeScore(team_ratings[home], team_ratings[away], home_advantage))
+        team_ratings[home] += rating_changes
+        team_ratings[away] -= rating_changes
+
+    ratings.update(zip(teams, team_ratings.tolist()))
+    matches['Elo_HomeTeam'] = home_pre_ratings
+    matches['Elo_AwayTeam'] = away_pre_ratings
+
+    return ratings, matches
+
+
+
+"""
+Ratings storage Functions
+"""
+def getRatingsParameters() -> dict:
+    """
+    Get the rating parameters, stored with the ratings (ratings are computed again if they change).
+
+    Returns:
+    dict: The rating parameters.
+    """
+    return {"initial_rating": elo_initial_rating, "k_factor": elo_k_factor, "home_advantage": elo_home_advantage}
+
+
+
+def getMatchResultsByKey(match_results: pd.DataFrame) -> dict:
+    """
+    Get the result of each rated match (the matches with a result), by match key.
+
+    Stored with the ratings for the matches of the last match history file: a match added, removed or corrected
+    before the last processed match changes them.
+
+    Parameters:
+    match_results (pd.DataFrame): The matches ("Date", "HomeTeam", "AwayTeam", "FTR"), Date as datetime.
+
+    Returns:
+    dict: The result of each match ({"<date>|<home team>|<away team>": result}, date as YYYY-MM-DD).
+    """
+    matches = match_results[["Date", "HomeTeam", "AwayTeam", "FTR"]].dropna()
+    matches = matches[matches['FTR'].isin(match_scores)]
+    match_keys = matches['Date'].dt.strftime('%Y-%m-%d') + '|' + matches['HomeTeam'].astype(str) + '|' + matches['AwayTeam'].astype(str)
+
+    return dict(zip(match_keys, matches['FTR'].astype(str)))
+
+
+
+def loadRatingsState(championship: str, path_data_clean=path_data_clean) -> dict:
+    """
+    Load the ratings state of a championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    dict: The ratings state ("parameters", "ratings", "last_date", "last_date_matches", "matches"), or None if there is no state
+        or if it was computed with other rating parameters.
+    """
+    state_path = os.path.join(path_data_clean, championship, ratings_state_file)
+
+    if not os.path.exists(state_path):
+        return None
+
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+
+    if state.get("parameters") != getRatingsParameters():
+        return None
+
+    return state
+
+
+
+def updateTeamRatings(championship: str, match_results: pd.DataFrame, path_data_clean=path_data_clean) -> dict:
+    """
+    Update the ratings of a championship with the matches not processed yet, and save them.
+
+    Only the matches played after the last processed match are used, starting from the saved ratings,
+    so the cost depends on the number of new matches and not on the history length.
+    The ratings before each new match are appended to the ratings history file.
+    Without saved ratings (or if the rating parameters changed), the ratings are computed from all the matches.
+    The ratings are also computed from all the matches if the matches already processed changed (a match added,
+    removed or corrected before the last processed match, see getMatchResultsByKey). Only the period covered by
+    the match history file is checked: the matches of the previous seasons missing from the file (a new season
+    file) are kept in the saved ratings.
+
+    Parameters:
+    championship (str): The name of the championship.
+    match_results (pd.DataFrame): The matches ("Date", "HomeTeam", "AwayTeam", "FTR"), Date as datetime.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    dict: The current rating of each team ({team name: rating}).
+    """
+    os.makedirs(os.path.join(path_data_clean, championship), exist_ok=True)
+    state = loadRatingsState(championship, path_data_clean)
+    history_path = os.path.join(path_data_clean, championship, ratings_history_file)
+    match_results = match_results.assign(Date=pd.to_datetime(match_results['Date']))
+    match_dates = match_results['Date']
+
+    if state is not None:
+        # Matches after the last processed date, and matches of that date not processed yet
+        last_date = pd.Timestamp(state["last_date"])
+        match_keys = match_results['HomeTeam'].astype(str) + '|' + match_results['AwayTeam'].astype(str)
+        processed_matches = (match_dates < last_date) | ((match_dates == last_date) & match_keys.isin(state["last_date_matches"]))
+
+        # Processed matches saved with the ratings, within the period of the file (the older matches are not checked)
+        first_day = match_dates.min().strftime('%Y-%m-%d') if match_dates.notna().any() else None
+        saved_matches = {match_key: result for match_key, result in state.get("matches", {}).items()
+                         if first_day is not None and match_key[:10] >= first_day}
+
+        if getMatchResultsByKey(match_results[processed_matches]) != saved_matches:
+            print(f"{championship}: matches already rated changed, ratings computed from all the matches")
+            state = None
+        else:
+            new_matches = match_results[~processed_matches]
+            ratings = state["ratings"]
+
+    if state is None:
+        new_matches = match_results
+        ratings = {}
+        if os.path.exists(history_path):
+            os.remove(history_path)
+
+    if state is not None and new_matches.empty:
+        return ratings
+
+    ratings, rated_matches = backfillRatings(new_matches, ratings)
+
+    # Save the state
+    if not rated_matches.empty:
+        last_date = rated_matches['Date'].max()
+        last_date_matches = rated_matches[rated_matches['Date'] == last_date]
+        last_date_matches = (last_date_matches['HomeTeam'] + '|' + last_date_matches['AwayTeam']).tolist()
+        if state is not None and pd.Timestamp(state["last_date"]) == last_date:
+            last_date_matches = state["last_date_matches"] + last_date_matches
+    else:
+        last_date, last_date_matches = pd.Timestamp.min, []
+
+    state = {"parameters": getRatingsParameters(),
+             "ratings": ratings,
+             "last_date": last_date.isoformat(),
+             "last_date_matches": last_date_matches,
+             "matches": getMatchResultsByKey(match_results)}
+
+    with open(os.path.join(path_data_clean, championship, ratings_state_file), 'w') as f:
+        json.dump(state, f)
+
+    rated_matches.to_csv(history_path, mode='a', header=not os.path.exists(history_path), index=False, date_format='%d/%m/%Y')
+
+    return ratings
+
+
+
+def loadRatingsHistory(championship: str, path_data_clean=path_data_clean) -> pd.DataFrame:
+    """
+    Load the ratings of both teams before each processed match.
+
+    Parameters:
+    championship (str): The name of the championship.
+    path_data_clean (str): The path to the clean datas. Defaults to path_data_clean.
+
+    Returns:
+    pd.DataFrame: The processed matches ("Date", "HomeTeam", "AwayTeam", "FTR", "Elo_HomeTeam", "Elo_AwayTeam").
+    """
+    history = pd.read_csv(os.path.join(path_data_clean, championship, ratings_history_file))
+    history['Date'] = pd.to_datetime(history['Date'], format='%d/%m/%Y')
+
+    return history
+
+
+
+"""
+Features Functions
+"""
+def addRatingsToStats(stats_home_team: pd.DataFrame, stats_away_team: pd.DataFrame, ratings: dict) -> tuple:
+    """
+    Add the current rating of each team to the home team & away team statistics.
+
+    Parameters:
+    stats_home_team (pd.DataFrame): The statistics of the home teams.
+    stats_away_team (pd.DataFrame): The statistics of the away teams.
+    ratings (dict): The current rating of each team ({team name: rating}).
+
+    Returns:
+    tuple: The statistics with the "Elo_HomeTeam" and "Elo_AwayTeam" columns.
+    """
+    stats_home_team = stats_home_team.copy()
+    stats_away_team = stats_away_team.copy()
+
+    stats_home_team['Elo_HomeTeam'] = stats_home_team['HomeTeam'].map(ratings).fillna(elo_initial_rating).astype('float64')
+    stats_away_team['Elo_AwayTeam'] = stats_away_team['AwayTeam'].map(ratings).fillna(elo_initial_rating).astype('float64')
+
+    return stats_home_team, stats_away_team
+
+
+
+def addPreMatchRatings(final_stats_home_away: pd.DataFrame, ratings_history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the ratings of both teams before each match to the data for modelization (point-in-time features).
+
+    Parameters:
+    final_stats_home_away (pd.DataFrame): The data for modelization ("Date", "HomeTeam", "AwayTeam"...), Date as datetime.
+    ratings_history (pd.DataFrame): The ratings history (see loadRatingsHistory).
+
+    Returns:
+    pd.DataFrame: The data for modelization with the "Elo_HomeTeam" and "Elo_AwayTeam" columns
+        (placed after the form scores like in the teams statistics, matches without rating get the initial rating).
+    """
+    pre_match_ratings = ratings_history.drop_duplicates(subset=["Date", "HomeTeam", "AwayTeam"], keep='last')
+    pre_match_ratings = pre_match_ratings.set_index(["Date", "HomeTeam", "AwayTeam"])[["Elo_HomeTeam", "Elo_AwayTeam"]]
+
+    match_keys = pd.MultiIndex.from_frame(final_stats_home_away[["Date", "HomeTeam", "AwayTeam"]].astype({"HomeTeam": "object", "AwayTeam": "object"}))
+    match_ratings = pre_match_ratings.reindex(match_keys).fillna(elo_initial_rating)
+
+    final_stats_home_away = final_stats_home_away.copy()
+    for side in ['Home', 'Away']:
+        column_position = final_stats_home_away.columns.get_loc(f'FormScore_{side}Team') + 1
+        final_stats_home_away.insert(column_position, f'Elo_{side}Team', match_ratings[f'Elo_{side}Team'].to_numpy())
+
+    return final_stats_home_away
@@ -8,7 +8,12 @@ Libraries
 import pandas as pd
 import time
 import pickle
-from sklearn.model_selection import TimeSeriesSplit
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv
+from sklearn.model_selection import TimeSeriesSplit, GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV, ParameterSampler, cross_val_score
 from sklearn.metrics import accuracy_score, recall_score, f1_score
 from sklearn.metrics import confusion_matrix
 
@@ -19,7 +24,10 @@ import io
 import base64
 
 
-from common_variables import path_data_clean, grid
+from common_variables import path_data_clean, training_cpu_budget, training_league_jobs, final_fit_cache_size
+from common_variables import model as base_model, model_params, model_distributions, final_model_params
+from common_variables import search_strategy, search_n_iter, search_time_budget, search_cv_splits, search_random_state
+from clean_data_store import readCleanData
 
 """
 Train model functions
@@ -32,7 +40,7 @@ def loadDatasTrainModel(path_data_clean, championship:str):
         data (pandas.DataFrame): The loaded training data.
     """
     path_training_datas = path_data_clean + championship + "/"
-    data = pd.read_csv(path_training_datas + "match_data_for_modeling.csv")
+    data = readCleanData(path_training_datas + "match_data_for_modeling.csv")
     return data
 
 
@@ -61,18 +69,85 @@ def splitDatasTrainModel(data, test_size, random_state = 42):
 
 
 
-def trainModel(X_train, y_train, grid=grid):
+def searchParams(X_train, y_train, strategy=search_strategy, n_jobs=None, n_iter=search_n_iter, time_budget=search_time_budget) -> dict:
     """
-    Train the model using the given training data.
+    Search the best parameters of the model, with a time series cross-validation (TimeSeriesSplit, search_cv_splits splits).
+
+    Strategies (see common_variables):
+    - "grid": every combination of model_params (default).
+    - "halving": successive halving of model_params, every combination is validated on a sample of the rows,
+      the best third on 3 times more rows, etc. Faster, but the first rounds only score small samples of the
+      time series folds, the parameters selected can be worse than the grid ones (opt-in).
+    - "random": n_iter combinations sampled from model_distributions.
+    - "budget": combinations sampled from model_distributions until time_budget seconds are spent (at least 1 combination).
 
     Parameters:
     X_train (array-like): The input features for training.
     y_train (array-like): The target variable for training.
+    strategy (str, optional): The search strategy. Defaults to search_strategy.
+    n_jobs (int, optional): The number of parallel jobs of the search. Defaults to None (every core).
+    n_iter (int, optional): The number of combinations of the "random" strategy. Defaults to search_n_iter.
+    time_budget (float, optional): The search time of the "budget" strategy, in seconds. Defaults to search_time_budget.
+
+    Returns:
+    dict: The "strategy", "best_params", "best_score" (mean CV accuracy), "n_candidates" (distinct combinations evaluated),
+        "n_fits" (models fitted, halving fits the remaining combinations again at each round), "search_seconds".
+
+    Raises:
+    ValueError: If the strategy is unknown.
+    """
+    start_time = time.perf_counter()
+    n_jobs = -1 if n_jobs is None else n_jobs
+    cv = TimeSeriesSplit(n_splits=search_cv_splits)
+
+    if strategy == "budget":
+        best_params, best_score, n_candidates = None, None, 0
+        for params in ParameterSampler(model_distributions, n_iter=sys.maxsize, random_state=search_random_state):
+            score = cross_val_score(clone(base_model).set_params(**params), X_train, y_train, cv=cv, n_jobs=n_jobs).mean()
+            n_candidates += 1
+            if best_score is None or score > best_score:
+                best_params, best_score = params, score
+            if time.perf_counter() - start_time >= time_budget:
+                break
+        n_fits = n_candidates * search_cv_splits
+
+    else:
+        if strategy == "grid":
+            search = GridSearchCV(clone(base_model), model_params, cv=cv, n_jobs=n_jobs, refit=False)
+        elif strategy == "halving":
+            search = HalvingGridSearchCV(clone(base_model), model_params, cv=cv, factor=3, n_jobs=n_jobs, refit=False,
+                                         random_state=search_random_state)
+        elif strategy == "random":
+            search = RandomizedSearchCV(clone(base_model), model_distributions, n_iter=n_iter, cv=cv, n_jobs=n_jobs, refit=False,
+                                        random_state=search_random_state)
+        else:
+            raise ValueError(f"Unknown search strategy: {strategy} (grid, halving, random or budget)")
+
+        search.fit(X_train, y_train)
+        best_params, best_score = search.best_params_, search.best_score_
+
+        # Halving: 1 row of cv_results_ per combination & round, every combination is evaluated at the first round
+        n_candidates = int(search.n_candidates_[0]) if strategy == "halving" else len(search.cv_results_["params"])
+        n_fits = len(search.cv_results_["params"]) * search_cv_splits
+
+    return {"strategy": strategy,
+            "best_params": best_params,
+            "best_score": float(best_score),
+            "n_candidates": n_candidates,
+            "n_fits": n_fits,
+            "search_seconds": time.perf_counter() - start_time}
+
+
+
+def trainModel(X_train, y_train, strategy=search_strategy, n_jobs=None):
+    """
     Train the model using the given training data.
 
     Parameters:
     X_train (array-like): The input features for training.
     y_train (array-like): The target variable for training.
+    strategy (str, optional): The parameters search strategy (see searchParams). Defaults to search_strategy.
+    n_jobs (int, optional): The number of parallel jobs of the search. Defaults to None (every core).
 
     Returns:
     model: The trained model.
@@ -81,10 +156,9 @@ def trainModel(X_train, y_train, grid=grid):
     """
     start_time = time.time()
 
-    # Train the model
-    grid.fit(X_train, y_train)
-    best_params = grid.best_params_
-    model = grid.best_estimator_
+    # Search the parameters & train the model
+    best_params = searchParams(X_train, y_train, strategy, n_jobs)["best_params"]
+    model = clone(base_model).set_params(**best_params).fit(X_train, y_train)
 
     end_time = time.time()
     training_time = end_time - start_time
@@ -93,6 +167,30 @@ def trainModel(X_train, y_train, grid=grid):
     return model, best_params, training_time
 
 
+def refitModel(model, features, target, cache_size=final_fit_cache_size):
+    """
+    Retrain the best model with all the data (a copy of the model, with the same parameters & final_model_params, is trained).
+
+    The final fit uses a larger kernel cache than the parameters search (the kernel rows of the whole dataset are kept
+    in memory instead of being computed again during the optimization), models without kernel cache are unchanged.
+
+    Parameters:
+    model: The best model of the parameters search.
+    features (array-like): All the input features.
+    target (array-like): All the target variable values.
+    cache_size (int, optional): The kernel cache of the final fit, in MB. Defaults to final_fit_cache_size.
+
+    Returns:
+    model: The model retrained with all the data.
+    """
+    final_model = clone(model)
+    final_model.set_params(**{key: value for key, value in final_model_params.items() if key in final_model.get_params()})
+    if "cache_size" in final_model.get_params():
+        final_model.set_params(cache_size=max(cache_size, final_model.get_params()["cache_size"]))
+
+    return final_model.fit(features, target)
+
+
 """
 Evaluate model functions
 """
@@ -156,13 +254,14 @@ def saveModel(model, model_to_save_path):
 """
 Meta function
 """
-def trainAndEvaluateModel(championship, test_size=0.2):
+def trainAndEvaluateModel(championship, test_size=0.2, n_jobs=None):
     """
     Trains and evaluates a machine learning model.
 
     Parameters:
     - championship (str): The name of the championship.
     - test_size (float): The proportion of the dataset to include in the test split.
+    - n_jobs (int, optional): The number of parallel jobs of the parameters search. Defaults to None (every core).
 
     Returns:
     If test_size > 0:
@@ -182,7 +281,7 @@ def trainAndEvaluateModel(championship, test_size=0.2):
     if test_size > 0:
         X_train, X_test, y_train, y_test = splitDatasTrainModel(data, test_size)
         # Train the model
-        model, best_params, _ = trainModel(X_train, y_train)
+        model, best_params, _ = trainModel(X_train, y_train, n_jobs=n_jobs)
         # Evaluate the model
         metrics, conf_matrix_img = evaluateModel(model, X_test, y_test)
         
@@ -190,4 +289,188 @@ def trainAndEvaluateModel(championship, test_size=0.2):
 
     else:
         features, target = splitDatasTrainModel(data, test_size)
-        return features, target
\ No newline at end of file
+        return features, target
+
+
+
+def trainEvaluateAndRefitModel(championship, test_size=0.2, n_jobs=None, cache_size=final_fit_cache_size, strategy=search_strategy) -> dict:
+    """
+    Train, evaluate & retrain with all the data the model of a championship (the training data is loaded once).
+
+    Parameters:
+    championship (str): The name of the championship.
+    test_size (float): The proportion of the dataset used to evaluate the model. Defaults to 0.2.
+    n_jobs (int, optional): The number of parallel jobs of the parameters search. Defaults to None (every core).
+    cache_size (int, optional): The kernel cache of the final fit, in MB (see refitModel). Defaults to final_fit_cache_size.
+    strategy (str, optional): The parameters search strategy (see searchParams). Defaults to search_strategy.
+
+    Returns:
+    dict: The "model" (retrained with all the data), "best_params", holdout "metrics", "conf_matrix_img", "X_test",
+          the "search" report (see searchParams), the "timings" of the training (seconds) & the search "n_jobs".
+    """
+    start_time = time.perf_counter()
+
+    # Load & split the training data
+    data = loadDatasTrainModel(path_data_clean, championship)
+    X_train, X_test, y_train, y_test = splitDatasTrainModel(data, test_size)
+    load_time = time.perf_counter() - start_time
+
+    # Search the parameters, train & evaluate the model
+    search = searchParams(X_train, y_train, strategy, n_jobs)
+    model = clone(base_model).set_params(**search["best_params"]).fit(X_train, y_train)
+    metrics, conf_matrix_img = evaluateModel(model, X_test, y_test)
+    evaluate_time = time.perf_counter() - start_time - load_time - search["search_seconds"]
+
+    # Retrain the best model with all the data
+    features, target = splitDatasTrainModel(data, 0)
+    final_model = refitModel(model, features, target, cache_size)
+    total_time = time.perf_counter() - start_time
+
+    return {"model": final_model,
+            "best_params": search["best_params"],
+            "metrics": metrics,
+            "conf_matrix_img": conf_matrix_img,
+            "X_test": X_test,
+            "search": {key: value for key, value in search.items() if key != "best_params"},
+            "timings": {"load_seconds": load_time,
+                        "search_seconds": search["search_seconds"],
+                        "evaluate_seconds": evaluate_time,
+                        "refit_seconds": total_time - load_time - search["search_seconds"] - evaluate_time,
+                        "total_seconds": total_time},
+            "n_jobs": n_jobs}
+
+
+
+"""
+Training scheduler
+"""
+def splitCpuBudget(n_championships: int, cpu_budget=training_cpu_budget, league_jobs=training_league_jobs) -> tuple:
+    """
+    Split the CPU budget between the championships trained in parallel and the parameters search of each championship.
+
+    The cores are given to the championships first (1 process each, the parameters search of a small dataset doesn't use
+    many cores efficiently), the remaining cores are shared by the parameters searches. The number of busy cores never
+    exceeds the budget: with more championships than cores, each parameters search runs on 1 core.
+
+    Parameters:
+    n_championships (int): The number of championships to train.
+    cpu_budget (int): The number of cores used by the training. Defaults to training_cpu_budget.
+    league_jobs (int): The number of championships trained in parallel (0 = as many as the budget allows). Defaults to training_league_jobs.
+
+    Returns:
+    tuple: The number of championships trained in parallel, the number of jobs of each parameters search.
+    """
+    cpu_budget = max(1, cpu_budget)
+    league_jobs = league_jobs if league_jobs > 0 else cpu_budget
+    league_jobs = max(1, min(league_jobs, n_championships, cpu_budget))
+
+    return league_jobs, max(1, cpu_budget // league_jobs)
+
+
+
+def trainChampionships(championships: list, onChampionshipTrained=None, cpu_budget=training_cpu_budget, league_jobs=training_league_jobs) -> dict:
+    """
+    Train the models of several championships, in parallel within a CPU budget (see splitCpuBudget).
+
+    Each championship is trained in its own process. onChampionshipTrained(championship, result) is called
+    in the main process as soon as a championship is trained (e.g. to store the model while the others train).
+    A failing championship doesn't stop the others, the failures are raised once all championships are done.
+
+    Parameters:
+    championships (list): The names of the championships.
+    onChampionshipTrained (callable, optional): Called with each trained championship & its result (see trainEvaluateAndRefitModel). Defaults to None.
+    cpu_budget (int): The number of cores used by the training. Defaults to training_cpu_budget.
+    league_jobs (int): The number of championships trained in parallel (0 = as many as the budget allows). Defaults to training_league_jobs.
+
+    Returns:
+    dict: The "results" of each championship (see trainEvaluateAndRefitModel), the wall-clock time in "seconds", "league_jobs" & "grid_jobs" (see splitCpuBudget).
+
+    Raises:
+    Exception: If at least one championship failed.
+    """
+    start_time = time.perf_counter()
+    league_jobs, grid_jobs = splitCpuBudget(len(championships), cpu_budget, league_jobs)
+    print(f"Training {len(championships)} championships: {league_jobs} in parallel, {grid_jobs} search jobs each")
+
+    results = {}
+    failures = {}
+
+    def onChampionshipDone(championship, result=None, error=None):
+        if error is not None:
+            failures[championship] = repr(error)
+            print(f"{championship}: failed: {error!r}")
+            return
+        results[championship] = result
+        print(f"{championship}: trained in {result['timings']['total_seconds']:.1f} s")
+        if onChampionshipTrained is not None:
+            onChampionshipTrained(championship, result)
+
+    if league_jobs > 1:
+        with ProcessPoolExecutor(max_workers=league_jobs) as executor:
+            futures = {executor.submit(trainEvaluateAndRefitModel, championship, n_jobs=grid_jobs): championship for championship in championships}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    onChampionshipDone(futures[future], error=future.exception())
+                else:
+                    onChampionshipDone(futures[future], result=future.result())
+    else:
+        for championship in championships:
+            try:
+                result = trainEvaluateAndRefitModel(championship, n_jobs=grid_jobs)
+            except Exception as e:
+                onChampionshipDone(championship, error=e)
+                continue
+            onChampionshipDone(championship, result=result)
+
+    if failures:
+        raise Exception(f"Training failed for: {failures}")
+
+    return {"results": results, "seconds": time.perf_counter() - start_time, "league_jobs": league_jobs, "grid_jobs": grid_jobs}
+
+
+
+"""
+Search strategies report
+"""
+def compareSearchStrategies(championship, strategies=("grid", "halving", "random", "budget"), test_size=0.2, n_jobs=None, time_budget=search_time_budget) -> pd.DataFrame:
+    """
+    Compare the cost & the score of the parameters search strategies on a championship.
+
+    Parameters:
+    championship (str): The name of the championship.
+    strategies (tuple, optional): The strategies to compare (see searchParams). Defaults to every strategy.
+    test_size (float): The proportion of the dataset used to evaluate the model. Defaults to 0.2.
+    n_jobs (int, optional): The number of parallel jobs of the searches. Defaults to None (every core).
+    time_budget (float, optional): The search time of the "budget" strategy, in seconds. Defaults to search_time_budget.
+
+    Returns:
+    pd.DataFrame: 1 row per strategy: candidates & fits evaluated, search time, CV score, holdout accuracy & best parameters.
+    """
+    data = loadDatasTrainModel(path_data_clean, championship)
+    X_train, X_test, y_train, y_test = splitDatasTrainModel(data, test_size)
+
+    report = []
+    for strategy in strategies:
+        search = searchParams(X_train, y_train, strategy, n_jobs, time_budget=time_budget)
+        model = clone(base_model).set_params(**search["best_params"]).fit(X_train, y_train)
+        report.append({"strategy": strategy,
+                       "candidates": search["n_candidates"],
+                       "fits": search["n_fits"],
+                       "search_seconds": round(search["search_seconds"], 2),
+                       "cv_score": round(search["best_score"], 4),
+                       "holdout_accuracy": round(accuracy_score(y_test, model.predict(X_test)), 4),
+                       "best_params": search["best_params"]})
+
+    return pd.DataFrame(report)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the cost & the score of the parameters search strategies")
+    parser.add_argument("championship", help="Championship name (clean datas folder)")
+    parser.add_argument("--strategies", default="grid,halving,random,budget", help="Comma separated strategies")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of parallel jobs of the searches (default: every core)")
+    parser.add_argument("--time-budget", type=float, default=search_time_budget, help="Search time of the budget strategy, in seconds")
+    args = parser.parse_args()
+
+    print(compareSearchStrategies(args.championship, args.strategies.split(","), n_jobs=args.jobs, time_budget=args.time_budget).to_string(index=False))
@@ -31,29 +31,191 @@ def test_initializeWebDriver():
             driver.quit()
 
 
-def test_ConvertOdds():
-    assert ConvertOdds("3/1") == 3.0
-    assert ConvertOdds("2/1") == 2.0
-    assert ConvertOdds("not a fraction") == "not a fraction"
+def test_parseOddsTexts():
+    odds = parseOddsTexts(pd.Series(["3/1", "2/1", "6/5", "2.75", "-", None, "not a fraction", "1/0"]))
+    assert odds.dtype == np.float64
+    assert odds[:6].tolist() == [3.0, 2.0, 1.2, 2.75, 0.0, 0.0]
+    assert odds[6:].isna().all()
 
 
-def test_convertDate():
-    # Test with "Today, 05 Jan"
+def test_parseMatchDates():
+    # Test with "Today, 05 Jan" & "Tomorrow, 08 Mar"
     today = datetime.now()
-    date_str = f"Today, {today.strftime('%d %b')}"
-    expected = today.strftime('%d/%m/%Y')
-    assert convertDate(date_str) == expected
-
-    # Test with "Tomorrow, 08 Mar"
     tomorrow = today + timedelta(days=1)
-    date_str = f"Tomorrow, {tomorrow.strftime('%d %b')}"
-    expected = tomorrow.strftime('%d/%m/%Y')
-    assert convertDate(date_str) == expected
+    dates = parseMatchDates(pd.Series([f"Today, {today.strftime('%d %b')}", f"Tomorrow, {tomorrow.strftime('%d %b')}"]))
+    assert dates.dt.strftime('%d/%m/%Y').tolist() == [today.strftime('%d/%m/%Y'), tomorrow.strftime('%d/%m/%Y')]
+
+    # Test with "25 Apr 2024", "27/04/2024" & an unknown format
+    dates = parseMatchDates(pd.Series(["25 Apr 2024", "27/04/2024", "25 Apr 2024", "next week"]))
+    assert dates[:3].dt.strftime('%d/%m/%Y').tolist() == ["25/04/2024", "27/04/2024", "25/04/2024"]
+    assert pd.isna(dates[3])
+
+    # Year boundary
+    dates = parseMatchDates(pd.Series(["Today, 31 Dec", "Tomorrow, 01 Jan"]), today=datetime(2024, 12, 31, 22, 0))
+    assert dates.tolist() == [pd.Timestamp("2024-12-31"), pd.Timestamp("2025-01-01")]
+
+
+def test_normalizeOdds():
+    raw_odds = pd.DataFrame([["25 Apr 2024", "Nottingham", "Manchester City", "6/5", "12/5", "2.1"],
+                             ["25 Apr 2024", "Arsenal", "Chelsea", "abc", "2.4", "2.1"]], columns=raw_match_columns)
+
+    normalized_odds = normalizeOdds(raw_odds)
+    assert normalized_odds.columns.tolist() == odds_columns + ["ParseError"]
+    assert normalized_odds[["HomeTeam", "AwayTeam", "Avg_H", "Avg_D", "Avg_A"]].iloc[0].tolist() == ["Nott'm Forest", "Man City", 1.2, 2.4, 2.1]
+    assert normalized_odds["ParseError"].tolist() == [False, True]
+
+
+def test_saveChampionshipOdds(monkeypatch, tmp_path):
+    monkeypatch.setattr('scrap_bookmakers_odds.path_data_source', str(tmp_path))
+    monkeypatch.setattr('scrap_bookmakers_odds.path_data_raw', str(tmp_path / "raw"))
+    os.makedirs(tmp_path / "raw")
+    stored_odds = []
+    monkeypatch.setattr('scrap_bookmakers_odds.appendOddsSnapshot', lambda championship, odds: stored_odds.append(odds))
+
+    saveChampionshipOdds("League1", [
+        {"Date": "25 Apr 2024", "Home Team": "Nottingham", "Away Team": "Chelsea", "Odds 1": "6/5", "Odds X": "2.4", "Odds 2": "-"},
+        {"Date": "never", "Home Team": "Arsenal", "Away Team": "Chelsea", "Odds 1": "2", "Odds X": "2", "Odds 2": "2"}])
+
+    # Matches which could not be parsed are not saved
+    assert (tmp_path / "League1_odds.csv").read_text() == "Date,HomeTeam,AwayTeam,Avg_H,Avg_D,Avg_A\n25/04/2024,Nott'm Forest,Chelsea,1.2,2.4,0.0\n"
+    assert (tmp_path / "raw" / "League1_odds.csv").exists()
+    assert len(stored_odds[0]) == 1
+
+
+def test_extractMatchesFromPageSource():
+    # Saved championship page
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'odds_page.html'), encoding='utf-8') as f:
+        page_source = f.read()
+
+    all_match_details = extractMatchesFromPageSource(page_source)
+
+    assert all_match_details == [
+        {"Date": "25 Apr 2024", "Home Team": "Arsenal", "Away Team": "Chelsea", "Odds 1": "6/5", "Odds X": "12/5", "Odds 2": "21/10"},
+        {"Date": "25 Apr 2024", "Home Team": "Manchester City", "Away Team": "Nottingham", "Odds 1": "1/5", "Odds X": "6/1", "Odds 2": "12/1"},
+        {"Date": "27/04/2024", "Home Team": "Everton", "Away Team": "Brentford", "Odds 1": None, "Odds X": None, "Odds 2": None}]
+
+    # Normalized odds
+    normalized_odds = normalizeOdds(pd.DataFrame(all_match_details, columns=raw_match_columns))
+    assert normalized_odds.assign(Date=normalized_odds["Date"].dt.strftime('%d/%m/%Y')).values.tolist() == [
+        ["25/04/2024", "Arsenal", "Chelsea", 1.2, 2.4, 2.1, False],
+        ["25/04/2024", "Man City", "Nott'm Forest", 0.2, 6.0, 12.0, False],
+        ["27/04/2024", "Everton", "Brentford", 0.0, 0.0, 0.0, False]]
+
+    # Same match details as the WebDriver extraction (WebElements mocked with the parsed page elements)
+    class MockWebElement:
+        def __init__(self, element):
+            self.element = element
+            self.text = getElementText(element)
+
+        def find_element(self, by, selector):
+            element = self.element.select_one(selector)
+            if element is None:
+                raise Exception("Element not found")
+            return MockWebElement(element)
+
+        def find_elements(self, by, selector):
+            return [MockWebElement(element) for element in self.element.select(selector)]
+
+    last_date = None
+    for match, match_details in zip(BeautifulSoup(page_source, "lxml").select(CSS_SELECTOR_MATCHES), all_match_details):
+        assert extract_match_info(MockWebElement(match), last_date) == match_details
+        last_date = match_details["Date"]
+
+
+def test_WebDriverSession(monkeypatch):
+    # Mock the browser : the first one crashes on its second page
+    started_drivers = []
+    def mock_initializeWebDriver(league_url):
+        driver = Mock()
+        driver.get_cookies.return_value = [{'name': 'consent', 'value': 'yes'}]
+        if not started_drivers:
+            driver.get.side_effect = WebDriverException("Browser crashed")
+        started_drivers.append(driver)
+        return driver
+
+    accepted_cookies = []
+    monkeypatch.setattr('scrap_bookmakers_odds.initializeWebDriver', mock_initializeWebDriver)
+    monkeypatch.setattr('scrap_bookmakers_odds.acceptCookies', lambda driver: accepted_cookies.append(driver))
+
+    with WebDriverSession(max_restarts=1) as session:
+        first_driver = session.open("https://league1/")
+        second_driver = session.open("https://league2/")
+
+    # Cookies accepted once, restored in the restarted browser
+    assert len(started_drivers) == 2
+    assert accepted_cookies == [first_driver]
+    second_driver.add_cookie.assert_called_once_with({'name': 'consent', 'value': 'yes'})
+    assert session.restarts == 1
+
+    # Browsers quit
+    first_driver.quit.assert_called_once()
+    second_driver.quit.assert_called_once()
+    assert session.driver is None
+
+
+def test_scrapOdds(monkeypatch):
+    import time
+    test_championships = ['League1', 'League2', 'League3']
+    monkeypatch.setattr('scrap_bookmakers_odds.championships', test_championships)
+    monkeypatch.setattr('scrap_bookmakers_odds.championship_url_dict', {championship: championship + '/' for championship in test_championships})
+    def mock_initializeWebDriver(league_url):
+        driver = Mock(current_url=league_url)
+        driver.get.side_effect = lambda url: setattr(driver, 'current_url', url)
+        driver.get_cookies.return_value = []
+        return driver
+
+    monkeypatch.setattr('scrap_bookmakers_odds.initializeWebDriver', mock_initializeWebDriver)
+    monkeypatch.setattr('scrap_bookmakers_odds.acceptCookies', lambda driver: None)
+    # League1 : first attempt too long (the watchdog quits the browser), League3 : always fails
+    monkeypatch.setattr('scrap_bookmakers_odds.scraping_league_policies', {'League1': {'timeout': 0.1, 'retries': 1}, 'League3': {'retries': 0}})
+
+    attempts = []
+    def mock_scrapChampionshipOdds(driver):
+        attempts.append(driver.current_url)
+        if driver.current_url.endswith('League1/') and attempts.count(driver.current_url) == 1:
+            time.sleep(0.3)
+            if driver.quit.called:
+                raise WebDriverException("Browser quit")
+        if driver.current_url.endswith('League3/'):
+            raise ValueError("Page changed")
+        return [driver.current_url]
+
+    saved_odds = {}
+    monkeypatch.setattr('scrap_bookmakers_odds.scrapChampionshipOdds', mock_scrapChampionshipOdds)
+    monkeypatch.setattr('scrap_bookmakers_odds.saveChampionshipOdds', lambda championship, match_details: saved_odds.update({championship: match_details}))
+
+    with pytest.raises(Exception) as e:
+        scrapOdds(n_workers=2)
+
+    assert "League3" in str(e.value)
+    assert sorted(saved_odds) == ['League1', 'League2']
+    assert attempts.count(odds_base_url + 'League1/') == 2
+
+
+def test_scrapOdds_replay(monkeypatch, tmp_path):
+    test_championships = ['English Premier League', 'France Ligue 1']
+    monkeypatch.setattr('scrap_bookmakers_odds.championships', test_championships)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'odds_page.html'), encoding='utf-8') as f:
+        page_source = f.read()
+
+    # Pages recorded like the site tree
+    for championship in test_championships:
+        recordPage(odds_base_url + championship_url_dict[championship], page_source, str(tmp_path))
+    assert os.path.exists(tmp_path / 'france' / 'ligue-1' / 'index.html')
+
+    saved_odds = {}
+    monkeypatch.setattr('scrap_bookmakers_odds.saveChampionshipOdds', lambda championship, match_details: saved_odds.update({championship: match_details}))
 
-    # Test with "25 Apr 2024"
-    date_str = "25 Apr 2024"
-    expected = "25/04/2024"
-    assert convertDate(date_str) == expected
+    assert scrapOdds(n_workers=1, replay_source=str(tmp_path)) == {championship: "success" for championship in test_championships}
+    assert saved_odds == {championship: extractMatchesFromPageSource(page_source) for championship in test_championships}
+
+    # Same matches through the WebDriver extraction
+    results = benchmarkScraping(str(tmp_path), test_championships, extraction_mode="webdriver", repeat=1)
+    assert [result["matches"] for result in results.values()] == [3, 3]
+
+    # Page not recorded
+    with pytest.raises(WebDriverException):
+        ReplaySession(str(tmp_path)).open(odds_base_url + 'italy/serie-a/')
 
 """
 Scrap match history - test
@@ -67,7 +229,7 @@ def test_scrapMatchHistory():
 
     # URL is correct
     result_good_url = scrapMatchHistory(good_url, filename)
-    assert result_good_url == {"message" : "File downloaded and saved successfully"}
+    assert result_good_url["message"] in ["File downloaded and saved successfully", "File not modified since the last download"]
 
     # URL is incorrect
     with pytest.raises(Exception) as e:
@@ -75,10 +237,278 @@ def test_scrapMatchHistory():
     assert "Failed to resolve 'www.thisurldoesntexist.com'" in str(e.value)
 
 
+def test_scrapMatchHistory_conditional(tmp_path):
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    # Local HTTP stand-in : serves a file with an ETag, answers 304 if the ETag didn't change
+    served_file = {"content": b"season datas v1" * 1000, "etag": '"v1"'}
+    requests_received = []
+
+    class FileHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_received.append((self.path, self.headers.get("If-None-Match")))
+            if self.headers.get("If-None-Match") == served_file["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", served_file["etag"])
+            self.send_header("Last-Modified", "Mon, 01 Apr 2024 10:00:00 GMT")
+            self.send_header("Content-Length", str(len(served_file["content"])))
+            self.end_headers()
+            self.wfile.write(served_file["content"])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/mmz4281/2324/data.zip"
+    filename = str(tmp_path / "data.zip")
+
+    try:
+        # First download
+        assert scrapMatchHistory(url, filename) == {"message": "File downloaded and saved successfully", "modified": True}
+        assert open(filename, 'rb').read() == served_file["content"]
+
+        # Not modified : file kept
+        assert scrapMatchHistory(url, filename)["modified"] is False
+        assert open(filename, 'rb').read() == served_file["content"]
+
+        # New version
+        served_file.update({"content": b"season datas v2", "etag": '"v2"'})
+        assert scrapMatchHistory(url, filename)["modified"] is True
+        assert open(filename, 'rb').read() == b"season datas v2"
+    finally:
+        server.shutdown()
+
+    # Requests without query string, validators sent after the first download, no temporary file left
+    assert requests_received == [("/mmz4281/2324/data.zip", None), ("/mmz4281/2324/data.zip", '"v1"'), ("/mmz4281/2324/data.zip", '"v1"')]
+    assert sorted(os.listdir(tmp_path)) == [".data.zip.validators.json", "data.zip"]
+
+
+def test_extractChangedMembers(tmp_path):
+    import zipfile
+    dictionary = {'E0': 'English Premier League', 'F1': 'France Ligue 1', 'D1': 'German Bundesliga'}
+    test_championships = ['English Premier League', 'France Ligue 1']
+    filename = str(tmp_path / "data.zip")
+    path_raw = tmp_path / "raw"
+    os.makedirs(path_raw)
+
+    def createZip(members):
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for member, content in members.items():
+                zip_ref.writestr(member, content)
+
+    # First extraction : only the configured championships, named after them
+    createZip({'E0.csv': 'Date,HomeTeam\n01/01/2024,Arsenal\n', 'F1.csv': 'Date,HomeTeam\n01/01/2024,Lyon\n', 'D1.csv': 'Date,HomeTeam\n'})
+    assert extractChangedMembers(filename, dictionary, str(path_raw) + '/', test_championships) == test_championships
+    assert sorted(os.listdir(path_raw)) == ['English Premier League.csv', 'France Ligue 1.csv']
+
+    # Same datas : nothing extracted
+    assert extractChangedMembers(filename, dictionary, str(path_raw) + '/', test_championships) == []
+
+    # A new match in Ligue 1 only
+    createZip({'E0.csv': 'Date,HomeTeam\n01/01/2024,Arsenal\n', 'F1.csv': 'Date,HomeTeam\n01/01/2024,Lyon\n08/01/2024,Lens\n', 'D1.csv': 'Date,HomeTeam\n'})
+    assert extractChangedMembers(filename, dictionary, str(path_raw) + '/', test_championships) == ['France Ligue 1']
+    assert open(path_raw / 'France Ligue 1.csv').read().endswith('08/01/2024,Lens\n')
+
+
+def test_scrapMatchHistoryAndSortDatas_missingRawFiles(monkeypatch, tmp_path):
+    import zipfile
+    import scrap_match_history
+    dictionary = {'E0': 'English Premier League', 'F1': 'France Ligue 1'}
+    filename = str(tmp_path / "data.zip")
+    path_raw = str(tmp_path / "raw") + '/'
+    os.makedirs(path_raw)
+    with zipfile.ZipFile(filename, 'w') as zip_ref:
+        zip_ref.writestr('E0.csv', 'Date,HomeTeam\n01/01/2024,Arsenal\n')
+        zip_ref.writestr('F1.csv', 'Date,HomeTeam\n01/01/2024,Lyon\n')
+
+    # The server answers 304 (file not modified since the last download)
+    monkeypatch.setattr(scrap_match_history, "scrapMatchHistory", lambda url, filename: {"message": "", "modified": False})
+
+    # Raw datas missing : extracted again from the downloaded file
+    assert getMissingRawFiles(dictionary, path_raw, ['English Premier League', 'France Ligue 1']) == ['English Premier League', 'France Ligue 1']
+    result = scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)
+    assert result["changed_leagues"] == ['English Premier League', 'France Ligue 1']
+    assert sorted(os.listdir(path_raw)) == ['English Premier League.csv', 'France Ligue 1.csv']
+
+    # Every raw data file there : nothing to do
+    result = scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)
+    assert result["changed_leagues"] == [] and "up to date" in result["message"]
+
+    # 1 raw data file removed : only this one is extracted again
+    os.remove(path_raw + 'France Ligue 1.csv')
+    assert scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)["changed_leagues"] == ['France Ligue 1']
+
+    # New download whose sort is interrupted (stale raw data file) : sorted again on the next run, although the file is not modified
+    with open(path_raw + 'English Premier League.csv', 'w') as f:
+        f.write('Date,HomeTeam\n')
+    with monkeypatch.context() as m:
+        m.setattr(scrap_match_history, "scrapMatchHistory", lambda url, filename: {"message": "", "modified": True})
+        m.setattr(scrap_match_history, "sortDatasMatchHistory", Mock(side_effect=OSError("disk full")))
+        with pytest.raises(OSError):
+            scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)
+    assert not isSortCompleted(filename)
+
+    result = scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)
+    assert result["changed_leagues"] == ['English Premier League']
+    assert isSortCompleted(filename)
+    assert "up to date" in scrap_match_history.scrapMatchHistoryAndSortDatas("url", filename, dictionary, path_data_raw=path_raw)["message"]
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_convertWorkbookToCsv(tmp_path, n_workers):
+    from openpyxl import Workbook
+    dictionary = {'ARG': 'Argentina', 'BRA': 'Brazil', 'JPN': 'Japan'}
+    test_championships = ['Argentina', 'Brazil']
+    filename = str(tmp_path / "new_leagues_data.xlsx")
+    path_raw = tmp_path / "raw"
+    os.makedirs(path_raw)
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for sheet, team in [('ARG', 'Boca'), ('BRA', 'Santos'), ('JPN', 'Kashima')]:
+        ws = wb.create_sheet(sheet)
+        ws.append(['Date', 'Home', 'HG', 'PH'])
+        ws.append([datetime(2024, 1, 7), team, 2, 1.85])
+        ws.append([datetime(2024, 1, 14), team, None, 2.1])
+    wb.save(filename)
+
+    # Only the configured championships, named after them
+    assert convertWorkbookToCsv(filename, str(path_raw), dictionary, test_championships, n_workers) == test_championships
+    assert sorted(os.listdir(path_raw)) == ['Argentina.csv', 'Brazil.csv']
+
+    df = pd.read_csv(path_raw / 'Brazil.csv')
+    assert df.columns.tolist() == ['Date', 'Home', 'HG', 'PH']
+    assert df['Date'].tolist() == ['2024-01-07', '2024-01-14']
+    assert df['Home'].tolist() == ['Santos', 'Santos']
+    assert df['HG'].iloc[0] == 2 and pd.isna(df['HG'].iloc[1])
+    assert df['PH'].tolist() == [1.85, 2.1]
+
+
+def test_removeOldSeasonsFromRawDatas(monkeypatch, tmp_path):
+    dictionary = {'ARG': 'Argentina', 'BRA': 'Brazil'}
+    content = ('Country,Date,Home,PH\n'
+               'Argentina,2022-08-01,Boca,1.5\n'
+               'Argentina,2023-08-01,"River, Plate",\n'
+               'Argentina,2022-09-01,Boca,2.0\n'
+               'Argentina,2024-01-07,Boca,1.85\n')
+    (tmp_path / 'Argentina.csv').write_text(content)
+
+    # Read in chunks of 2 rows, values kept as written
+    assert filterSeasonRows(str(tmp_path / 'Argentina.csv'), [2023, 2024], chunk_size=2) == 2
+    assert (tmp_path / 'Argentina.csv').read_text() == ('Country,Date,Home,PH\n'
+                                                       'Argentina,2023-08-01,"River, Plate",\n'
+                                                       'Argentina,2024-01-07,Boca,1.85\n')
+
+    # Only the current season : the file is skipped (no temporary file written)
+    mtime = os.stat(tmp_path / 'Argentina.csv').st_mtime_ns
+    with monkeypatch.context() as m:
+        m.setattr('scrap_match_history.tempfile.NamedTemporaryFile', Mock(side_effect=AssertionError("file rewritten")))
+        assert removeOldSeasonsFromRawDatas(dictionary, str(tmp_path), '2324') == {'Argentina': 0}
+    assert os.stat(tmp_path / 'Argentina.csv').st_mtime_ns == mtime
+    assert sorted(os.listdir(tmp_path)) == ['Argentina.csv']
+
+    # Dates with a time component are kept, blank & invalid dates removed (the run isn't stopped)
+    (tmp_path / 'Brazil.csv').write_text('Country,Date,Home,PH\n'
+                                         'Brazil,2023-08-01 16:00,Santos,1.5\n'
+                                         'Brazil,,Santos,2.0\n'
+                                         'Brazil,not a date,Santos,2.1\n')
+    assert removeOldSeasonsFromRawDatas(dictionary, str(tmp_path), '2324') == {'Argentina': 0, 'Brazil': 2}
+    assert (tmp_path / 'Brazil.csv').read_text() == 'Country,Date,Home,PH\nBrazil,2023-08-01 16:00,Santos,1.5\n'
+
+
 """
 Archive data source - test
 """
-#
+from archive_datas_source import *
+
+
+def test_createDataArchive(tmp_path):
+    path_source = tmp_path / "source"
+    path_archives = str(tmp_path / "archives")
+    os.makedirs(path_source)
+    (path_source / "France Ligue 1_odds.csv").write_text("Date,HomeTeam\n12/04/2024,Metz\n")
+    (path_source / "main_leagues_data.zip").write_bytes(b"PK zip content")
+
+    first_run = createDataArchive(str(path_source), path_archives, compression="gzip")
+    # Same contents : no new object
+    (path_source / "copy_odds.csv").write_text("Date,HomeTeam\n12/04/2024,Metz\n")
+    second_run = createDataArchive(str(path_source), path_archives, compression="gzip")
+
+    assert first_run["files"]["France Ligue 1_odds.csv"]["compression"] == "gzip"
+    assert first_run["files"]["main_leagues_data.zip"]["compression"] is None
+    assert second_run["files"]["copy_odds.csv"]["hash"] == first_run["files"]["France Ligue 1_odds.csv"]["hash"]
+    assert sum(len(files) for _, _, files in os.walk(os.path.join(path_archives, "objects"))) == 2
+
+    with openArchivedFile(second_run["files"]["copy_odds.csv"], path_archives) as f:
+        assert f.read() == b"Date,HomeTeam\n12/04/2024,Metz\n"
+    assert listArchiveManifests(path_archives) == [first_run["run_id"], second_run["run_id"]]
+
+
+
+def test_pruneArchives_migrateDatedArchives(tmp_path):
+    path_archives = str(tmp_path)
+    for folder, content in [("2024-03-18", "old odds"), ("2024-04-08", "new odds")]:
+        os.makedirs(tmp_path / folder)
+        (tmp_path / folder / "odds.csv").write_text(content)
+
+    assert migrateDatedArchives(path_archives) == ["2024-03-18", "2024-04-08"]
+    assert listArchiveManifests(path_archives) == ["2024-03-18", "2024-04-08"]
+    assert not os.path.exists(tmp_path / "2024-03-18")
+
+    # The old manifest & its object are removed, the last manifest is always kept
+    removed = pruneArchives(10, path_archives, now=datetime(2024, 4, 15))
+    assert removed["manifests"] == ["2024-03-18"] and len(removed["objects"]) == 1
+    assert pruneArchives(1, path_archives, now=datetime(2025, 1, 1)) == {"manifests": [], "objects": []}
+
+    with openArchivedFile(loadArchiveManifest("2024-04-08", path_archives)["files"]["odds.csv"], path_archives) as f:
+        assert f.read() == b"new odds"
+
+
+def test_replayArchives(tmp_path):
+    import zipfile
+    import shutil
+    from archive_replay import replayArchives, listArchivedFiles
+    path_archives = str(tmp_path / "archives")
+    path_source = tmp_path / "source"
+    os.makedirs(tmp_path / "archives" / "2024-03-18")
+    os.makedirs(path_source)
+
+    def writeMatchHistory(zip_path, rows):
+        with zipfile.ZipFile(zip_path, 'w') as zip_ref:
+            zip_ref.writestr('E0.csv', 'Div,Date,HomeTeam,AwayTeam,FTHG,FTAG,FTR\n' + rows)
+            zip_ref.writestr('X9.csv', 'Div,Date,HomeTeam,AwayTeam\n')
+
+    # Previous archive format (dated folder)
+    writeMatchHistory(tmp_path / "archives" / "2024-03-18" / "main_leagues_data.zip", 'E0,16/03/2024,Arsenal,Chelsea,1,1,D\n')
+    (tmp_path / "archives" / "2024-03-18" / "France Ligue 1_odds.csv").write_text('Date,HomeTeam,AwayTeam,Avg_H,Avg_D,Avg_A\n24/03/2024,Metz,Lens,4.4,3.7,1.8\n')
+    # Identical copy in the next dated folder (decoded once)
+    shutil.copytree(tmp_path / "archives" / "2024-03-18", tmp_path / "archives" / "2024-03-19")
+    assert len(listArchivedFiles(path_archives)) == 2
+
+    # Manifests : same odds twice (decoded once), corrected result
+    writeMatchHistory(path_source / "main_leagues_data.zip", 'E0,16/03/2024,Arsenal,Chelsea,2,1,H\nE0,23/03/2024,Everton,Fulham,0,0,D\n')
+    (path_source / "France Ligue 1_odds.csv").write_text('Date,HomeTeam,AwayTeam,Avg_H,Avg_D,Avg_A\n24/03/2024,Metz,Lens,4.2,3.7,-\n')
+    createDataArchive(str(path_source), path_archives)
+    createDataArchive(str(path_source), path_archives)
+
+    report = replayArchives(path_archives, str(tmp_path / "clean"), n_workers=2)
+    assert report["files"] == 4
+    assert report["odds_rows"] == 2 and report["results_rows"] == 2
+
+    odds_history = pd.read_parquet(tmp_path / "clean" / "history" / "odds_history.parquet")
+    assert odds_history["Avg_H"].tolist() == [4.4, 4.2]
+    assert pd.isna(odds_history["Avg_A"].iloc[1])
+    assert odds_history["ScrapedAt"].iloc[0] == pd.Timestamp("2024-03-18")
+
+    results_history = pd.read_parquet(tmp_path / "clean" / "history" / "results_history.parquet")
+    assert results_history["Championship"].unique().tolist() == ["English Premier League"]
+    assert results_history[["HomeTeam", "FTR"]].values.tolist() == [["Arsenal", "H"], ["Everton", "D"]]
+
 
 
 """
@@ -113,6 +543,31 @@ def test_getMatchDatas():
 
 
 
+def test_loadRawMatchDatas(tmp_path):
+    # Create a test raw file (with a column not kept and without some stat columns)
+    test_datas = {
+        'Div': ['E0', 'E0', 'E0'],
+        'Date': ['11/08/2023', '01/09/2023', '12/08/2023'],
+        'HomeTeam': ['Team1', 'Team2', 'Team3'],
+        'AwayTeam': ['Team2', 'Team3', 'Team1'],
+        'FTHG': [1, 2, 0],
+        'FTAG': [0, 2, 1],
+        'FTR': ['H', 'D', 'A']}
+    pd.DataFrame(test_datas).to_csv(tmp_path / 'test.csv', index=False)
+
+    for chunksize in [None, 2]:
+        match_data, match_results = loadRawMatchDatas('test', str(tmp_path) + '/', chunksize=chunksize)
+
+        assert list(match_data.columns) == ['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'FTR']
+        assert list(match_results.columns) == ['Date', 'HomeTeam', 'AwayTeam', 'FTR']
+        assert len(match_data) == 3
+
+        # Dates are parsed day first
+        assert match_data['Date'].tolist() == [pd.Timestamp(2023, 8, 11), pd.Timestamp(2023, 9, 1), pd.Timestamp(2023, 8, 12)]
+        assert match_data['FTHG'].tolist() == [1, 2, 0]
+
+
+
 def test_exportMatchResults():
     pass
 
@@ -135,6 +590,37 @@ def test_createFormScore():
     assert result.loc['Team1', 'FormScore'] == 5
     assert result.loc['Team2', 'FormScore'] == 5
 
+    # Window size parameter
+    result = createFormScore(match_results = match_results, window=2)
+    assert result.loc['Team1', 'FormScore'] == 2
+    assert result.loc['Team2', 'FormScore'] == 2
+
+    # Team IDs of the match results
+    result = createFormScore(match_results = addTeamIds(match_results, {'Team1': 7, 'Team2': 3}))
+    assert result.loc['Team1', 'TeamId'] == 7
+    assert result.loc['Team2', 'TeamId'] == 3
+
+
+
+def test_meltMatchResults():
+    # Test DF
+    data = {
+        'HomeTeam': ['Team1', 'Team2'],
+        'AwayTeam': ['Team2', 'Team1'],
+        'FTR': ['H', 'D']}
+    match_results = pd.DataFrame(data)
+
+    result = meltMatchResults(match_results)
+
+    assert result.shape == (4, 4)
+    assert result['Team'].tolist() == ['Team1', 'Team2', 'Team2', 'Team1']
+    assert result['Venue'].tolist() == ['Home', 'Away', 'Home', 'Away']
+    assert result['FTR'].tolist() == ['H', 'H', 'D', 'D']
+
+    # Team IDs of the match results
+    result = meltMatchResults(addTeamIds(match_results, {'Team1': 5, 'Team2': 2}))
+    assert result['TeamId'].tolist() == [5, 2, 2, 5]
+
 
 
 def test_createTeamStats():
@@ -164,29 +650,78 @@ def test_createTeamStats():
     assert home_team_stats.loc[home_team_stats['HomeTeam'] == 'Team1', 'TotalWins'].values[0] == 1
     assert away_team_stats.loc[away_team_stats['AwayTeam'] == 'Team2', 'TotalLosses'].values[0] == 1
 
+    # Team IDs of the registry, next to the team names
+    home_team_stats, away_team_stats = createTeamStats(addTeamIds(match_data, {'Team1': 4, 'Team2': 1}))
+    assert home_team_stats.columns[:2].tolist() == ['HomeTeam', 'HomeTeamId']
+    assert home_team_stats['HomeTeamId'].tolist() == [4, 1]
+    assert away_team_stats['AwayTeamId'].tolist() == [4, 1]
+
+
+
+def test_aggregateTeamStats():
+    # Create a test DataFrame with shots
+    data = {
+        'HomeTeam': ['Team1', 'Team2', 'Team1'],
+        'AwayTeam': ['Team2', 'Team1', 'Team3'],
+        'FTR': ['H', 'D', 'A'],
+        'FTHG': [2, 1, 0],
+        'FTAG': [1, 1, 3],
+        'HS': [10, 5, 7],
+        'AS': [4, 6, 12]
+    }
+    match_data = pd.DataFrame(data)
+
+    result = aggregateTeamStats(match_data)
+
+    assert result.index.tolist() == ['Team1', 'Team2', 'Team3']
+
+    # Home, away & total aggregates
+    assert result.loc['Team1', 'TotalMatches_Home'] == 2
+    assert result.loc['Team1', 'TotalMatches_Away'] == 1
+    assert result.loc['Team1', 'TotalMatches'] == 3
+    assert result.loc['Team1', 'TotalWins'] == 1
+    assert result.loc['Team1', 'TotalLosses_Home'] == 1
+    assert result.loc['Team1', 'TotalGoalsScored'] == 3
+    assert result.loc['Team1', 'TotalShots_Home'] == 17
+    assert result.loc['Team1', 'TotalShots_Away'] == 6
+    assert result.loc['Team1', 'TotalShotsConceded'] == 21
+    assert result.loc['Team3', 'TotalWins_Away'] == 1
+
+    # Stats not available in match data are not created
+    assert 'TotalCorners' not in result.columns
+    assert 'TeamId' not in result.columns
+
+    # Team IDs of the registry
+    result = aggregateTeamStats(addTeamIds(match_data, {'Team3': 0, 'Team1': 1, 'Team2': 2}))
+    assert result['TeamId'].tolist() == [1, 2, 0]
+
 
 
 def test_mergeTeamStatsHomeAway():
     # Create test data
     home_team_stats = pd.DataFrame({
         'HomeTeam': ['Team1', 'Team2'],
+        'HomeTeamId': [0, 1],
         'Stat1_Home': [1, 2],
         'Stat2_Home': [3, 4]})
 
     away_team_stats = pd.DataFrame({
-        'AwayTeam': ['Team1', 'Team2'],
-        'Stat1_Away': [5, 6],
-        'Stat2_Away': [7, 8]})
+        'AwayTeam': ['Team2', 'Team1'],
+        'AwayTeamId': [1, 0],
+        'Stat1_Away': [6, 5],
+        'Stat2_Away': [8, 7]})
 
     # Call the function with the test data
     result = mergeTeamStatsHomeAway(home_team_stats, away_team_stats)
 
-    # Create the expected DataFrame
+    # Create the expected DataFrame (away rows joined on the team IDs)
     expected = pd.DataFrame({
         'HomeTeam': ['Team1', 'Team2'],
+        'HomeTeamId': [0, 1],
         'Stat1_Home': [1, 2],
         'Stat2_Home': [3, 4],
         'AwayTeam': ['Team1', 'Team2'],
+        'AwayTeamId': [0, 1],
         'Stat1_Away': [5, 6],
         'Stat2_Away': [7, 8]})
 
@@ -258,22 +793,27 @@ def test_mergeFormScoreTeamStats():
     # Create DataFrames for the test
     data1 = {
         'HomeTeam': ['Team1', 'Team2', 'Team3', 'Team4'],
+        'HomeTeamId': [0, 1, 2, 3],
         'TotalPoints': [10, 20, 30, 40],
         'GoalDifference': [1, 2, 3, 4]
     }
     df1 = pd.DataFrame(data1)
 
     data2 = {
-        'FormScore': [5, 6, 7, 8]
+        'TeamId': [3, 1, 0],
+        'FormScore': [8, 6, 5]
     }
-    df2 = pd.DataFrame(data2, index=['Team1', 'Team2', 'Team3', 'Team4'])
+    df2 = pd.DataFrame(data2, index=['Team4', 'Team2', 'Team1'])
 
     # Call the mergeFormScoreTeamStats function
     result = mergeFormScoreTeamStats(df1, df2)
 
-    # Verify that the resulting DataFrame is correctly merged
+    # Verify that the resulting DataFrame is correctly merged (on the team IDs, NaN without form score)
     assert 'FormScore' in result.columns
-    assert result['FormScore'].tolist() == [5, 6, 7, 8]
+    assert 'TeamId' not in result.columns
+    assert result['FormScore'].tolist()[:2] == [5, 6]
+    assert np.isnan(result['FormScore'].iloc[2])
+    assert result['FormScore'].iloc[3] == 8
 
 
 
@@ -281,7 +821,9 @@ def test_prepareStatsTeam():
     # Create a DataFrame for the test
     data = {
         'HomeTeam': ['Team1', 'Team2'],
+        'HomeTeamId': [0, 1],
         'AwayTeam': ['Team3', 'Team4'],
+        'AwayTeamId': [2, 3],
         'TotalMatches_Home': [1, 2],
         'TotalWins_Home': [1, 2],
         'TotalDraws_Home': [1, 2],
@@ -319,6 +861,8 @@ def test_prepareStatsTeam():
     # Verify that the values are correct
     assert statsHomeTeam['TotalGoalsScored_HomeTeam'].tolist() == [1, 2]
     assert statsAwayTeam['TotalGoalsScored_AwayTeam'].tolist() == [1, 2]
+    assert statsHomeTeam['HomeTeamId'].tolist() == [0, 1]
+    assert statsAwayTeam['AwayTeamId'].tolist() == [2, 3]
 
 
 
@@ -326,19 +870,23 @@ def test_createDataToModelisation():
     # Create DataFrames for the test
     data1 = {
         'HomeTeam': ['Team1', 'Team2'],
+        'HomeTeamId': [0, 1],
         'AwayTeam': ['Team3', 'Team4'],
+        'AwayTeamId': [2, 3],
         'FTR': ['H', 'D']
     }
     df1 = pd.DataFrame(data1)
 
     data2 = {
-        'HomeTeam': ['Team1', 'Team2'],
-        'TotalGoalsScored_HomeTeam': [1, 2]
+        'HomeTeam': ['Team2', 'Team1'],
+        'HomeTeamId': [1, 0],
+        'TotalGoalsScored_HomeTeam': [2, 1]
     }
     df2 = pd.DataFrame(data2)
 
     data3 = {
         'AwayTeam': ['Team3', 'Team4'],
+        'AwayTeamId': [2, 3],
         'TotalGoalsScored_AwayTeam': [3, 4]
     }
     df3 = pd.DataFrame(data3)
@@ -352,12 +900,49 @@ def test_createDataToModelisation():
     assert result['TotalGoalsScored_HomeTeam'].tolist() == [1, 2]
     assert result['TotalGoalsScored_AwayTeam'].tolist() == [3, 4]
 
+    # Verify that the team IDs are only used for the join
+    assert not {'HomeTeamId', 'AwayTeamId'} & set(result.columns)
+
     # Verify that the 'FTR_encoded' column has been added and is correct
     assert 'FTR_encoded' in result.columns
     assert result['FTR_encoded'].tolist() == [0, 1]
 
 
 
+def test_createAsOfDataToModelisation():
+    # Create a test DataFrame (dates are not sorted)
+    data = {
+        'Date': ['03/01/2020', '01/01/2020', '02/01/2020'],
+        'HomeTeam': ['Team1', 'Team1', 'Team2'],
+        'AwayTeam': ['Team2', 'Team2', 'Team1'],
+        'FTHG': [1, 2, 0],
+        'FTAG': [1, 0, 3],
+        'FTR': ['D', 'H', 'A']}
+    match_data = pd.DataFrame(data)
+
+    result = createAsOfDataToModelisation(match_data)
+
+    # Rows are sorted by date
+    assert result['Date'].tolist() == ['01/01/2020', '02/01/2020', '03/01/2020']
+
+    # First match : no match played before
+    assert result.loc[0, 'TotalMatches_HomeTeam'] == 0
+    assert result.loc[0, 'WinRatio_HomeTeam'] == 0
+
+    # Last match : only the two previous matches are counted
+    assert result.loc[2, 'TotalMatches_Home'] == 1
+    assert result.loc[2, 'TotalGoalsScored_HomeTeam'] == 5
+    assert result.loc[2, 'TotalPoints_HomeTeam'] == 6
+    assert result.loc[2, 'TotalPoints_AwayTeam'] == 0
+    assert result.loc[2, 'Ranking_HomeTeam'] == 1
+    assert result.loc[2, 'Ranking_AwayTeam'] == 2
+
+    # Same columns as the season based data for modeling
+    assert result.columns[-1] == 'FTR_encoded'
+    assert result['FTR_encoded'].tolist() == [0, 2, 1]
+
+
+
 def test_exportCleanDatas():
     pass
 
@@ -367,6 +952,588 @@ def test_getMatchOdds():
     pass
 
 
+def test_computeFileFingerprint(tmp_path):
+    test_file = tmp_path / 'test.csv'
+    test_file.write_text('col1,col2\n1,2\n')
+
+    fingerprint = computeFileFingerprint(str(test_file))
+    assert fingerprint == computeFileFingerprint(str(test_file))
+
+    # Content changed
+    test_file.write_text('col1,col2\n1,3\n')
+    assert computeFileFingerprint(str(test_file)) != fingerprint
+
+    # File doesn't exist
+    assert computeFileFingerprint(str(tmp_path / 'missing.csv')) is None
+
+
+
+def test_getStagesToRun(tmp_path):
+    championship = 'test'
+    clean_folder = tmp_path / championship
+    clean_folder.mkdir()
+    for output in ["statsHomeTeam.csv", "statsAwayTeam.csv", "match_data_for_modeling.csv", "odds.csv"]:
+        (clean_folder / output).write_text('')
+
+    fingerprints = {"matches": "hash_matches", "odds": "hash_odds"}
+    previous_run = {"code_version": "v1", "matches": "hash_matches", "odds": "hash_odds"}
+    path_data_clean = str(tmp_path) + '/'
+
+    # Nothing changed
+    assert getStagesToRun(championship, previous_run, fingerprints, "v1", path_data_clean) == []
+
+    # Odds changed
+    new_fingerprints = {"matches": "hash_matches", "odds": "new_hash_odds"}
+    assert getStagesToRun(championship, previous_run, new_fingerprints, "v1", path_data_clean) == ["odds"]
+
+    # Code changed
+    assert getStagesToRun(championship, previous_run, fingerprints, "v2", path_data_clean) == ["matches", "odds"]
+
+    # Output removed
+    (clean_folder / "statsHomeTeam.csv").unlink()
+    assert getStagesToRun(championship, previous_run, fingerprints, "v1", path_data_clean) == ["matches"]
+
+    # No previous run
+    assert getStagesToRun(championship, {}, fingerprints, "v1", path_data_clean) == ["matches", "odds"]
+
+
+
+def test_preProcessingPipeline(monkeypatch):
+    # A failing championship doesn't stop the others
+    def mock_preProcessChampionship(championship, stages_to_run):
+        if championship == 'Failing League':
+            raise ValueError("Bad raw datas")
+
+    monkeypatch.setattr('data_preprocessing_matches.championships', ['Failing League', 'Test League'])
+    monkeypatch.setattr('data_preprocessing_matches.preProcessChampionship', mock_preProcessChampionship)
+    monkeypatch.setattr('data_preprocessing_matches.loadPreprocessingManifest', lambda: {})
+    monkeypatch.setattr('data_preprocessing_matches.savePreprocessingManifest', lambda manifest: None)
+
+    with pytest.raises(Exception) as e:
+        preProcessingPipeline(n_workers=1)
+
+    assert "Failing League" in str(e.value)
+    assert "'Test League': 'success'" in str(e.value)
+
+
+
+def mock_preProcessChampionshipInWorker(championship, stages_to_run):
+    # Module level function : sent to the worker processes by reference
+    with open(os.environ["TEST_PREPROCESSING_PIDS"], 'a') as f:
+        f.write(f"{os.getpid()}\n")
+    if championship == 'Failing League':
+        raise ValueError("Bad raw datas")
+
+
+def test_preProcessingPipeline_workers(monkeypatch, tmp_path):
+    # Championships pre-processed in worker processes, the manifest is saved by the parent process
+    saved_manifests = []
+    monkeypatch.setenv("TEST_PREPROCESSING_PIDS", str(tmp_path / "pids.txt"))
+    monkeypatch.setattr('data_preprocessing_matches.championships', ['Failing League', 'Test League', 'Other League'])
+    monkeypatch.setattr('data_preprocessing_matches.preProcessChampionship', mock_preProcessChampionshipInWorker)
+    monkeypatch.setattr('data_preprocessing_matches.loadPreprocessingManifest', lambda: {})
+    monkeypatch.setattr('data_preprocessing_matches.savePreprocessingManifest', lambda manifest: saved_manifests.append(dict(manifest)))
+
+    with pytest.raises(Exception) as e:
+        preProcessingPipeline(n_workers=2)
+
+    # The failing championship is raised once every championship is done
+    assert "Failing League" in str(e.value)
+    assert "'Test League': 'success'" in str(e.value) and "'Other League': 'success'" in str(e.value)
+
+    assert len(saved_manifests) == 2
+    assert set(saved_manifests[-1]) == {'Test League', 'Other League'}
+    assert all("code_version" in entry for entry in saved_manifests[-1].values())
+
+    worker_pids = set(open(tmp_path / "pids.txt").read().split())
+    assert len(worker_pids) >= 1 and str(os.getpid()) not in worker_pids
+
+
+
+def test_preProcessChampionshipMatches_stageCache(monkeypatch, tmp_path):
+    import functools
+    import data_preprocessing_matches
+    from stage_cache import runCachedStage, getStageCacheStats
+
+    match_data = pd.DataFrame({
+        'Date': pd.to_datetime(['01/01/2020', '08/01/2020', '15/01/2020', '22/01/2020'], dayfirst=True),
+        'HomeTeam': ['Team1', 'Team2', 'Team1', 'Team2'],
+        'AwayTeam': ['Team2', 'Team1', 'Team2', 'Team1'],
+        'FTHG': [2, 1, 0, 3],
+        'FTAG': [1, 2, 0, 1],
+        'FTR': ['H', 'A', 'D', 'H']})
+    exports = []
+
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr('data_preprocessing_matches.loadRawMatchDatas', lambda championship: (match_data, match_data[["Date", "HomeTeam", "AwayTeam", "FTR"]]))
+    monkeypatch.setattr('data_preprocessing_matches.exportCleanDatas', lambda championship, *datas: exports.append(datas))
+    monkeypatch.setattr('data_preprocessing_matches.path_data_clean', str(tmp_path / 'clean') + '/')
+    monkeypatch.setattr('data_preprocessing_matches.modeling_features', 'season')
+    monkeypatch.setattr('data_preprocessing_matches.runCachedStage', functools.partial(runCachedStage, cache_dir=cache_dir))
+
+    preProcessChampionshipMatches('Test League')
+
+    # A downstream stage is edited : only this stage is computed again, the upstream stages are loaded from the cache
+    original_prepareStatsTeam = data_preprocessing_matches.prepareStatsTeam
+    def prepareStatsTeam(score_team_stats):
+        # Edited stage
+        return original_prepareStatsTeam(score_team_stats)
+    monkeypatch.setattr('data_preprocessing_matches.prepareStatsTeam', prepareStatsTeam)
+    monkeypatch.setattr('data_preprocessing_matches.getPreprocessingCodeVersion', lambda: 'edited_code_version')
+
+    preProcessChampionshipMatches('Test League')
+
+    stages = getStageCacheStats(cache_dir)["stages"]
+    for stage in ['createFormScore', 'createTeamStats', 'mergeTeamStatsHomeAway', 'createGlobalTeamStats', 'createRanking', 'mergeFormScoreTeamStats']:
+        assert stages[stage] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+    assert stages['prepareStatsTeam']["misses"] == 2
+    pd.testing.assert_frame_equal(exports[0][2], exports[1][2])
+
+
+
+"""
+Clean data store - test
+"""
+from clean_data_store import *
+
+
+def test_applyCleanDataSchema():
+    df = pd.DataFrame({
+        'HomeTeam': ['Team1', 'Team2'],
+        'TotalMatches_Home': [10, 12],
+        'WinRatio_HomeTeam': [50.0, 25.0],
+        'Avg_H': [1.5, 2.5]})
+
+    result = applyCleanDataSchema(df)
+
+    assert isinstance(result['HomeTeam'].dtype, pd.CategoricalDtype)
+    assert result['TotalMatches_Home'].dtype == np.int8
+    assert result['WinRatio_HomeTeam'].dtype == np.float32
+    assert result['Avg_H'].dtype == np.float64
+
+
+
+def test_writeCleanData_readCleanData(tmp_path):
+    df = pd.DataFrame({
+        'HomeTeam': ['Team1', 'Team2'],
+        'AwayTeam': ['Team3', 'Team4'],
+        'TotalMatches_Home': [10, 12]})
+    file_path = str(tmp_path / 'test.csv')
+
+    for data_format in ["csv", "parquet", "feather"]:
+        writeCleanData(df, file_path, data_format=data_format)
+
+        # CSV file is always written
+        assert os.path.exists(file_path)
+
+        result = readCleanData(file_path, columns=['HomeTeam', 'TotalMatches_Home'], data_format=data_format)
+        assert list(result.columns) == ['HomeTeam', 'TotalMatches_Home']
+        assert result['HomeTeam'].tolist() == ['Team1', 'Team2']
+        assert result['TotalMatches_Home'].tolist() == [10, 12]
+
+    assert os.path.exists(getColumnarFilePath(file_path, "parquet"))
+    assert os.path.exists(getColumnarFilePath(file_path, "feather"))
+
+    with pytest.raises(ValueError):
+        getColumnarFilePath(file_path, "csv")
+
+
+
+def test_updateTeamRegistry(tmp_path):
+    os.makedirs(tmp_path / "test_championship")
+
+    registry = updateTeamRegistry("test_championship", ["Team2", "Team1"], str(tmp_path))
+    assert registry == {"Team1": 0, "Team2": 1}
+
+    # Existing IDs are kept, new teams get the next IDs
+    registry = updateTeamRegistry("test_championship", ["Team3", "Team0", "Team1"], str(tmp_path))
+    assert registry == {"Team1": 0, "Team2": 1, "Team0": 2, "Team3": 3}
+    assert loadTeamRegistry("test_championship", str(tmp_path)) == registry
+
+    assert encodeTeams(["Team3", "Unknown", "Team1"], registry).tolist() == [3, -1, 0]
+    assert loadTeamRegistry("other_championship", str(tmp_path)) == {}
+
+
+
+def test_addTeamIds():
+    registry = {'Team1': 0, 'Team2': 1}
+    df = pd.DataFrame({'HomeTeam': pd.Series(['Team2', 'Team3'], dtype='category'), 'AwayTeam': ['Team1', 'Team2'], 'FTR': ['H', 'D']})
+
+    result = addTeamIds(df, registry)
+
+    assert result.columns.tolist() == ['HomeTeam', 'HomeTeamId', 'AwayTeam', 'AwayTeamId', 'FTR']
+    assert result['HomeTeamId'].tolist() == [1, -1]
+    assert result['AwayTeamId'].tolist() == [0, 1]
+
+    # IDs already stored are replaced
+    assert addTeamIds(result, {'Team3': 5})['HomeTeamId'].tolist() == [-1, 5]
+
+
+
+def test_getTeamRowPositions():
+    row_team_ids = [2, 0, 1]
+
+    assert getTeamRowPositions(row_team_ids, [1, 3, 2, -1]).tolist() == [2, -1, 0, -1]
+    assert getTeamRowPositions(row_team_ids, []).tolist() == []
+
+
+
+def test_findMatchRows():
+    registry = {'Team1': 0, 'Team2': 1, 'Team3': 2}
+    df = pd.DataFrame({'HomeTeam': ['Team1', 'Team2', 'Team1'], 'AwayTeam': ['Team2', 'Team3', 'Team3']})
+
+    # Team IDs of the registry
+    df_ids = addTeamIds(df, registry)
+    assert findMatchRows(df_ids, registry, 'Team1', 'Team3').tolist() == [2]
+    assert findMatchRows(df_ids, registry, 'Team3', 'Team1').tolist() == []
+    assert findMatchRows(df_ids, registry, 'Unknown', 'Team1').tolist() == []
+
+    # Files without team IDs or without registry : team names
+    assert findMatchRows(df, registry, 'Team2', 'Team3').tolist() == [1]
+    assert findMatchRows(df_ids, {}, 'Team2', 'Team3').tolist() == [1]
+
+
+
+"""
+Odds store - test
+"""
+from odds_store import *
+
+
+def test_appendOddsSnapshot_loadOddsHistory(tmp_path):
+    path_odds = str(tmp_path)
+    first_scrape = pd.DataFrame([['30/04/2024', 'Lyon', 'Lens', '2.10', '3.40', '3.20'],
+                                 ['04/05/2024', 'Metz', 'Nice', '3.00', '3.10', '2.40']], columns=odds_columns)
+    second_scrape = pd.DataFrame([['04/05/2024', 'Metz', 'Nice', '2.80', '3.10', '2.55'],
+                                  ['04/05/2024', 'Metz', 'Nice', '2.80', '3.10', '2.55']], columns=odds_columns)
+
+    assert appendOddsSnapshot('France Ligue 1', first_scrape, '2024-04-29 20:30:00', path_odds) == 2
+    # Duplicated rows are stored once, appending the same scrape again adds nothing
+    assert appendOddsSnapshot('France Ligue 1', second_scrape, '2024-04-30 20:30:00', path_odds) == 1
+    assert appendOddsSnapshot('France Ligue 1', second_scrape, '2024-04-30 20:30:00', path_odds) == 1
+    # An older scrape (e.g. an archive) doesn't replace the latest view
+    appendOddsSnapshot('France Ligue 1', first_scrape, '2024-04-28 20:30:00', path_odds)
+
+    assert sorted(os.listdir(tmp_path / 'France Ligue 1')) == ['latest.parquet', 'month=2024-04', 'month=2024-05']
+
+    latest = loadLatestOdds('France Ligue 1', path_odds)
+    assert latest[['HomeTeam', 'AwayTeam', 'Avg_A']].values.tolist() == [['Metz', 'Nice', 2.55]]
+
+    history = loadOddsHistory('France Ligue 1', 'Metz', 'Nice', path_data_odds=path_odds)
+    assert history['Avg_H'].tolist() == [3.0, 3.0, 2.8]
+    assert history['ScrapedAt'].is_monotonic_increasing
+    assert not history.duplicated(subset=odds_store_key).any()
+
+    assert loadOddsHistory('France Ligue 1', start_month='2024-05', path_data_odds=path_odds)['HomeTeam'].unique().tolist() == ['Metz']
+    assert loadOddsHistory('Unknown', path_data_odds=path_odds).empty
+    assert loadLatestOdds('Unknown', path_odds).empty
+
+
+
+"""
+Stage cache - test
+"""
+from stage_cache import *
+
+
+def test_runCachedStage(tmp_path):
+    calls = []
+    def stage(df, factor=1):
+        calls.append(1)
+        return df * factor
+
+    df = pd.DataFrame({'Stat1': [1, 2]}, index=['Team1', 'Team2'])
+    cache_dir = str(tmp_path)
+
+    # Miss then hit
+    result = runCachedStage(stage, df, params={'factor': 2}, cache_dir=cache_dir, max_size=1024 * 1024)
+    cached_result = runCachedStage(stage, df, params={'factor': 2}, cache_dir=cache_dir, max_size=1024 * 1024)
+    pd.testing.assert_frame_equal(result, cached_result)
+    assert len(calls) == 1
+
+    # Different inputs or parameters : miss
+    runCachedStage(stage, df + 1, params={'factor': 2}, cache_dir=cache_dir, max_size=1024 * 1024)
+    runCachedStage(stage, df, params={'factor': 3}, cache_dir=cache_dir, max_size=1024 * 1024)
+    assert len(calls) == 3
+
+    stats = getStageCacheStats(cache_dir)
+    assert stats["stages"]["stage"] == {"hits": 1, "misses": 3, "hit_ratio": 0.25}
+    assert stats["entries"] == 3
+
+    # Cache disabled
+    runCachedStage(stage, df, params={'factor': 2}, cache_dir=cache_dir, max_size=0)
+    assert len(calls) == 4
+
+    clearStageCache(cache_dir)
+    assert getStageCacheStats(cache_dir) == {"stages": {}, "entries": 0, "size": 0}
+
+
+
+def test_logStageCacheEvent(monkeypatch, tmp_path):
+    # Statistics file rotated every 3 events (about 60 bytes per event)
+    monkeypatch.setattr('stage_cache.stage_cache_stats_max_size', 150)
+
+    for _ in range(10):
+        logStageCacheEvent('stage', 'hit', str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == [stage_cache_stats_rotated_file, stage_cache_stats_file]
+    assert getStageCacheStats(str(tmp_path))["stages"]["stage"]["hits"] == 4
+
+    clearStageCache(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+
+def test_evictStageCache(monkeypatch, tmp_path):
+    # 3 cached results of 100 bytes, the oldest is used last
+    for index, file_name in enumerate(['a.pkl', 'b.pkl', 'c.pkl']):
+        file_path = tmp_path / file_name
+        file_path.write_bytes(b'0' * 100)
+        os.utime(file_path, (index, index))
+    os.utime(tmp_path / 'a.pkl', (10, 10))
+
+    removed_files = evictStageCache(str(tmp_path), max_size=150)
+
+    assert removed_files == ['b.pkl', 'c.pkl']
+    assert os.listdir(tmp_path) == ['a.pkl']
+
+    # A file removed by another process between listdir & stat is skipped
+    (tmp_path / 'd.pkl').write_bytes(b'0' * 100)
+    os_stat = os.stat
+    def statRemovedFile(path, *args, **kwargs):
+        if str(path).endswith('d.pkl'):
+            raise FileNotFoundError(path)
+        return os_stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, 'stat', statRemovedFile)
+
+    assert evictStageCache(str(tmp_path), max_size=150) == []
+
+
+
+"""
+Team ratings - test
+"""
+from team_ratings import *
+
+
+def rating_test_matches():
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['01/01/2020', '01/01/2020', '08/01/2020', '15/01/2020', '15/01/2020'], dayfirst=True),
+        'HomeTeam': ['Team1', 'Team3', 'Team2', 'Team1', 'Team4'],
+        'AwayTeam': ['Team2', 'Team4', 'Team3', 'Team4', 'Team2'],
+        'FTR': ['H', 'D', 'A', 'H', 'D']})
+
+
+
+def test_updateRatings():
+    ratings = {}
+    home_rating, away_rating = updateRatings(ratings, 'Team1', 'Team2', 'H', k_factor=20, home_advantage=0, initial_rating=1500)
+
+    assert (home_rating, away_rating) == (1500, 1500)
+    assert ratings == {'Team1': 1510, 'Team2': 1490}
+
+    # The rating points won by a team are lost by the other one
+    updateRatings(ratings, 'Team2', 'Team1', 'D', k_factor=20, home_advantage=0, initial_rating=1500)
+    assert ratings['Team1'] + ratings['Team2'] == pytest.approx(3000)
+    assert ratings['Team2'] > 1490
+
+
+
+def test_backfillRatings():
+    match_results = rating_test_matches()
+    ratings, rated_matches = backfillRatings(match_results)
+
+    # Same ratings as updating the matches one by one
+    expected_ratings = {}
+    pre_match_ratings = [updateRatings(expected_ratings, row.HomeTeam, row.AwayTeam, row.FTR) for row in match_results.itertuples()]
+
+    assert ratings == pytest.approx(expected_ratings)
+    assert rated_matches['Elo_HomeTeam'].tolist() == pytest.approx([home for home, _ in pre_match_ratings])
+    assert rated_matches['Elo_AwayTeam'].tolist() == pytest.approx([away for _, away in pre_match_ratings])
+
+
+
+def test_updateTeamRatings(tmp_path):
+    match_results = rating_test_matches()
+
+    # First matches, then every match (the matches already processed are skipped)
+    updateTeamRatings('test_championship', match_results.iloc[:3], str(tmp_path))
+    ratings = updateTeamRatings('test_championship', match_results, str(tmp_path))
+    assert updateTeamRatings('test_championship', match_results, str(tmp_path)) == ratings
+
+    expected_ratings, rated_matches = backfillRatings(match_results)
+    assert ratings == pytest.approx(expected_ratings)
+
+    history = loadRatingsHistory('test_championship', str(tmp_path))
+    assert len(history) == 5
+    assert history['Elo_HomeTeam'].tolist() == pytest.approx(rated_matches['Elo_HomeTeam'].tolist())
+
+    # A late match added before the last processed match : ratings & history computed from all the matches
+    late_match = pd.DataFrame({'Date': pd.to_datetime(['08/01/2020'], dayfirst=True), 'HomeTeam': ['Team4'], 'AwayTeam': ['Team1'], 'FTR': ['A']})
+    match_results = pd.concat([match_results, late_match], ignore_index=True)
+    ratings = updateTeamRatings('test_championship', match_results, str(tmp_path))
+    assert ratings == pytest.approx(backfillRatings(match_results)[0])
+    assert len(loadRatingsHistory('test_championship', str(tmp_path))) == 6
+
+    # A corrected result
+    match_results.loc[0, 'FTR'] = 'A'
+    ratings = updateTeamRatings('test_championship', match_results, str(tmp_path))
+    assert ratings == pytest.approx(backfillRatings(match_results)[0])
+    assert len(loadRatingsHistory('test_championship', str(tmp_path))) == 6
+
+
+
+def test_updateTeamRatings_newSeason(tmp_path, capsys):
+    # Two consecutive seasons in separate files (the new season file has none of the matches already rated)
+    season_1 = rating_test_matches()
+    season_2 = pd.DataFrame({'Date': pd.to_datetime(['10/08/2020', '17/08/2020'], dayfirst=True),
+                             'HomeTeam': ['Team2', 'Team3'], 'AwayTeam': ['Team1', 'Team2'], 'FTR': ['H', 'A']})
+
+    season_1_ratings = updateTeamRatings('test_championship', season_1, str(tmp_path))
+    updateTeamRatings('test_championship', season_2.iloc[:1], str(tmp_path))
+    ratings = updateTeamRatings('test_championship', season_2, str(tmp_path))
+
+    # The ratings of the previous season are kept
+    assert "changed" not in capsys.readouterr().out
+    assert ratings == pytest.approx(backfillRatings(season_2, season_1_ratings)[0])
+    assert len(loadRatingsHistory('test_championship', str(tmp_path))) == 7
+
+    # A corrected result of the new season : ratings computed from the matches of the file
+    season_2.loc[0, 'FTR'] = 'D'
+    season_2 = pd.concat([season_2, pd.DataFrame({'Date': pd.to_datetime(['24/08/2020'], dayfirst=True),
+                                                  'HomeTeam': ['Team4'], 'AwayTeam': ['Team1'], 'FTR': ['H']})], ignore_index=True)
+    ratings = updateTeamRatings('test_championship', season_2, str(tmp_path))
+    assert "changed" in capsys.readouterr().out
+    assert ratings == pytest.approx(backfillRatings(season_2)[0])
+
+
+
+def test_addRatingsToStats():
+    stats_home_team = pd.DataFrame({'HomeTeam': ['Team1', 'Team2'], 'FormScore_HomeTeam': [1, 2]})
+    stats_away_team = pd.DataFrame({'AwayTeam': ['Team1', 'Team3'], 'FormScore_AwayTeam': [3, 4]})
+
+    stats_home_team, stats_away_team = addRatingsToStats(stats_home_team, stats_away_team, {'Team1': 1510.0, 'Team2': 1490.0})
+
+    assert stats_home_team['Elo_HomeTeam'].tolist() == [1510.0, 1490.0]
+    assert stats_away_team['Elo_AwayTeam'].tolist() == [1510.0, elo_initial_rating]
+
+
+
+"""
+Train model - test
+"""
+import train_model
+from train_model import splitDatasTrainModel, search_strategy, search_n_iter, splitCpuBudget, trainChampionships, refitModel, searchParams, compareSearchStrategies
+
+def test_splitCpuBudget():
+    # Cores given to the championships first, the remaining cores to the grid searches
+    assert splitCpuBudget(2, cpu_budget=8, league_jobs=0) == (2, 4)
+    assert splitCpuBudget(5, cpu_budget=8, league_jobs=0) == (5, 1)
+    # More championships than cores : never more busy cores than the budget
+    assert splitCpuBudget(12, cpu_budget=4, league_jobs=0) == (4, 1)
+    # Forced number of championships in parallel
+    assert splitCpuBudget(4, cpu_budget=8, league_jobs=1) == (1, 8)
+    assert splitCpuBudget(4, cpu_budget=2, league_jobs=3) == (2, 1)
+    assert splitCpuBudget(3, cpu_budget=0, league_jobs=0) == (1, 1)
+
+
+def createModelingDatas(n_rows=90, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(n_rows, 3))
+    target = (features[:, 0] > 0).astype(int) * 2
+    data = pd.DataFrame(features, columns=["f1", "f2", "f3"])
+    data["FTR_encoded"] = target
+    data["FTR"] = np.where(target == 2, "A", "H")
+    data["Date"] = pd.date_range("2024-01-01", periods=n_rows).strftime("%Y-%m-%d")
+    data["HomeTeam"], data["AwayTeam"] = "Team 1", "Team 2"
+    return data
+
+
+@pytest.mark.parametrize("strategy", ["grid", "halving", "random", "budget"])
+def test_searchParams(strategy):
+    data = createModelingDatas()
+    X_train, _, y_train, _ = splitDatasTrainModel(data, 0.2)
+
+    search = searchParams(X_train, y_train, strategy, n_jobs=1, n_iter=4, time_budget=0)
+
+    assert search["strategy"] == strategy
+    assert set(search["best_params"]) == {"C", "gamma", "kernel"}
+    assert 0 <= search["best_score"] <= 1
+    expected_candidates = {"grid": 24, "halving": 24, "random": 4, "budget": 1}
+    assert search["n_candidates"] == expected_candidates[strategy]
+    if strategy == "halving":
+        # Halving: every combination on a sample, the best ones fitted again on more rows
+        assert search["n_fits"] > search["n_candidates"] * 3
+    else:
+        assert search["n_fits"] == search["n_candidates"] * 3
+    # Time series cross-validation : the parameters search never uses Platt calibration
+    assert "probability" not in search["best_params"]
+
+    with pytest.raises(ValueError):
+        searchParams(X_train, y_train, "unknown")
+
+
+def test_compareSearchStrategies(monkeypatch, tmp_path):
+    os.makedirs(tmp_path / "League A")
+    createModelingDatas().to_csv(tmp_path / "League A" / "match_data_for_modeling.csv", index=False)
+    monkeypatch.setattr(train_model, "path_data_clean", f"{tmp_path}/")
+
+    report = compareSearchStrategies("League A", ["random", "budget"], n_jobs=1, time_budget=0)
+
+    assert report["strategy"].tolist() == ["random", "budget"]
+    assert report["candidates"].tolist() == [search_n_iter, 1]
+    assert {"candidates", "fits", "search_seconds", "cv_score", "holdout_accuracy", "best_params"} <= set(report.columns)
+
+
+def test_refitModel():
+    from sklearn.svm import SVC
+    features = pd.DataFrame({"f1": [0.0, 0.1, 0.2, 1.0, 1.1, 1.2], "f2": [1.0, 0.9, 1.1, 0.0, 0.1, 0.2]})
+    target = pd.Series([0, 0, 0, 2, 2, 2])
+    model = SVC(C=10, kernel="rbf").fit(features[:4], target[:4])
+
+    final_model = refitModel(model, features, target, cache_size=500)
+
+    # Copy of the best model, trained with all the data & a larger kernel cache
+    assert final_model is not model and model.shape_fit_ == (4, 2)
+    assert final_model.shape_fit_ == (6, 2)
+    assert final_model.C == 10 and final_model.cache_size == 500
+    # Platt calibration only for the final model
+    assert final_model.probability is True and model.probability is not True
+    assert refitModel(model, features, target, cache_size=50).cache_size == 200
+    assert final_model.predict(features).tolist() == target.tolist()
+
+
+@pytest.mark.parametrize("league_jobs", [1, 2])
+def test_trainChampionships(monkeypatch, tmp_path, league_jobs):
+    for seed, championship in enumerate(["League A", "League B"]):
+        os.makedirs(tmp_path / championship)
+        createModelingDatas(60, seed).to_csv(tmp_path / championship / "match_data_for_modeling.csv", index=False)
+    monkeypatch.setattr(train_model, "path_data_clean", f"{tmp_path}/")
+
+    trained = []
+    training = trainChampionships(["League A", "League B"], onChampionshipTrained=lambda championship, result: trained.append(championship),
+                                  cpu_budget=2, league_jobs=league_jobs)
+
+    assert sorted(trained) == ["League A", "League B"]
+    assert (training["league_jobs"], training["grid_jobs"]) == ((2, 1) if league_jobs == 2 else (1, 2))
+    for result in training["results"].values():
+        assert result["n_jobs"] == training["grid_jobs"]
+        assert set(result["timings"]) == {"load_seconds", "search_seconds", "evaluate_seconds", "refit_seconds", "total_seconds"}
+        assert set(result["metrics"]) == {"accuracy", "recall", "f1"}
+        assert len(result["X_test"]) == 12
+        assert result["search"]["strategy"] == search_strategy and result["search"]["n_candidates"] > 0
+        # Model retrained with all the data
+        assert result["model"].shape_fit_ == (60, 3)
+
+    # A failing championship doesn't stop the others
+    trained.clear()
+    with pytest.raises(Exception, match="Missing League"):
+        trainChampionships(["League A", "Missing League"], onChampionshipTrained=lambda championship, result: trained.append(championship),
+                           cpu_budget=2, league_jobs=league_jobs)
+    assert trained == ["League A"]
+
+
+
 """
 Model Predictions - test
 """
@@ -379,11 +1546,12 @@ def test_loadCleanedDatas():
 def test_createDataToPredict(monkeypatch):
     # Mock the loadCleanedDatas function to return test data
     def mock_loadCleanedDatas(championship):
-        home_team = pd.DataFrame({'HomeTeam': ['team1', 'team2'], 'stat1': [1, 2], 'stat2': [3, 4]})
-        away_team = pd.DataFrame({'AwayTeam': ['team3', 'team4'], 'stat3': [5, 6], 'stat4': [7, 8]})
+        home_team = pd.DataFrame({'HomeTeam': ['team1', 'team2'], 'HomeTeamId': [0, 1], 'stat1': [1, 2], 'stat2': [3, 4]})
+        away_team = pd.DataFrame({'AwayTeam': ['team4', 'team3'], 'AwayTeamId': [3, 2], 'stat3': [6, 5], 'stat4': [8, 7]})
         return home_team, away_team
 
     monkeypatch.setattr('model_predictions.loadCleanedDatas', mock_loadCleanedDatas)
+    monkeypatch.setattr('model_predictions.loadTeamRegistry', lambda championship, path: {'team1': 0, 'team2': 1, 'team3': 2, 'team4': 3})
 
     # Call the function with test inputs
     data_to_predict = createDataToPredict('test_championship', 'team1', 'team3')
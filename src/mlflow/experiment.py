@@ -9,33 +9,29 @@ from mlflow import MlflowClient
 import mlflow
 import datetime
 import base64
+import tempfile
+import os
 
 from experiment_variables import tracking_uri, championships, minimal_accuracy
-from train_model import trainAndEvaluateModel
+from train_model import trainChampionships
 
 
 """
 Mlflow
 """
+def logChampionshipRun(championship, result):
+    """
+    Store the model of a championship (params, metrics, training timings, confusion matrix) in the tracking server.
 
-for championship in championships:
-
-    # Define tracking_uri
-    mlflow.set_tracking_uri(tracking_uri)
+    Parameters:
+    championship (str): The name of the championship.
+    result (dict): The training result of the championship (see trainEvaluateAndRefitModel).
+    """
     client = MlflowClient()
-
-    # Train model & get model datas
-    model, best_params, metrics, conf_matrix_img, X_test = trainAndEvaluateModel(championship)
-
-    # Retrain the best model with all the data
-    features, target = trainAndEvaluateModel(championship, test_size=0)
-    model.fit(features, target)
+    model = result["model"]
 
     # Get some informations for mlflow
     model_name = model.__class__.__name__
-    conf_matrix_img_decoded = base64.b64decode(conf_matrix_img)
-    with open("confusion_matrix.png", 'wb') as f:
-        f.write(conf_matrix_img_decoded)
 
 
     # Define mlflow meta datas
@@ -43,19 +39,41 @@ for championship in championships:
     run_name = "Train_" + championship + "_" + model_name + "_" + datetime.datetime.now().strftime("%Y%m%d")
     artifact_path = "artifacts_" + championship + "_" + model_name
 
-    # Store information in tracking server
-    with mlflow.start_run(run_name=run_name) as run:
-        for key, value in best_params.items():
-            mlflow.log_param(key, value)
-        mlflow.log_metrics(metrics)
-        mlflow.log_artifact("confusion_matrix.png")
-        mlflow.sklearn.log_model(sk_model=model,
-                                input_example=X_test,
-                                artifact_path=artifact_path,
-                                registered_model_name=f"{championship}_svc")
-        
-        # Tag the model based on its accuracy
-        if metrics['accuracy'] > minimal_accuracy:
-            client.set_tag(run.info.run_id, "quality", "good")
-        else:
-            client.set_tag(run.info.run_id, "quality", "bad")
\ No newline at end of file
+    # Confusion matrix image, stored in a temporary folder (artifact : confusion_matrix.png), removed even if mlflow fails
+    with tempfile.TemporaryDirectory() as conf_matrix_folder:
+        conf_matrix_file = os.path.join(conf_matrix_folder, "confusion_matrix.png")
+        with open(conf_matrix_file, 'wb') as f:
+            f.write(base64.b64decode(result["conf_matrix_img"]))
+
+        # Store information in tracking server
+        with mlflow.start_run(run_name=run_name) as run:
+            for key, value in result["best_params"].items():
+                mlflow.log_param(key, value)
+            mlflow.log_param("search_strategy", result["search"]["strategy"])
+            mlflow.log_param("search_n_jobs", result["n_jobs"])
+            mlflow.log_metrics(result["metrics"])
+            mlflow.log_metrics(result["timings"])
+            mlflow.log_metrics({"cv_score": result["search"]["best_score"],
+                                "search_candidates": result["search"]["n_candidates"],
+                                "search_fits": result["search"]["n_fits"]})
+            mlflow.log_artifact(conf_matrix_file)
+            mlflow.sklearn.log_model(sk_model=model,
+                                    input_example=result["X_test"],
+                                    artifact_path=artifact_path,
+                                    registered_model_name=f"{championship}_svc")
+
+            # Tag the model based on its accuracy
+            if result["metrics"]['accuracy'] > minimal_accuracy:
+                client.set_tag(run.info.run_id, "quality", "good")
+            else:
+                client.set_tag(run.info.run_id, "quality", "bad")
+
+
+if __name__ == "__main__":
+    # Define tracking_uri
+    mlflow.set_tracking_uri(tracking_uri)
+
+    # Train championships in parallel (within the CPU budget), each model is stored as soon as it is trained
+    training = trainChampionships(championships, onChampionshipTrained=logChampionshipRun)
+    print(f"{len(championships)} championships trained in {training['seconds']:.1f} s "
+          f"({training['league_jobs']} in parallel, {training['grid_jobs']} search jobs each)")